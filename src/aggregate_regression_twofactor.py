@@ -2,54 +2,59 @@ import pandas as pd
 import statsmodels.api as sm
 from pathlib import Path
 
-FUND_DAILY = r"D:\A_share_market\20240910_fund_dayReturn.csv"
-INDEX_DAILY = r"D:\A_share_market\20240910_index_return.csv"
-
-def main():
-    fund_df = pd.read_csv(FUND_DAILY)
-    index_df = pd.read_csv(INDEX_DAILY)
-
-    fund_df = fund_df.rename(columns={'Unnamed: 0': 'date'})
-    fund_df['date'] = pd.to_datetime(fund_df['date'])
-    try:
-        index_df['date'] = pd.to_datetime(index_df['date'].astype(str), format='%Y%m%d')
-    except Exception:
-        index_df['date'] = pd.to_datetime(index_df['date'])
-
-    merged_df = pd.merge(fund_df, index_df, on='date', how='inner')
-
-    fund_cols = fund_df.columns[1:]
-    merged_df = merged_df[~(merged_df[fund_cols].sum(axis=1) == 0)]
-
-    # Pre-listing zeros to NaN
-    cleaned = merged_df[fund_cols].copy()
-    for col in cleaned.columns:
-        s = cleaned[col]
-        first_nonzero_idx = s.ne(0).idxmax()
-        cleaned.loc[:first_nonzero_idx - 1, col] = pd.NA
-    merged_df[fund_cols] = cleaned
-
-    # Convert % to decimal if needed
-    if merged_df[fund_cols].abs().stack().quantile(0.999) > 1:
-        merged_df[fund_cols] = merged_df[fund_cols] / 100.0
-    for m in ['000300.SH', '000905.SH']:
-        if merged_df[m].abs().quantile(0.999) > 1:
-            merged_df[m] = merged_df[m] / 100.0
-
-    merged_df['fund_avg_return'] = merged_df[fund_cols].mean(axis=1, skipna=True)
-
-    X = sm.add_constant(merged_df[['000300.SH', '000905.SH']])
-    y = merged_df['fund_avg_return']
-    model = sm.OLS(y, X, missing='drop').fit()
+from data_loader import FUND_DAILY, INDEX_DAILY, load_cleaned
+from factor_regression import batch_ols
+from instrumentation import stage, traced
 
+FACTORS = ['000300.SH', '000905.SH']  # HS300 + ZZ500
+RESULTS_DIR = Path(__file__).resolve().parents[1] / 'results'
+
+def run_regression(fund: pd.DataFrame, index: pd.DataFrame, hac_lags=None):
+    """Aggregate and per-fund two-factor regressions on cleaned returns."""
+    with stage('merge'):
+        merged_df = pd.concat([fund, index], axis=1).reset_index()
+
+        fund_cols = fund.columns
+        merged_df = merged_df[~(merged_df[fund_cols].sum(axis=1) == 0)]
+
+        merged_df['fund_avg_return'] = merged_df[fund_cols].mean(axis=1, skipna=True)
+
+    with stage('aggregate_ols'):
+        X = sm.add_constant(merged_df[FACTORS])
+        y = merged_df['fund_avg_return']
+        model = sm.OLS(y, X, missing='drop').fit()
+        summary = {'params': model.params, 'tvalues': model.tvalues, 'rsquared': model.rsquared}
+
+    # Per-fund regressions, each fund on its own listed dates
+    with stage('per_fund_ols'):
+        per_fund = batch_ols(merged_df[fund_cols], merged_df[FACTORS], hac_lags=hac_lags)
+    return summary, per_fund, merged_df
+
+def report(summary, per_fund, merged_df, out_dir: Path = RESULTS_DIR):
+    params, tvalues = summary['params'], summary['tvalues']
     print("=== Aggregate Fund Regression (Two-Factor: HS300 + ZZ500) ===")
-    for k in ['const', '000300.SH', '000905.SH']:
-        print(f"{k:>12}: {model.params[k]: .6f} (t = {model.tvalues[k]: .2f})")
-    print(f"R^2: {model.rsquared:.4f}")
+    for k in ['const'] + FACTORS:
+        print(f"{k:>12}: {params[k]: .6f} (t = {tvalues[k]: .2f})")
+    print(f"R^2: {summary['rsquared']:.4f}")
 
-    out = Path(__file__).resolve().parents[1] / 'results' / 'fund_data_cleaned_twofactor.csv'
+    out = out_dir / 'fund_regression_twofactor.csv'
+    per_fund.to_csv(out, index_label='fund')
+    print('Saved per-fund regressions:', out)
+
+    out = out_dir / 'fund_data_cleaned_twofactor.csv'
     merged_df.to_csv(out, index=False)
     print('Saved cleaned merge:', out)
 
+@traced('aggregate_regression_twofactor')
+def main(hac_lags=None, fund_path=FUND_DAILY, index_path=INDEX_DAILY, out_dir=RESULTS_DIR):
+    with stage('load_cleaned'):
+        fund_df, index_df = load_cleaned(fund_path, index_path)
+    with stage('regression'):
+        result = run_regression(fund_df, index_df, hac_lags=hac_lags)
+    with stage('report'):
+        out_dir = Path(out_dir)
+        out_dir.mkdir(parents=True, exist_ok=True)
+        report(*result, out_dir=out_dir)
+
 if __name__ == '__main__':
-    main()
\ No newline at end of file
+    main()
@@ -0,0 +1,224 @@
+"""
+Content-addressed on-disk memoization of pipeline intermediates.
+
+An artifact's key is the hash of the stage name, the parameters that produced
+it, a fingerprint of the code that computes it and the keys of its inputs, so
+changing a parameter, a source file or the stage's code changes the key of
+that stage and of everything downstream, while unaffected stages keep hitting
+the cache. Date-indexed single-dtype frames and arrays are
+stored as ``.npy`` and served memory-mapped; anything else is pickled. The
+cache directory is bounded in size and evicts least-recently-used artifacts.
+"""
+import functools
+import hashlib
+import inspect
+import json
+import os
+import pickle
+import shutil
+import sys
+import time
+import uuid
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+from data_loader import CACHE_DIR, read_frame, write_frame
+
+ARTIFACT_DIR = CACHE_DIR / 'artifacts'
+DEFAULT_MAX_BYTES = 4 << 30
+SOURCE_DIR = Path(__file__).resolve().parent
+# bump when the on-disk artifact layout changes (code changes are fingerprinted)
+ARTIFACT_VERSION = 1
+
+
+def _project_module(obj):
+    """The module of this project ``obj`` is (or is defined in); None for anything else."""
+    module = obj if inspect.ismodule(obj) else sys.modules.get(getattr(obj, '__module__', None) or '')
+    path = getattr(module, '__file__', None)
+    if path and Path(path).resolve().parent == SOURCE_DIR:
+        return module
+    return None
+
+
+def _code_names(code) -> set:
+    """Global names a code object (and the functions nested in it) refers to."""
+    names = set(code.co_names)
+    for const in code.co_consts:
+        if inspect.iscode(const):
+            names |= _code_names(const)
+    return names
+
+
+@functools.lru_cache(maxsize=None)
+def code_fingerprint(func) -> str:
+    """
+    Digest of the code behind ``func``: its own source, the source of the
+    same-module functions it calls, and every project module it reaches
+    (the modules it uses and, transitively, the project modules they import).
+    Third-party code is not covered; library upgrades need ``ARTIFACT_VERSION``.
+    """
+    home = func.__module__
+    functions, modules = {}, {}
+    todo = [func]
+    while todo:
+        obj = todo.pop()
+        if inspect.isfunction(obj) and obj.__module__ == home:
+            if obj.__qualname__ in functions:
+                continue
+            functions[obj.__qualname__] = inspect.getsource(obj)
+            refs = [obj.__globals__[n] for n in _code_names(obj.__code__) if n in obj.__globals__]
+        else:
+            module = _project_module(obj)
+            name = module and Path(module.__file__).name
+            if module is None or name in modules:
+                continue
+            modules[name] = Path(module.__file__).read_bytes()
+            refs = list(vars(module).values())
+        todo.extend(ref for ref in refs if _project_module(ref) is not None)
+
+    digest = hashlib.sha1()
+    for name in sorted(functions):
+        digest.update(f'{name}\0{functions[name]}\0'.encode('utf-8'))
+    for name in sorted(modules):
+        digest.update(name.encode('utf-8') + b'\0' + modules[name] + b'\0')
+    return digest.hexdigest()
+
+
+def artifact_key(stage: str, params: dict, inputs, code: str = None) -> str:
+    """
+    Hash of a stage name, its parameters, the keys (or digests) of its inputs
+    and the ``code_fingerprint`` of the function computing it.
+    """
+    payload = json.dumps({'version': ARTIFACT_VERSION, 'stage': stage, 'params': params,
+                          'inputs': list(inputs), 'code': code},
+                         sort_keys=True, default=str)
+    return hashlib.sha1(payload.encode('utf-8')).hexdigest()
+
+
+def _is_columnar_frame(value) -> bool:
+    return (isinstance(value, pd.DataFrame) and isinstance(value.index, pd.DatetimeIndex)
+            and all(isinstance(c, str) for c in value.columns) and value.shape[1] > 0
+            and value.dtypes.nunique() == 1
+            and (pd.api.types.is_numeric_dtype(value.dtypes.iloc[0])
+                 or pd.api.types.is_bool_dtype(value.dtypes.iloc[0])))
+
+
+def _dump(value, path: Path) -> None:
+    path.mkdir(parents=True)
+    if isinstance(value, tuple):
+        meta = {'kind': 'tuple', 'n': len(value)}
+        for i, item in enumerate(value):
+            _dump(item, path / f'item{i}')
+    elif _is_columnar_frame(value):
+        meta = {'kind': 'frame', 'index_name': value.index.name}
+        write_frame(value, path)
+    elif isinstance(value, np.ndarray) and value.dtype != object:
+        meta = {'kind': 'array'}
+        np.save(path / 'values.npy', value)
+    else:
+        meta = {'kind': 'pickle'}
+        with open(path / 'value.pkl', 'wb') as fh:
+            pickle.dump(value, fh, protocol=pickle.HIGHEST_PROTOCOL)
+    with open(path / 'meta.json', 'w', encoding='utf-8') as fh:
+        json.dump(meta, fh)
+
+
+def _load(path: Path):
+    with open(path / 'meta.json', encoding='utf-8') as fh:
+        meta = json.load(fh)
+    if meta['kind'] == 'tuple':
+        return tuple(_load(path / f'item{i}') for i in range(meta['n']))
+    if meta['kind'] == 'frame':
+        df = read_frame(path)
+        df.index.name = meta['index_name']
+        return df
+    if meta['kind'] == 'array':
+        return np.load(path / 'values.npy', mmap_mode='c')
+    with open(path / 'value.pkl', 'rb') as fh:
+        return pickle.load(fh)
+
+
+def _dir_size(path: Path) -> int:
+    return sum(f.stat().st_size for f in path.rglob('*') if f.is_file())
+
+
+class ArtifactCache:
+    """
+    Size-bounded, least-recently-used store of stage outputs.
+
+    Parameters
+    ----------
+    root : str or Path
+        Cache directory (one sub-directory per artifact key).
+    max_bytes : int
+        Total size above which the least recently used artifacts are evicted.
+    """
+
+    def __init__(self, root=ARTIFACT_DIR, max_bytes: int = DEFAULT_MAX_BYTES):
+        self.root = Path(root)
+        self.max_bytes = max_bytes
+
+    def _entry(self, key: str) -> Path:
+        return self.root / key
+
+    def __contains__(self, key: str) -> bool:
+        return (self._entry(key) / 'manifest.json').exists()
+
+    def get(self, key: str):
+        """Stored value (arrays memory-mapped); raises KeyError on a miss."""
+        entry = self._entry(key)
+        manifest = entry / 'manifest.json'
+        if not manifest.exists():
+            raise KeyError(key)
+        os.utime(manifest)  # LRU clock
+        return _load(entry / 'data')
+
+    def put(self, key: str, value, info: dict = None) -> None:
+        entry = self._entry(key)
+        if key in self:
+            return
+        # Build next to the final location, then rename into place atomically
+        tmp = self.root / f'.tmp-{key}-{uuid.uuid4().hex}'
+        try:
+            _dump(value, tmp / 'data')
+            manifest = {'key': key, 'created': time.time(), 'bytes': _dir_size(tmp), 'info': info or {}}
+            with open(tmp / 'manifest.json', 'w', encoding='utf-8') as fh:
+                json.dump(manifest, fh, indent=2, default=str)
+            shutil.rmtree(entry, ignore_errors=True)
+            os.replace(tmp, entry)
+        finally:
+            shutil.rmtree(tmp, ignore_errors=True)
+        self.evict()
+
+    def entries(self):
+        """(last_used, bytes, path) of every complete artifact, oldest first."""
+        out = []
+        if not self.root.exists():
+            return out
+        for entry in self.root.iterdir():
+            manifest = entry / 'manifest.json'
+            if entry.name.startswith('.') or not manifest.exists():
+                continue
+            with open(manifest, encoding='utf-8') as fh:
+                size = json.load(fh)['bytes']
+            out.append((manifest.stat().st_mtime, size, entry))
+        return sorted(out)
+
+    def evict(self, max_bytes: int = None) -> int:
+        """Drop least-recently-used artifacts until the total fits; returns bytes freed."""
+        limit = self.max_bytes if max_bytes is None else max_bytes
+        entries = self.entries()
+        total = sum(size for _, size, _ in entries)
+        freed = 0
+        for _, size, entry in entries:
+            if total <= limit:
+                break
+            shutil.rmtree(entry, ignore_errors=True)
+            total -= size
+            freed += size
+        return freed
+
+    def clear(self) -> None:
+        shutil.rmtree(self.root, ignore_errors=True)
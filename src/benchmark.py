@@ -0,0 +1,200 @@
+"""
+Speed and memory benchmark of the analysis steps on synthetic data.
+
+For every fund count it generates (or reuses) a synthetic data set, then runs
+the steps one after another in-process, timing each and recording its
+``tracemalloc`` peak: CSV parse into the cache, cached load, cleaning,
+monthly aggregation, both regressions, quintile construction and both
+momentum strategies. The report is JSON so successive runs can be diffed;
+``--compare`` prints the slowdown of each step against an earlier report.
+
+    python src/benchmark.py --sizes 1000 10000 50000 --days 4785
+"""
+import argparse
+import gc
+import json
+import os
+import platform
+import subprocess
+import time
+import tracemalloc
+from datetime import datetime, timezone
+from pathlib import Path
+
+import matplotlib
+matplotlib.use('Agg')
+import numpy as np
+import pandas as pd
+
+import aggregate_regression_single
+import aggregate_regression_twofactor
+import quintile_analysis
+import short_sell_strategy
+import top20_market_neutral
+from data_loader import align_dates, load_daily, percent_to_decimal
+from month_index import monthly_compound
+from prelisting import mask_prelisting
+from synthetic_data import make_dataset
+
+ROOT = Path(__file__).resolve().parents[1]
+SIZES = [1000, 10000, 50000]
+REPORT = ROOT / 'results' / 'benchmark_report.json'
+
+
+def _parse(s):
+    s['fund_raw'] = load_daily(s['fund_path'], s['cache_dir'], refresh=True)
+    s['index_raw'] = load_daily(s['index_path'], s['cache_dir'], refresh=True)
+
+
+def _load_cached(s):
+    s['fund_raw'] = load_daily(s['fund_path'], s['cache_dir'])
+    s['index_raw'] = load_daily(s['index_path'], s['cache_dir'])
+
+
+def _clean(s):
+    fund, index = align_dates(s['fund_raw'], s['index_raw'])
+    fund, index = percent_to_decimal(fund), percent_to_decimal(index)
+    mask_prelisting(fund)
+    s['fund'], s['index'] = fund, index
+
+
+def _monthly(s):
+    s['monthly'] = monthly_compound(s['fund'])
+
+
+def _regress_single(s):
+    aggregate_regression_single.run_regression(s['fund'], s['index'])
+
+
+def _regress_twofactor(s):
+    aggregate_regression_twofactor.run_regression(s['fund'], s['index'])
+
+
+def _quintiles(s):
+    quintile_analysis.run_quintiles(s['fund'], s['index'])
+
+
+def _momentum(s):
+    short_sell_strategy.run_short_strategy(s['fund'], s['index'], monthly_fund=s['monthly'])
+
+
+def _neutral(s):
+    top20_market_neutral.run_market_neutral(s['fund'], s['index'], m_fund=s['monthly'])
+
+
+STEPS = [('parse_csv', _parse), ('load_cached', _load_cached), ('clean', _clean),
+         ('monthly', _monthly), ('regress_single', _regress_single),
+         ('regress_twofactor', _regress_twofactor), ('quintiles', _quintiles),
+         ('momentum', _momentum), ('neutral', _neutral)]
+# step whose output a step reads, and the state key that output lands in
+REQUIRES = {'clean': 'load_cached', 'monthly': 'clean', 'regress_single': 'clean',
+            'regress_twofactor': 'clean', 'quintiles': 'clean', 'momentum': 'monthly', 'neutral': 'monthly'}
+PRODUCES = {'load_cached': 'fund_raw', 'clean': 'fund', 'monthly': 'monthly'}
+
+
+def _prepare(name: str, state: dict) -> None:
+    """Run, untimed, the prerequisite steps of ``name`` whose outputs are not in ``state`` yet."""
+    dep = REQUIRES.get(name)
+    if dep is not None and PRODUCES[dep] not in state:
+        _prepare(dep, state)
+        dict(STEPS)[dep](state)
+
+
+def _measure(func, state, repeat: int):
+    """Best wall time over ``repeat`` runs and the tracemalloc peak of the first one."""
+    times, peak = [], None
+    for i in range(repeat):
+        gc.collect()
+        if i == 0:
+            tracemalloc.start()
+        t0 = time.perf_counter()
+        func(state)
+        times.append(time.perf_counter() - t0)
+        if i == 0:
+            peak = tracemalloc.get_traced_memory()[1]
+            tracemalloc.stop()
+    return min(times), peak
+
+
+def run_benchmark(sizes=SIZES, n_days: int = 4785, seed: int = 0, repeat: int = 1,
+                  data_dir=ROOT / 'data' / 'synthetic', steps=None) -> dict:
+    """
+    Time every step at every fund count. Prerequisites of the chosen
+    ``steps`` (e.g. ``clean`` for ``quintiles``) are run untimed first.
+
+    Returns
+    -------
+    dict
+        ``{'meta': {...}, 'results': [{'n_funds', 'n_days', 'step', 'seconds', 'peak_mb'}, ...]}``.
+        Times are the best of ``repeat`` runs; memory is the ``tracemalloc`` peak
+        (numpy buffers included) of the first run, which is traced.
+    """
+    chosen = [(name, func) for name, func in STEPS if steps is None or name in steps]
+    results = []
+    for n_funds in sizes:
+        t0 = time.perf_counter()
+        fund_path, index_path = make_dataset(data_dir, n_funds, n_days, seed)
+        print(f'[{n_funds} funds] data ready in {time.perf_counter() - t0:.1f}s: {fund_path}')
+        state = {'fund_path': fund_path, 'index_path': index_path,
+                 'cache_dir': Path(data_dir) / 'cache'}
+        for name, func in chosen:
+            _prepare(name, state)
+            seconds, peak = _measure(func, state, repeat)
+            results.append({'n_funds': n_funds, 'n_days': n_days, 'step': name,
+                            'seconds': round(seconds, 4), 'peak_mb': round(peak / 2 ** 20, 1)})
+            print(f'[{n_funds} funds] {name:>18}: {seconds:8.3f}s  peak {peak / 2 ** 20:9.1f} MB')
+        del state
+        gc.collect()
+    return {'meta': _environment(seed, repeat), 'results': results}
+
+
+def _environment(seed: int, repeat: int) -> dict:
+    try:
+        commit = subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], cwd=ROOT, capture_output=True,
+                                text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        commit = None
+    return {'timestamp': datetime.now(timezone.utc).isoformat(timespec='seconds'),
+            'commit': commit, 'python': platform.python_version(), 'numpy': np.__version__,
+            'pandas': pd.__version__, 'platform': platform.platform(), 'cpus': os.cpu_count(),
+            'seed': seed, 'repeat': repeat}
+
+
+def compare(report: dict, baseline: dict) -> pd.DataFrame:
+    """Per-step time and memory ratios (current / baseline) for the cases both reports ran."""
+    key = ['n_funds', 'n_days', 'step']
+    cur = pd.DataFrame(report['results']).set_index(key)
+    old = pd.DataFrame(baseline['results']).set_index(key)
+    both = cur.join(old, rsuffix='_baseline', how='inner')
+    both['time_ratio'] = both['seconds'] / both['seconds_baseline']
+    both['memory_ratio'] = both['peak_mb'] / both['peak_mb_baseline']
+    return both
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Benchmark the analysis steps on synthetic data.')
+    parser.add_argument('--sizes', type=int, nargs='+', default=SIZES, help='fund counts')
+    parser.add_argument('--days', type=int, default=4785, help='trading days of history')
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--repeat', type=int, default=1, help='runs per step (best time kept)')
+    parser.add_argument('--steps', nargs='+', default=None, choices=[name for name, _ in STEPS])
+    parser.add_argument('--data-dir', default=str(ROOT / 'data' / 'synthetic'))
+    parser.add_argument('--out', default=str(REPORT), help='JSON report path')
+    parser.add_argument('--compare', default=None, help='earlier JSON report to compare against')
+    args = parser.parse_args(argv)
+
+    report = run_benchmark(args.sizes, args.days, args.seed, args.repeat, args.data_dir, args.steps)
+    out = Path(args.out)
+    out.parent.mkdir(parents=True, exist_ok=True)
+    with open(out, 'w', encoding='utf-8') as fh:
+        json.dump(report, fh, indent=2)
+    print('Saved report:', out)
+
+    if args.compare:
+        with open(args.compare, encoding='utf-8') as fh:
+            table = compare(report, json.load(fh))
+        print(table[['seconds', 'seconds_baseline', 'time_ratio', 'memory_ratio']].round(3).to_string())
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,325 @@
+"""
+One command line for every analysis, with lazy imports.
+
+    python src/cli.py monthly --fund path/to/fund.csv --index path/to/index.csv
+    python src/cli.py monthly --append-fund new_fund_days.csv --append-index new_index_days.csv
+    python src/cli.py regress --model twofactor --hac-lags 5
+    python src/cli.py quintiles --tranches 10 --walk-forward --lookback 12
+    python src/cli.py momentum        # short_sell_strategy
+    python src/cli.py neutral         # top20_market_neutral
+    python src/cli.py plot windows --windows 2006-01-01:2009-12-31
+    python src/cli.py plot fund-vs-index --batch --sample 20 --seed 1
+    python src/cli.py --config analysis.toml quintiles
+
+The scripts with their own command line (``pipeline``, ``grid``, ``windows``,
+``bootstrap``, ``portfolio``, ``serve``, ``benchmark``) are reachable too; their
+options are passed through unchanged, and their trace goes to their ``--out``
+folder (the folder of the file, for scripts whose ``--out`` is a file).
+
+Only the standard library and ``instrumentation`` load at startup. Each
+subcommand imports its analysis module, and with it pandas, matplotlib or
+statsmodels, only when it runs, so a scheduled ``monthly --append-*`` job
+never loads the plotting or regression stacks.
+
+Paths and parameters come from the command line or from a config file (JSON,
+or TOML on Python 3.11+): top-level ``fund``/``index``/``out`` apply to every
+subcommand that takes them, a table named after a subcommand sets its options::
+
+    fund = "D:/A_share_market/20240910_fund_dayReturn.csv"
+    index = "D:/A_share_market/20240910_index_return.csv"
+    out = "results"
+
+    [quintiles]
+    tranches = 10
+    walk_forward = true
+
+Command-line flags override the subcommand's table, which overrides the
+top-level keys. Pass-through scripts get the top-level keys as ``--fund``,
+``--index`` and ``--out`` flags where they have them (``windows`` reads the
+monthly files and ``benchmark`` synthetic data, so they take ``out`` only);
+where ``--out`` is a file, ``out`` names the script's default file in that
+folder, except for ``bootstrap``, whose file name depends on its mode. Every run is traced as ``cli_<command>`` (see
+``instrumentation``), with a ``startup`` stage (module load to dispatch; its
+CPU time counts from interpreter start) and an ``import`` stage for the
+subcommand's modules.
+"""
+import time
+_T0 = time.perf_counter()
+
+import argparse
+import importlib
+import json
+import sys
+from pathlib import Path
+
+from instrumentation import record, run_trace, stage
+
+RESULTS_DIR = Path(__file__).resolve().parents[1] / 'results'
+COMMON = ('fund', 'index', 'out')
+
+# subcommand -> module whose main(argv) takes the remaining arguments
+PASSTHROUGH = {
+    'pipeline': 'pipeline',
+    'grid': 'grid_search',
+    'windows': 'window_analysis',
+    'bootstrap': 'bootstrap',
+    'portfolio': 'portfolio',
+    'serve': 'server',
+    'benchmark': 'benchmark',
+}
+# top-level config keys each pass-through takes as flags
+PASSTHROUGH_COMMON = {
+    'pipeline': COMMON,
+    'grid': COMMON,
+    'windows': ('out',),
+    'bootstrap': ('fund', 'index'),
+    'portfolio': COMMON,
+    'serve': ('fund', 'index'),
+    'benchmark': ('out',),
+}
+# pass-throughs whose --out is a file: its default name, placed in the top-level ``out``
+# (None: no fixed name, so the top-level ``out`` is not passed)
+OUT_FILES = {
+    'grid': 'grid_search_results.csv',
+    'windows': 'window_analysis.csv',
+    'bootstrap': None,
+    'benchmark': 'benchmark_report.json',
+}
+
+
+def load_config(path) -> dict:
+    """Settings from a ``.json`` or ``.toml`` file."""
+    path = Path(path)
+    if path.suffix == '.toml':
+        import tomllib  # Python 3.11+
+        with open(path, 'rb') as fh:
+            return tomllib.load(fh)
+    with open(path, encoding='utf-8') as fh:
+        return json.load(fh)
+
+
+def _import(*names):
+    """Import the subcommand's modules inside an ``import`` stage of the trace."""
+    with stage('import', modules=','.join(names)):
+        modules = [importlib.import_module(name) for name in names]
+    return modules[0] if len(modules) == 1 else modules
+
+
+def _paths(args) -> dict:
+    """``fund_path``/``index_path``/``out_dir`` keyword arguments that were actually set."""
+    given = {'fund_path': args.fund, 'index_path': args.index, 'out_dir': args.out}
+    return {key: value for key, value in given.items() if value is not None}
+
+
+def cmd_monthly(args):
+    fund_monthly, index_monthly = _import('compute_fund_monthly_returns', 'compute_index_monthly_returns')
+
+    def out_csv(module):
+        return Path(args.out) / module.OUTPUT_CSV.name if args.out else module.OUTPUT_CSV
+
+    if args.append_fund or args.append_index:
+        # incremental refresh: only the files that received new rows
+        if args.append_fund:
+            fund_monthly.append_main(args.append_fund, out_csv(fund_monthly))
+        if args.append_index:
+            index_monthly.append_main(args.append_index, out_csv(index_monthly))
+        return
+    if args.only != 'index':
+        fund_input = args.fund or fund_monthly.DEFAULT_INPUT
+        if args.stream:
+            fund_monthly.stream_main(fund_input, args.chunk_rows or fund_monthly.CHUNK_ROWS, out_csv(fund_monthly))
+        else:
+            fund_monthly.main(fund_input, out_csv(fund_monthly))
+    if args.only != 'fund':
+        index_monthly.main(args.index or index_monthly.DEFAULT_INPUT, out_csv(index_monthly))
+
+
+def cmd_regress(args):
+    names = {'single': ['aggregate_regression_single'], 'twofactor': ['aggregate_regression_twofactor'],
+             'both': ['aggregate_regression_single', 'aggregate_regression_twofactor']}[args.model]
+    modules = _import(*names)
+    for module in modules if isinstance(modules, list) else [modules]:
+        module.main(args.hac_lags, **_paths(args))
+
+
+def cmd_quintiles(args):
+    quintile_analysis = _import('quintile_analysis')
+    quintile_analysis.main(args.tranches, args.compact, args.walk_forward, args.lookback, **_paths(args))
+
+
+def cmd_momentum(args):
+    _import('short_sell_strategy').main(**_paths(args))
+
+
+def cmd_neutral(args):
+    _import('top20_market_neutral').main(**_paths(args))
+
+
+def cmd_plot(args):
+    if args.figure == 'windows':
+        windows_plot = _import('plot_fund_vs_index_monthly_windows')
+        # monthly files default to the ones ``monthly`` wrote to the same --out
+        monthly_dir = Path(args.out) if args.out else None
+        fund_monthly = args.fund_monthly or (monthly_dir / windows_plot.FUND_MONTHLY.name if monthly_dir
+                                             else windows_plot.FUND_MONTHLY)
+        index_monthly = args.index_monthly or (monthly_dir / windows_plot.INDEX_MONTHLY.name if monthly_dir
+                                               else windows_plot.INDEX_MONTHLY)
+        windows = [tuple(spec.split(':', 1)) for spec in args.windows] if args.windows else windows_plot.WINDOWS
+        windows_plot.main(fund_monthly, index_monthly, args.out or windows_plot.RESULTS_DIR, windows, args.workers)
+        return
+
+    fund_vs_index = _import('plot_random_fund_vs_index')
+    if args.batch:
+        fund_vs_index.batch_main(args.sample, args.seed, args.funds, args.reference_index, args.workers,
+                                 **_paths(args))
+    else:
+        fund_vs_index.main(args.seed, **_paths(args))
+
+
+def _window(spec: str) -> str:
+    if ':' not in spec:
+        raise argparse.ArgumentTypeError(f'window {spec!r} is not START:END')
+    return spec
+
+
+def build_parser():
+    """The CLI parser and its subcommand parsers by name."""
+    common = argparse.ArgumentParser(add_help=False)
+    common.add_argument('--fund', default=None, help='daily fund return CSV (default: data_loader.FUND_DAILY)')
+    common.add_argument('--index', default=None, help='daily index return CSV (default: data_loader.INDEX_DAILY)')
+    common.add_argument('--out', default=None, help='output directory (default: results/)')
+
+    parser = argparse.ArgumentParser(prog='cli.py', description='A-share fund analyses.')
+    parser.add_argument('--config', default=None, help='JSON or TOML file with paths and parameters')
+    commands = parser.add_subparsers(dest='command', required=True, metavar='command')
+    subs = {}
+
+    sub = subs['monthly'] = commands.add_parser('monthly', parents=[common],
+                                                help='monthly compounded fund and index returns')
+    sub.add_argument('--only', choices=['fund', 'index'], default=None, help='refresh one of the two files')
+    sub.add_argument('--append-fund', metavar='CSV', default=None, help='new daily fund rows to fold in')
+    sub.add_argument('--append-index', metavar='CSV', default=None, help='new daily index rows to fold in')
+    sub.add_argument('--stream', action='store_true', help='read the fund file in row chunks (bounded memory)')
+    sub.add_argument('--chunk-rows', type=int, default=None, help='rows per chunk with --stream')
+    sub.set_defaults(run=cmd_monthly)
+
+    sub = subs['regress'] = commands.add_parser('regress', parents=[common],
+                                                help='aggregate and per-fund factor regressions')
+    sub.add_argument('--model', choices=['single', 'twofactor', 'both'], default='both')
+    sub.add_argument('--hac-lags', type=int, default=None, help='Newey-West lags for the per-fund t-stats')
+    sub.set_defaults(run=cmd_regress)
+
+    sub = subs['quintiles'] = commands.add_parser('quintiles', parents=[common],
+                                                  help='fund tranches by average return vs the benchmark')
+    sub.add_argument('--tranches', type=int, default=5)
+    sub.add_argument('--compact', action='store_true', help='float32 listed-history storage (compact.py)')
+    sub.add_argument('--walk-forward', action='store_true', help='re-rank every month on trailing data')
+    sub.add_argument('--lookback', type=int, default=None, help='trailing months scored in walk-forward mode')
+    sub.set_defaults(run=cmd_quintiles)
+
+    sub = subs['momentum'] = commands.add_parser('momentum', parents=[common],
+                                                 help='12-month momentum basket hedged with HS300 (short_sell_strategy)')
+    sub.set_defaults(run=cmd_momentum)
+
+    sub = subs['neutral'] = commands.add_parser('neutral', parents=[common],
+                                                help='top-20%% market-neutral portfolio (top20_market_neutral)')
+    sub.set_defaults(run=cmd_neutral)
+
+    sub = subs['plot'] = commands.add_parser('plot', parents=[common], help='comparison charts')
+    sub.add_argument('figure', choices=['windows', 'fund-vs-index'])
+    sub.add_argument('--fund-monthly', default=None, help='monthly fund returns CSV (windows)')
+    sub.add_argument('--index-monthly', default=None, help='monthly index returns CSV (windows)')
+    sub.add_argument('--windows', nargs='+', type=_window, default=None, metavar='START:END')
+    sub.add_argument('--batch', action='store_true', help='every fund vs every index, charts for a sample')
+    sub.add_argument('--seed', type=int, default=None)
+    sub.add_argument('--sample', type=int, default=10)
+    sub.add_argument('--funds', nargs='+', default=None)
+    sub.add_argument('--reference-index', default=None)
+    sub.add_argument('--workers', type=int, default=None, help='processes rendering the charts')
+    sub.set_defaults(run=cmd_plot)
+
+    for name, module in PASSTHROUGH.items():
+        subs[name] = commands.add_parser(name, add_help=False, help=f'{module}.py (options passed through)')
+    return parser, subs
+
+
+def _flags(section: dict) -> list:
+    """Config table -> command-line flags for a pass-through script."""
+    argv = []
+    for key, value in section.items():
+        flag = '--' + key.replace('_', '-')
+        if value is True:
+            argv.append(flag)
+        elif isinstance(value, list):
+            argv += [flag] + [str(v) for v in value]
+        elif value is not False and value is not None:
+            argv += [flag, str(value)]
+    return argv
+
+
+def _passthrough_argv(command: str, config: dict, extra: list) -> list:
+    """Top-level keys, then the command's table, then the command line (later flags win)."""
+    top = {key: config[key] for key in PASSTHROUGH_COMMON[command] if key in config}
+    if 'out' in top and command in OUT_FILES:
+        top['out'] = str(Path(top['out']) / OUT_FILES[command])
+    return _flags(top) + _flags(config.get(command, {})) + extra
+
+
+def _passthrough_out_dir(command: str, argv: list) -> Path:
+    """Folder of the pass-through's ``--out`` (``results/`` if not given)."""
+    pre = argparse.ArgumentParser(add_help=False)
+    pre.add_argument('--out', default=None)
+    out = pre.parse_known_args(argv)[0].out
+    if out is None:
+        return RESULTS_DIR
+    return Path(out).parent if command in OUT_FILES else Path(out)
+
+
+def _apply_config(parser, subs: dict, config: dict) -> None:
+    """Config values become parser defaults, so flags given on the command line still win."""
+    unknown = set(config) - set(COMMON) - set(subs)
+    if unknown:
+        parser.error(f'config: unknown key(s) {sorted(unknown)}')
+    top = {key: config[key] for key in COMMON if key in config}
+    for name, sub in subs.items():
+        if name in PASSTHROUGH:
+            continue
+        section = {key.replace('-', '_'): value for key, value in config.get(name, {}).items()}
+        dests = {action.dest for action in sub._actions}
+        bad = set(section) - dests
+        if bad:
+            parser.error(f'config [{name}]: unknown option(s) {sorted(bad)}')
+        sub.set_defaults(**{**top, **section})
+
+
+def main(argv=None):
+    argv = sys.argv[1:] if argv is None else list(argv)
+    parser, subs = build_parser()
+    pre = argparse.ArgumentParser(add_help=False)
+    pre.add_argument('--config', default=None)
+    config_path = pre.parse_known_args(argv)[0].config
+    config = load_config(config_path) if config_path else {}
+    _apply_config(parser, subs, config)
+
+    args, extra = parser.parse_known_args(argv)
+    if args.command in PASSTHROUGH:
+        extra = _passthrough_argv(args.command, config, extra)
+        if {'-h', '--help'} & set(extra):
+            importlib.import_module(PASSTHROUGH[args.command]).main(extra)  # prints usage, exits untraced
+        out_dir = _passthrough_out_dir(args.command, extra)
+    else:
+        if extra:
+            parser.error(f'unrecognized arguments: {" ".join(extra)}')
+        out_dir = Path(args.out) if args.out else RESULTS_DIR
+
+    with run_trace(f'cli_{args.command}', out_dir):
+        # CPU time since interpreter start; wall time since this module started loading
+        record('startup', time.perf_counter() - _T0, cpu_seconds=time.process_time(), started=_T0)
+        if args.command in PASSTHROUGH:
+            _import(PASSTHROUGH[args.command]).main(extra)
+        else:
+            args.run(args)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,159 @@
+"""
+Compact in-memory storage of the fund return matrix.
+
+Most of a young fund's column is pre-listing zeros/NaN. ``CompactReturns``
+keeps one float32 buffer holding every fund's history from its first trading
+day on, plus per-fund offsets into it, so pre-listing cells are never stored
+and the listed cells take half the bytes of float64. It is built block by
+block straight from the memory-mapped loader cache, and dense float64 blocks
+are materialized only a few hundred funds at a time when an analysis needs
+them.
+
+Tolerance: each stored return is rounded to float32 (relative error at most
+2**-24, about 6e-8); aggregates are accumulated in float64, so means, tranche
+returns and compounded returns agree with the float64 path to roughly 1e-7
+relative.
+"""
+import numpy as np
+import pandas as pd
+
+from data_loader import (CACHE_DIR, FUND_DAILY, INDEX_DAILY, PERCENT_SAMPLE, abs_quantile, load_daily,
+                         percent_to_decimal)
+from month_index import month_row_bounds
+from prelisting import first_trading_rows
+
+BLOCK = 512
+
+
+class CompactReturns:
+    """
+    Ragged float32 fund returns: fund ``j`` occupies ``data[offsets[j]:offsets[j+1]]``,
+    the rows ``starts[j]:`` of the date index (``starts[j] == len(index)`` if it never traded).
+
+    Exposes ``index`` and ``columns`` like a DataFrame so frame-oriented helpers
+    (``tranche_daily_returns``) can accept it.
+    """
+
+    def __init__(self, data: np.ndarray, offsets: np.ndarray, starts: np.ndarray,
+                 index: pd.DatetimeIndex, columns):
+        self.data = data
+        self.offsets = offsets
+        self.starts = starts
+        self.index = pd.DatetimeIndex(index)
+        self.columns = pd.Index(columns)
+
+    @classmethod
+    def from_array(cls, values: np.ndarray, index, columns, divisor: float = 1.0, rows=None,
+                   block: int = BLOCK):
+        """
+        Build from a dense dates x funds array (typically the memory-mapped cache).
+
+        ``rows`` selects/aligns rows of ``values``; cells are divided by
+        ``divisor``. Works in column blocks, two passes (sizes, then fill), so
+        no full-size float64 copy is ever made.
+        """
+        n_cols = values.shape[1]
+        n_rows = values.shape[0] if rows is None else len(rows)
+
+        def blocks():
+            for c0 in range(0, n_cols, block):
+                blk = np.asarray(values[:, c0:c0 + block], dtype=np.float64)
+                if rows is not None:
+                    blk = blk[rows]
+                yield c0, blk / divisor if divisor != 1.0 else blk
+
+        starts = np.empty(n_cols, dtype=np.int64)
+        for c0, blk in blocks():
+            starts[c0:c0 + blk.shape[1]] = first_trading_rows(blk)
+        offsets = np.zeros(n_cols + 1, dtype=np.int64)
+        np.cumsum(n_rows - starts, out=offsets[1:])
+
+        data = np.empty(offsets[-1], dtype=np.float32)
+        for c0, blk in blocks():
+            for j in range(blk.shape[1]):
+                f = c0 + j
+                data[offsets[f]:offsets[f + 1]] = blk[starts[f]:, j]
+        return cls(data, offsets, starts, index, columns)
+
+    @classmethod
+    def from_frame(cls, df: pd.DataFrame, divisor: float = 1.0, block: int = BLOCK):
+        return cls.from_array(df.to_numpy(dtype=np.float64, copy=False), df.index, df.columns,
+                              divisor=divisor, block=block)
+
+    @property
+    def shape(self):
+        return len(self.index), len(self.columns)
+
+    @property
+    def nbytes(self) -> int:
+        return self.data.nbytes + self.offsets.nbytes + self.starts.nbytes
+
+    def column(self, j: int) -> np.ndarray:
+        """Listed history of fund ``j`` (float32 view, rows ``starts[j]:``)."""
+        return self.data[self.offsets[j]:self.offsets[j + 1]]
+
+    def block(self, c0: int, c1: int, dtype=np.float64) -> np.ndarray:
+        """Dense dates x funds[c0:c1] array, NaN before each fund's first trading day."""
+        out = np.full((len(self.index), c1 - c0), np.nan, dtype=dtype)
+        for j in range(c0, c1):
+            out[self.starts[j]:, j - c0] = self.column(j)
+        return out
+
+    def iter_blocks(self, block: int = BLOCK, dtype=np.float64):
+        """Yield ``(c0, dense block)`` over consecutive groups of ``block`` funds."""
+        for c0 in range(0, len(self.columns), block):
+            yield c0, self.block(c0, min(c0 + block, len(self.columns)), dtype)
+
+    def to_frame(self, dtype=np.float64) -> pd.DataFrame:
+        """Dense frame (pre-listing NaN), as ``load_cleaned`` returns it."""
+        return pd.DataFrame(self.block(0, len(self.columns), dtype), index=self.index, columns=self.columns)
+
+    def start_dates(self) -> np.ndarray:
+        """``datetime64[ns]`` first trading day per fund (NaT if never traded)."""
+        dates = np.append(self.index.values.astype('datetime64[ns]'), np.datetime64('NaT', 'ns'))
+        return dates[self.starts]
+
+    def mean(self) -> pd.Series:
+        """Mean return of every fund over its valid days (float64 accumulation)."""
+        out = np.full(len(self.columns), np.nan)
+        for j in range(len(self.columns)):
+            col = self.column(j)
+            valid = col[~np.isnan(col)]
+            if len(valid):
+                out[j] = valid.sum(dtype=np.float64) / len(valid)
+        return pd.Series(out, index=self.columns)
+
+    def monthly_compound(self, block: int = BLOCK) -> pd.DataFrame:
+        """Calendar-month compounded returns, like ``month_index.monthly_compound`` on the dense frame."""
+        months, starts, _ = month_row_bounds(self.index)
+        out = np.empty((len(months), len(self.columns)))
+        for c0, dense in self.iter_blocks(block):
+            growth = np.where(np.isnan(dense), 1.0, 1.0 + dense)
+            out[:, c0:c0 + dense.shape[1]] = np.multiply.reduceat(growth, starts, axis=0) - 1
+        # calendar months without any trading day compound to 0, as with resample
+        full = pd.period_range(months[0], months[-1], freq='M') if len(months) else months
+        frame = pd.DataFrame(out, index=months, columns=self.columns).reindex(full, fill_value=0.0)
+        frame.index = frame.index.to_timestamp(how='end').normalize()
+        frame.index.name = self.index.name
+        return frame
+
+
+def load_cleaned_compact(fund_path=FUND_DAILY, index_path=INDEX_DAILY, cache_dir=CACHE_DIR,
+                         sample: int = PERCENT_SAMPLE):
+    """
+    Compact counterpart of ``data_loader.load_cleaned``.
+
+    The fund matrix goes from the memory-mapped cache straight into a
+    ``CompactReturns`` on the dates shared with the index; the percent check
+    uses ``sample`` random cells instead of the whole matrix. The (small)
+    index frame is returned dense as usual.
+    """
+    fund = load_daily(fund_path, cache_dir)
+    index = load_daily(index_path, cache_dir)
+    common = fund.index.intersection(index.index)
+    rows = fund.index.get_indexer(common)
+    values = fund.to_numpy(dtype=np.float64, copy=False)
+
+    divisor = 100.0 if abs_quantile(values, 0.999, rows=rows, sample=sample) > 1 else 1.0
+    compact = CompactReturns.from_array(values, common, fund.columns, divisor=divisor, rows=rows)
+    return compact, percent_to_decimal(index.loc[common])
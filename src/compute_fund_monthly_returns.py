@@ -1,35 +1,76 @@
+import argparse
+
+import numpy as np
 import pandas as pd
 from pathlib import Path
 
-DEFAULT_INPUT = r'D:\A_share_market\20240910_fund_dayReturn.csv'
+from data_loader import FUND_DAILY, load_daily, percent_divisor
+from ingest import CHUNK_ROWS, stream_ingest
+from instrumentation import stage, traced
+from month_index import monthly_compound
+from monthly_append import append_daily, build_state, make_state, save_state
+from prelisting import mask_prelisting
+
+DEFAULT_INPUT = FUND_DAILY
 OUTPUT_CSV = Path(__file__).resolve().parents[1] / 'results' / 'monthly_fund_returns.csv'
 
-def replace_leading_zeros_with_nan(series: pd.Series) -> pd.Series:
-    # Determine the first non-zero return index
-    non_zero_mask = series.ne(0)
-    first_valid_idx = non_zero_mask.idxmax()
-    if series.loc[first_valid_idx] == 0:  # All values are zeros
-        return series.mask(series == 0)
-    # Set zeros before the first non-zero as missing (pre-listing period)
-    series.loc[:first_valid_idx] = series.loc[:first_valid_idx].replace(0.0, pd.NA)
-    return series
-
-def main(input_path: str = DEFAULT_INPUT):
-    df = pd.read_csv(input_path)
-    df.rename(columns={'Unnamed: 0': 'date'}, inplace=True)
-    df['date'] = pd.to_datetime(df['date'])
-    df.set_index('date', inplace=True)
+def save_monthly(monthly_returns: pd.DataFrame, out_csv: Path = OUTPUT_CSV):
+    out_csv.parent.mkdir(parents=True, exist_ok=True)
+    monthly_returns.to_csv(out_csv)
+    print('Saved:', out_csv)
+
+@traced('compute_fund_monthly_returns')
+def main(input_path: str = DEFAULT_INPUT, out_csv: Path = OUTPUT_CSV):
+    df = load_daily(input_path)
 
     # Convert percentage to decimal if needed
-    if df.abs().stack().quantile(0.999) > 1:
-        df = df / 100.0
+    with stage('percent_check'):
+        divisor = percent_divisor(df)
+        df = df / divisor
 
-    df_cleaned = df.apply(replace_leading_zeros_with_nan)
+    # Leading zeros/NaNs before the first trade are pre-listing
+    with stage('mask_prelisting'):
+        mask_prelisting(df)
     # Monthly compounded = product(1+r) - 1
-    monthly_returns = (1 + df_cleaned).resample('M').prod() - 1
-    OUTPUT_CSV.parent.mkdir(parents=True, exist_ok=True)
-    monthly_returns.to_csv(OUTPUT_CSV)
-    print('Saved:', OUTPUT_CSV)
+    with stage('monthly_compound'):
+        monthly = monthly_compound(df)
+    with stage('save'):
+        save_monthly(monthly, Path(out_csv))
+        # Remember the open month so later days can be appended with --append
+        save_state(build_state(df, divisor, out_csv), out_csv)
+
+@traced('compute_fund_monthly_returns_stream')
+def stream_main(input_path: str = DEFAULT_INPUT, chunk_rows: int = CHUNK_ROWS, out_csv: Path = OUTPUT_CSV):
+    """Same output as ``main`` for files too wide to load at once (see ingest.py)."""
+    with stage('stream_ingest'):
+        ing = stream_ingest(input_path, chunk_rows=chunk_rows)
+    with stage('save'):
+        save_monthly(ing.monthly, Path(out_csv))
+        listed = ~np.isnat(ing.start_dates)
+        save_state(make_state(ing.monthly.columns, listed, ing.open_month, ing.last_date, ing.divisor,
+                              out_csv), out_csv)
+
+@traced('compute_fund_monthly_returns_append')
+def append_main(new_rows_path: str, out_csv: Path = OUTPUT_CSV):
+    """Fold only the new daily rows into the monthly file written by ``main``."""
+    new_rows = load_daily(new_rows_path, cache_dir=None)
+    with stage('append_daily'):
+        written = append_daily(new_rows, out_csv)
+    print(f'Updated {len(written)} monthly row(s):', out_csv)
 
 if __name__ == '__main__':
-    main()
\ No newline at end of file
+    parser = argparse.ArgumentParser(description='Aggregate daily returns to monthly compounded returns.')
+    parser.add_argument('input', nargs='?', default=DEFAULT_INPUT, help='full daily return CSV')
+    parser.add_argument('--out', default=str(OUTPUT_CSV), help='monthly returns CSV')
+    parser.add_argument('--append', metavar='NEW_ROWS_CSV',
+                        help='update incrementally from a CSV holding only the new daily rows')
+    parser.add_argument('--stream', action='store_true',
+                        help='read the daily file in row chunks (bounded memory)')
+    parser.add_argument('--chunk-rows', type=int, default=CHUNK_ROWS, help='rows per chunk with --stream')
+    args = parser.parse_args()
+    if args.append:
+        append_main(args.append, args.out)
+    elif args.stream:
+        stream_main(args.input, args.chunk_rows, args.out)
+    else:
+        main(args.input, args.out)
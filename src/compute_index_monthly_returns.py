@@ -1,38 +1,57 @@
+import argparse
+
 import pandas as pd
 from pathlib import Path
 
-DEFAULT_INPUT = r"D:\A_share_market\20240910_index_return.csv"
+from data_loader import INDEX_DAILY, load_daily, percent_divisor
+from instrumentation import stage, traced
+from month_index import monthly_compound
+from monthly_append import append_daily, build_state, save_state
+from prelisting import mask_prelisting
+
+DEFAULT_INPUT = INDEX_DAILY
 OUTPUT_CSV = Path(__file__).resolve().parents[1] / 'results' / 'monthly_index_returns.csv'
 
-def replace_leading_zeros_with_nan(series: pd.Series) -> pd.Series:
-    # Determine the first non-zero return index
-    non_zero_mask = series.ne(0)
-    first_valid_idx = non_zero_mask.idxmax()
-    if series.loc[first_valid_idx] == 0:
-        return series.mask(series == 0)
-    # Set zeros before the first non-zero as missing (pre-trading period)
-    series.loc[:first_valid_idx] = series.loc[:first_valid_idx].replace(0.0, pd.NA)
-    return series
-
-def main(input_path: str = DEFAULT_INPUT):
-    df = pd.read_csv(input_path)
-    df.rename(columns={df.columns[0]: 'date'}, inplace=True)
-    # index dates are often numeric yyyymmdd
-    try:
-        df['date'] = pd.to_datetime(df['date'], format='%Y%m%d')
-    except Exception:
-        df['date'] = pd.to_datetime(df['date'])
-    df.set_index('date', inplace=True)
+def save_monthly(monthly_returns: pd.DataFrame, out_csv: Path = OUTPUT_CSV):
+    out_csv.parent.mkdir(parents=True, exist_ok=True)
+    monthly_returns.to_csv(out_csv, encoding='utf-8-sig')
+    print('Saved:', out_csv)
+
+@traced('compute_index_monthly_returns')
+def main(input_path: str = DEFAULT_INPUT, out_csv: Path = OUTPUT_CSV):
+    df = load_daily(input_path)
 
     # Convert percentage to decimal if needed
-    if df.abs().stack().quantile(0.999) > 1:
-        df = df / 100.0
+    with stage('percent_check'):
+        divisor = percent_divisor(df)
+        df = df / divisor
+
+    # Leading zeros/NaNs before the first trade are pre-trading
+    with stage('mask_prelisting'):
+        mask_prelisting(df)
+    with stage('monthly_compound'):
+        monthly = monthly_compound(df)
+    with stage('save'):
+        save_monthly(monthly, Path(out_csv))
+        # Remember the open month so later days can be appended with --append
+        save_state(build_state(df, divisor, out_csv), out_csv)
 
-    df_cleaned = df.apply(replace_leading_zeros_with_nan)
-    monthly_returns = (1 + df_cleaned).resample('M').prod() - 1
-    OUTPUT_CSV.parent.mkdir(parents=True, exist_ok=True)
-    monthly_returns.to_csv(OUTPUT_CSV, encoding='utf-8-sig')
-    print('Saved:', OUTPUT_CSV)
+@traced('compute_index_monthly_returns_append')
+def append_main(new_rows_path: str, out_csv: Path = OUTPUT_CSV):
+    """Fold only the new daily rows into the monthly file written by ``main``."""
+    new_rows = load_daily(new_rows_path, cache_dir=None)
+    with stage('append_daily'):
+        written = append_daily(new_rows, out_csv)
+    print(f'Updated {len(written)} monthly row(s):', out_csv)
 
 if __name__ == '__main__':
-    main()
\ No newline at end of file
+    parser = argparse.ArgumentParser(description='Aggregate daily returns to monthly compounded returns.')
+    parser.add_argument('input', nargs='?', default=DEFAULT_INPUT, help='full daily return CSV')
+    parser.add_argument('--out', default=str(OUTPUT_CSV), help='monthly returns CSV')
+    parser.add_argument('--append', metavar='NEW_ROWS_CSV',
+                        help='update incrementally from a CSV holding only the new daily rows')
+    args = parser.parse_args()
+    if args.append:
+        append_main(args.append, args.out)
+    else:
+        main(args.input, args.out)
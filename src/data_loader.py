@@ -0,0 +1,220 @@
+import hashlib
+import json
+import os
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+from instrumentation import stage
+from prelisting import mask_prelisting
+
+FUND_DAILY = r"D:\A_share_market\20240910_fund_dayReturn.csv"
+INDEX_DAILY = r"D:\A_share_market\20240910_index_return.csv"
+CACHE_DIR = Path(__file__).resolve().parents[1] / 'cache'
+
+# Bump whenever the on-disk layout below changes so stale caches are rebuilt
+CACHE_VERSION = 1
+# cells drawn for sampled percent/decimal checks (compact and streaming loads)
+PERCENT_SAMPLE = 1_000_000
+_HASH_CHUNK = 1 << 23
+
+
+def file_fingerprint(path, with_hash: bool = True) -> dict:
+    """Size, mtime and (optionally) SHA-1 of a source file."""
+    st = os.stat(path)
+    fp = {'size': st.st_size, 'mtime_ns': st.st_mtime_ns}
+    if with_hash:
+        h = hashlib.sha1()
+        with open(path, 'rb') as fh:
+            for block in iter(lambda: fh.read(_HASH_CHUNK), b''):
+                h.update(block)
+        fp['sha1'] = h.hexdigest()
+    return fp
+
+
+def cache_path_for(path, cache_dir=CACHE_DIR) -> Path:
+    """Cache directory of a source file: file stem plus a hash of its absolute path."""
+    src = os.path.abspath(str(path))
+    tag = hashlib.sha1(src.encode('utf-8')).hexdigest()[:12]
+    return Path(cache_dir) / f'{Path(src).stem}-{tag}'
+
+
+def parse_dates(raw: pd.Series) -> pd.DatetimeIndex:
+    # index dates are numeric yyyymmdd, fund dates are ISO strings
+    try:
+        dates = pd.to_datetime(raw.astype(str), format='%Y%m%d')
+    except Exception:
+        dates = pd.to_datetime(raw)
+    return pd.DatetimeIndex(dates, name='date')
+
+
+def _parse_csv(path) -> pd.DataFrame:
+    df = pd.read_csv(path)
+    # first column is always the date ('Unnamed: 0' in the fund file)
+    dates = parse_dates(df.iloc[:, 0])
+    values = df.iloc[:, 1:].to_numpy(dtype=np.float64)
+    return pd.DataFrame(values, index=dates, columns=[str(c) for c in df.columns[1:]])
+
+
+def write_frame(df: pd.DataFrame, target: Path) -> None:
+    """Store a date-indexed, single-dtype frame as a column-major ``.npy`` matrix plus indexes."""
+    target.mkdir(parents=True, exist_ok=True)
+    np.save(target / 'values.npy', np.asfortranarray(df.to_numpy()))
+    np.save(target / 'dates.npy', df.index.values.astype('datetime64[ns]'))
+    with open(target / 'columns.json', 'w', encoding='utf-8') as fh:
+        json.dump([str(c) for c in df.columns], fh)
+
+
+def read_frame(target: Path) -> pd.DataFrame:
+    """Memory-map a frame written by ``write_frame``.
+
+    Values are opened copy-on-write, so callers may modify the frame in place
+    without touching the cache file.
+    """
+    values = np.load(target / 'values.npy', mmap_mode='c')
+    dates = pd.DatetimeIndex(np.load(target / 'dates.npy'), name='date')
+    with open(target / 'columns.json', encoding='utf-8') as fh:
+        columns = json.load(fh)
+    return pd.DataFrame(values, index=dates, columns=columns, copy=False)
+
+
+def write_manifest(target: Path, path, fingerprint: dict) -> None:
+    manifest = dict(fingerprint, version=CACHE_VERSION, source=os.path.abspath(str(path)))
+    with open(target / 'manifest.json', 'w', encoding='utf-8') as fh:
+        json.dump(manifest, fh, indent=2)
+
+
+def _cache_is_fresh(target: Path, path) -> bool:
+    manifest_file = target / 'manifest.json'
+    if not manifest_file.exists():
+        return False
+    with open(manifest_file, encoding='utf-8') as fh:
+        manifest = json.load(fh)
+    if manifest.get('version') != CACHE_VERSION:
+        return False
+    fp = file_fingerprint(path, with_hash=False)
+    if fp['size'] != manifest['size']:
+        return False
+    if fp['mtime_ns'] == manifest['mtime_ns']:
+        return True
+    # Same size but touched/copied: only the content hash can tell
+    fp = file_fingerprint(path)
+    if fp['sha1'] != manifest['sha1']:
+        return False
+    write_manifest(target, path, fp)
+    return True
+
+
+def source_digest(path, cache_dir=CACHE_DIR) -> str:
+    """SHA-1 of a source file, taken from the loader cache's manifest when that is fresh."""
+    if cache_dir is not None:
+        target = cache_path_for(path, cache_dir)
+        if _cache_is_fresh(target, path):
+            with open(target / 'manifest.json', encoding='utf-8') as fh:
+                return json.load(fh)['sha1']
+    return file_fingerprint(path)['sha1']
+
+
+def load_daily(path, cache_dir=CACHE_DIR, refresh: bool = False) -> pd.DataFrame:
+    """
+    Load a daily return CSV (first column = date) as a date-indexed frame.
+
+    The first call parses the CSV and writes a binary cache under ``cache_dir``;
+    later calls memory-map the cache as long as the source file's size, mtime
+    and SHA-1 are unchanged, and rebuild it transparently otherwise.
+
+    Parameters
+    ----------
+    path : str or Path
+        Source CSV, fund (``YYYY-MM-DD`` dates) or index (``yyyymmdd`` dates).
+    cache_dir : str or Path, optional
+        Root of the binary cache; ``None`` disables caching.
+    refresh : bool
+        Force a re-parse even if the cache is fresh.
+    """
+    name = Path(path).name
+    if cache_dir is None:
+        with stage('parse_csv', file=name):
+            return _parse_csv(path)
+
+    target = cache_path_for(path, cache_dir)
+    if not refresh and _cache_is_fresh(target, path):
+        with stage('read_cache', file=name):
+            return read_frame(target)
+
+    with stage('parse_csv', file=name):
+        df = _parse_csv(path)
+    with stage('write_cache', file=name):
+        # drop the manifest first so an interrupted rebuild is never mistaken for a fresh cache
+        (target / 'manifest.json').unlink(missing_ok=True)
+        write_frame(df, target)
+        write_manifest(target, path, file_fingerprint(path))
+    return read_frame(target)
+
+
+def load_fund_daily(path=FUND_DAILY, cache_dir=CACHE_DIR) -> pd.DataFrame:
+    return load_daily(path, cache_dir)
+
+
+def load_index_daily(path=INDEX_DAILY, cache_dir=CACHE_DIR) -> pd.DataFrame:
+    return load_daily(path, cache_dir)
+
+
+def abs_quantile(values: np.ndarray, q: float, rows=None, sample: int = None, seed: int = 0) -> float:
+    """
+    ``q``-quantile of ``|values|`` over the non-NaN cells of a 2-D array.
+
+    Exact by default (same as ``abs().stack().quantile(q)`` without building the
+    long Series); with ``sample``, estimated from that many uniformly drawn
+    cells so memory-mapped matrices are never read in full. ``rows`` restricts
+    the cells to a subset of rows.
+    """
+    n_rows = values.shape[0] if rows is None else len(rows)
+    if sample is None or sample >= n_rows * values.shape[1]:
+        cells = values if rows is None else values[rows]
+        return float(np.nanquantile(np.abs(cells), q)) if cells.size else np.nan
+    rng = np.random.default_rng(seed)
+    r = rng.integers(0, n_rows, sample)
+    c = rng.integers(0, values.shape[1], sample)
+    cells = values[r if rows is None else np.asarray(rows)[r], c]
+    cells = cells[~np.isnan(cells)]
+    return float(np.quantile(np.abs(cells), q)) if cells.size else np.nan
+
+
+def percent_divisor(df, sample: int = None) -> float:
+    """100.0 if the data look like percentages (99.9% quantile of |r| > 1), else 1.0."""
+    if isinstance(df, pd.DataFrame):
+        q = abs_quantile(df.to_numpy(dtype=np.float64, copy=False), 0.999, sample=sample)
+    else:
+        q = df.abs().quantile(0.999)
+    return 100.0 if q > 1 else 1.0
+
+
+def percent_to_decimal(df):
+    """Divide by 100 if the data look like percentages (99.9% quantile of |r| > 1)."""
+    divisor = percent_divisor(df)
+    return df / divisor if divisor != 1.0 else df
+
+
+def align_dates(fund: pd.DataFrame, index: pd.DataFrame):
+    """Restrict both frames to their common trading dates."""
+    common = fund.index.intersection(index.index)
+    return fund.loc[common], index.loc[common]
+
+
+def load_aligned(fund_path=FUND_DAILY, index_path=INDEX_DAILY, cache_dir=CACHE_DIR):
+    """Fund and index daily returns on common dates, as loaded (still in percent)."""
+    return align_dates(load_daily(fund_path, cache_dir), load_daily(index_path, cache_dir))
+
+
+def load_cleaned(fund_path=FUND_DAILY, index_path=INDEX_DAILY, cache_dir=CACHE_DIR):
+    """Aligned fund/index daily returns in decimals with fund pre-listing rows masked."""
+    with stage('load_aligned'):
+        fund, index = load_aligned(fund_path, index_path, cache_dir)
+    with stage('percent_check'):
+        fund = percent_to_decimal(fund)
+        index = percent_to_decimal(index)
+    with stage('mask_prelisting'):
+        mask_prelisting(fund)
+    return fund, index
@@ -0,0 +1,223 @@
+import numpy as np
+import pandas as pd
+
+
+def _design(factors: pd.DataFrame) -> np.ndarray:
+    x = factors.to_numpy(dtype=np.float64)
+    return np.column_stack([np.ones(len(x)), x])
+
+
+def _pair_products(za: np.ndarray, zb: np.ndarray) -> np.ndarray:
+    """Row-wise outer products ``za[t, k] * zb[t, l]`` flattened to (T, K*K)."""
+    return (za[:, :, None] * zb[:, None, :]).reshape(len(za), -1)
+
+
+def _batched_inverse(xtx: np.ndarray) -> np.ndarray:
+    try:
+        return np.linalg.inv(xtx)
+    except np.linalg.LinAlgError:
+        # at least one fund has a singular design (e.g. a flat factor on its dates)
+        return np.linalg.pinv(xtx)
+
+
+def batch_ols(returns: pd.DataFrame, factors: pd.DataFrame, hac_lags: int = None) -> pd.DataFrame:
+    """
+    OLS of every fund on the same factors (plus a constant), all funds at once.
+
+    Each fund uses only the dates where its own return and all factors are
+    valid, via masked normal equations: ``X'MX`` and ``X'My`` for all funds come
+    out of two matrix products and are solved as one batch. Matches
+    ``sm.OLS(y, sm.add_constant(X), missing='drop')`` fund by fund.
+
+    Parameters
+    ----------
+    returns : pd.DataFrame
+        Dates x funds, NaN where a fund has no return (e.g. pre-listing).
+    factors : pd.DataFrame
+        Dates x factors on the same index.
+    hac_lags : int, optional
+        If given, standard errors are Newey-West (Bartlett kernel, no small-sample
+        correction), like ``fit(cov_type='HAC', cov_kwds={'maxlags': hac_lags})``.
+        Lags are counted in rows of the full calendar, which equals statsmodels'
+        convention for funds whose only gaps are the leading pre-listing NaNs.
+
+    Returns
+    -------
+    pd.DataFrame
+        One row per fund: coefficient, ``_se`` and ``_t`` for ``const`` and each
+        factor, plus ``r2`` and ``nobs``. Funds with too few observations are NaN.
+    """
+    factors = factors.reindex(returns.index)
+    z = _design(factors)
+    y = returns.to_numpy(dtype=np.float64)
+    n_obs, k = z.shape
+
+    mask = np.isfinite(y) & np.isfinite(z).all(axis=1)[:, None]
+    m = mask.astype(np.float64)
+    z0 = np.where(np.isfinite(z), z, 0.0)
+    y0 = np.where(mask, y, 0.0)
+
+    nobs = m.sum(axis=0)
+    xtx = (m.T @ _pair_products(z0, z0)).reshape(-1, k, k)
+    xty = y0.T @ z0
+    ok = nobs > k
+    xtx[~ok] = np.eye(k)
+
+    xtx_inv = _batched_inverse(xtx)
+    params = np.einsum('fkl,fl->fk', xtx_inv, xty)
+    resid = (y0 - z0 @ params.T) * m
+
+    ssr = (resid ** 2).sum(axis=0)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        ybar = y0.sum(axis=0) / nobs
+        tss = (((y0 - ybar) * m) ** 2).sum(axis=0)
+        r2 = 1.0 - ssr / tss
+
+        if hac_lags is None:
+            scale = ssr / (nobs - k)
+            cov = xtx_inv * scale[:, None, None]
+        else:
+            meat = (resid.T ** 2 @ _pair_products(z0, z0)).reshape(-1, k, k)
+            for lag in range(1, hac_lags + 1):
+                weight = 1.0 - lag / (hac_lags + 1.0)
+                gamma = ((resid[lag:] * resid[:-lag]).T @ _pair_products(z0[lag:], z0[:-lag])).reshape(-1, k, k)
+                meat += weight * (gamma + gamma.transpose(0, 2, 1))
+            cov = xtx_inv @ meat @ xtx_inv.transpose(0, 2, 1)
+
+        se = np.sqrt(np.diagonal(cov, axis1=1, axis2=2))
+        tvalues = params / se
+
+    terms = ['const'] + [str(c) for c in factors.columns]
+    table = {}
+    for i, term in enumerate(terms):
+        table[term] = params[:, i]
+        table[f'{term}_se'] = se[:, i]
+        table[f'{term}_t'] = tvalues[:, i]
+    table['r2'] = r2
+    out = pd.DataFrame(table, index=returns.columns)
+    out[~ok] = np.nan
+    out['nobs'] = nobs.astype(int)
+    return out
+
+
+def _batched_solve(a: np.ndarray, b: np.ndarray) -> np.ndarray:
+    try:
+        return np.linalg.solve(a, b[..., None])[..., 0]
+    except np.linalg.LinAlgError:
+        return np.einsum('...kl,...l->...k', np.linalg.pinv(a), b)
+
+
+def rolling_ols(returns, factors: pd.DataFrame, window: int = None, min_nobs: int = None,
+                block: int = 256):
+    """
+    Rolling (or expanding, ``window=None``) OLS coefficients on ``[const, factors]``.
+
+    The cross-product sums ``sum m*x*x'`` and ``sum m*x*y`` are carried as running
+    totals along the date axis and each window is the difference of two totals,
+    so every step is O(1) regardless of the window length; no window is refit.
+    The estimate at date t uses data up to and including t — shift by one day
+    before using it as a hedge ratio. Funds are processed in column blocks of
+    ``block`` to bound memory.
+
+    Parameters
+    ----------
+    returns : pd.Series or pd.DataFrame
+        Aggregate series, or dates x funds (NaN rows are skipped per fund).
+    factors : pd.DataFrame
+        Dates x factors.
+    window : int, optional
+        Window length in rows; ``None`` for an expanding window.
+    min_nobs : int, optional
+        Minimum valid rows in the window (default: number of coefficients + 1).
+
+    Returns
+    -------
+    pd.DataFrame or dict
+        For a Series: dates x terms. For a frame: ``{term: dates x funds}``.
+    """
+    single = isinstance(returns, pd.Series)
+    frame = returns.to_frame() if single else returns
+    factors = factors.reindex(frame.index)
+    z = _design(factors)
+    n_obs, k = z.shape
+    min_nobs = k + 1 if min_nobs is None else min_nobs
+
+    z_ok = np.isfinite(z).all(axis=1)
+    z0 = np.where(np.isfinite(z), z, 0.0)
+    iu = np.triu_indices(k)
+    zz = z0[:, iu[0]] * z0[:, iu[1]]
+
+    coef = np.full((k, n_obs, frame.shape[1]), np.nan)
+    for start in range(0, frame.shape[1], block):
+        y = frame.iloc[:, start:start + block].to_numpy(dtype=np.float64)
+        m = (np.isfinite(y) & z_ok[:, None]).astype(np.float64)
+        y0 = np.where(m > 0, y, 0.0)
+
+        # running totals of the cross products, then window = total(t) - total(t - window)
+        sxx = np.cumsum(m[:, :, None] * zz[:, None, :], axis=0)
+        sxy = np.cumsum(y0[:, :, None] * z0[:, None, :], axis=0)
+        if window is not None:
+            sxx[window:] = sxx[window:] - sxx[:-window]
+            sxy[window:] = sxy[window:] - sxy[:-window]
+
+        a = np.empty(sxx.shape[:2] + (k, k))
+        a[..., iu[0], iu[1]] = sxx
+        a[..., iu[1], iu[0]] = sxx
+        ok = sxx[..., 0] >= min_nobs
+        a[~ok] = np.eye(k)
+        b = np.where(ok[..., None], sxy, 0.0)
+
+        beta = _batched_solve(a, b)
+        beta[~ok] = np.nan
+        coef[:, :, start:start + block] = np.moveaxis(beta, -1, 0)
+
+    terms = ['const'] + [str(c) for c in factors.columns]
+    if single:
+        return pd.DataFrame(coef[:, :, 0].T, index=frame.index, columns=terms)
+    return {term: pd.DataFrame(coef[i], index=frame.index, columns=frame.columns)
+            for i, term in enumerate(terms)}
+
+
+def resampled_ols(returns: pd.DataFrame, factors: pd.DataFrame, weights: np.ndarray) -> np.ndarray:
+    """
+    ``batch_ols`` coefficients of every fund under many date weightings at once.
+
+    Row r of ``weights`` (resamples x dates) multiplies each date's contribution
+    to the normal equations, so bootstrap count vectors give the resampled fits
+    without materializing resampled data: ``X'WMX`` and ``X'WMy`` for all
+    weightings and funds are two matrix products. A row of ones reproduces
+    ``batch_ols``.
+
+    Returns
+    -------
+    np.ndarray
+        Resamples x funds x terms (``const`` first); NaN where a fund has no
+        more weighted observations than terms.
+    """
+    factors = factors.reindex(returns.index)
+    z = _design(factors)
+    y = returns.to_numpy(dtype=np.float64)
+    n_obs, k = z.shape
+    weights = np.asarray(weights, dtype=np.float64).reshape(-1, n_obs)
+    n_w, n_funds = len(weights), y.shape[1]
+
+    mask = np.isfinite(y) & np.isfinite(z).all(axis=1)[:, None]
+    m = mask.astype(np.float64)
+    z0 = np.where(np.isfinite(z), z, 0.0)
+    y0 = np.where(mask, y, 0.0)
+
+    iu = np.triu_indices(k)
+    zz = z0[:, iu[0]] * z0[:, iu[1]]
+    sxx = ((weights[:, None, :] * zz.T).reshape(-1, n_obs) @ m).reshape(n_w, -1, n_funds)
+    sxy = ((weights[:, None, :] * z0.T).reshape(-1, n_obs) @ y0).reshape(n_w, k, n_funds)
+
+    a = np.empty((n_w, n_funds, k, k))
+    a[..., iu[0], iu[1]] = sxx.transpose(0, 2, 1)
+    a[..., iu[1], iu[0]] = sxx.transpose(0, 2, 1)
+    ok = sxx[:, 0] > k
+    a[~ok] = np.eye(k)
+    b = np.where(ok[..., None], sxy.transpose(0, 2, 1), 0.0)
+
+    params = _batched_solve(a, b)
+    params[~ok] = np.nan
+    return params
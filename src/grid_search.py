@@ -0,0 +1,278 @@
+"""
+Parameter-grid backtest of the monthly momentum, index-hedged strategies.
+
+Every grid point is the daily strategy of ``short_sell_strategy.py`` with its
+settings freed: rank funds on the trailing ``lookback`` months by ``stat``,
+buy the top ``top_frac`` equally weighted, rebalance every ``holding`` months
+and hedge ``beta`` times the ``hedge`` index (``'benchmark'`` = mean of the
+three indices used by ``top20_market_neutral.py``).
+
+The cleaned daily fund matrix is placed in shared memory once and attached by
+every worker instead of being pickled to each task. One task is one
+``(lookback, stat)`` pair, so the ranking is computed once and every
+``top_frac`` x ``holding`` basket is built from it in a single matrix product
+per month; hedges and betas are then a broadcast over the basket returns.
+
+    python src/grid_search.py --fund path/to/fund.csv --index path/to/index.csv --workers 16
+"""
+import argparse
+import itertools
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from multiprocessing import shared_memory
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+from data_loader import FUND_DAILY, INDEX_DAILY, load_cleaned
+from hedging import sweep_stats
+from instrumentation import detach, stage, trace_output, traced
+from momentum import STATS, lookback_stats, top_fraction_mask
+from month_index import month_positions, month_row_bounds, monthly_compound
+
+RESULTS_DIR = Path(__file__).resolve().parents[1] / 'results'
+BENCHMARK = 'benchmark'
+BENCHMARK_INDICES = ['000300.SH', '000905.SH', '000906.SH']
+
+GRID = {
+    'lookback': list(range(1, 37)),
+    'holding': [1, 3, 6, 12],
+    'top_frac': [0.1, 0.2, 0.3],
+    'stat': list(STATS),
+    'hedge': BENCHMARK_INDICES + [BENCHMARK],
+    'beta': [0.0, 0.6, 0.8, 1.0, 1.2, 1.4],
+}
+
+# per-process view of the shared inputs, set by _attach
+_DATA = {}
+
+
+def _share(array: np.ndarray):
+    """Copy an array into a new shared-memory block; returns the block and its attach spec."""
+    shm = shared_memory.SharedMemory(create=True, size=max(array.nbytes, 1))
+    view = np.ndarray(array.shape, dtype=array.dtype, buffer=shm.buf)
+    view[...] = array
+    return shm, (shm.name, array.shape, array.dtype.str)
+
+
+def _attach(specs: dict, meta: dict) -> None:
+    """Worker initializer: map the shared arrays (no copy) next to the small metadata."""
+    _DATA.clear()
+    _DATA.update(meta)
+    blocks = []
+    for key, (name, shape, dtype) in specs.items():
+        shm = shared_memory.SharedMemory(name=name)
+        blocks.append(shm)  # keep the mapping alive for the life of the worker
+        _DATA[key] = np.ndarray(shape, dtype=np.dtype(dtype), buffer=shm.buf)
+    _DATA['_blocks'] = blocks
+
+
+def _init_worker(specs: dict, meta: dict) -> None:
+    """Pool initializer: leave the parent's trace behind, then attach the shared inputs."""
+    detach()
+    _attach(specs, meta)
+
+
+def held_rows(selected: np.ndarray, holding: int) -> np.ndarray:
+    """
+    Selection row held in each month when rebalancing every ``holding`` months.
+
+    Rebalancing starts at the first month with a non-empty selection; months
+    before it hold nothing (-1).
+    """
+    rows = np.full(len(selected), -1)
+    nonempty = np.flatnonzero(selected.any(axis=1))
+    if len(nonempty):
+        first = nonempty[0]
+        offset = np.arange(len(selected) - first)
+        rows[first:] = first + offset // holding * holding
+    return rows
+
+
+def basket_daily_returns(daily: np.ndarray, held: np.ndarray, starts, stops, positions) -> np.ndarray:
+    """
+    Equal-weight daily return of many baskets at once.
+
+    ``held`` is months x funds x baskets (bool); month ``i`` covers daily rows
+    ``starts[positions[i]]:stops[positions[i]]``. Each month is one matrix
+    product of the month's returns with the held masks. Days outside held
+    months, or with no valid return in the basket, are NaN.
+    """
+    out = np.full((daily.shape[0], held.shape[2]), np.nan)
+    for i, pos in enumerate(positions):
+        if pos < 0 or not held[i].any():
+            continue
+        block = daily[starts[pos]:stops[pos]]
+        valid = np.isfinite(block)
+        weights = held[i].astype(np.float64)
+        sums = np.where(valid, block, 0.0) @ weights
+        counts = valid.astype(np.float64) @ weights
+        with np.errstate(invalid='ignore', divide='ignore'):
+            month = sums / counts
+        month[:, ~held[i].any(axis=0)] = np.nan
+        out[starts[pos]:stops[pos]] = month
+    return out
+
+
+def run_group(lookback: int, stat: str, holdings, top_fracs, hedges, betas, min_periods=None) -> pd.DataFrame:
+    """All grid points sharing one ranking (``lookback``, ``stat``), on the attached data."""
+    monthly = pd.DataFrame(_DATA['monthly'], index=_DATA['month_index'])
+    scores = lookback_stats(monthly, lookback, stat, min_periods)
+
+    baskets, held = [], []
+    for top_frac in top_fracs:
+        selected = top_fraction_mask(scores, top_frac).to_numpy()
+        for holding in holdings:
+            rows = held_rows(selected, holding)
+            held.append(np.where(rows[:, None] >= 0, selected[rows], False))
+            baskets.append((holding, top_frac))
+    held = np.stack(held, axis=2)
+    port = basket_daily_returns(_DATA['daily'], held, _DATA['starts'], _DATA['stops'], _DATA['positions'])
+
+    # NaN days (outside held months) drop out of every statistic, so all baskets
+    # and betas of a hedge index go through one sweep
+    betas = np.asarray(betas, dtype=np.float64)
+    labels = pd.MultiIndex.from_tuples([(h, f, beta) for h, f in baskets for beta in betas],
+                                       names=['holding', 'top_frac', 'beta'])
+    tables = []
+    for hedge in hedges:
+        bench = _DATA['hedges'][:, _DATA['hedge_names'].index(hedge)]
+        excess = port[:, :, None] - bench[:, None, None] * betas[None, None, :]
+        stats = sweep_stats(pd.DataFrame(excess.reshape(len(excess), -1), columns=labels))
+        stats['Days'] = np.repeat(np.isfinite(port).sum(axis=0), len(betas))
+        stats = stats.reset_index()
+        stats.insert(0, 'lookback', lookback)
+        stats.insert(3, 'stat', stat)
+        stats.insert(4, 'hedge', hedge)
+        tables.append(stats[stats['Days'] > 0])
+    return pd.concat(tables, ignore_index=True)
+
+
+def _inputs(fund: pd.DataFrame, index: pd.DataFrame):
+    """Shared arrays and small metadata for the workers."""
+    monthly = monthly_compound(fund)
+    months, starts, stops = month_row_bounds(fund.index)
+    hedges = index.copy()
+    if set(BENCHMARK_INDICES) <= set(index.columns):
+        hedges[BENCHMARK] = index[BENCHMARK_INDICES].mean(axis=1)
+    arrays = {'daily': np.ascontiguousarray(fund.to_numpy(dtype=np.float64)),
+              'monthly': np.ascontiguousarray(monthly.to_numpy(dtype=np.float64))}
+    meta = {'month_index': monthly.index,
+            'starts': starts, 'stops': stops, 'positions': month_positions(months, monthly.index),
+            'hedges': hedges.to_numpy(dtype=np.float64), 'hedge_names': [str(c) for c in hedges.columns]}
+    return arrays, meta
+
+
+def run_grid(fund: pd.DataFrame, index: pd.DataFrame, grid: dict = None, workers: int = None,
+             min_periods: int = None, progress: bool = True) -> pd.DataFrame:
+    """
+    Backtest every combination of ``grid`` (keys as in ``GRID``; missing keys use its values).
+
+    Parameters
+    ----------
+    fund, index : pd.DataFrame
+        Cleaned daily returns (decimals, fund pre-listing days NaN).
+    workers : int, optional
+        Process-pool size; 1 runs in-process.
+    min_periods : int, optional
+        Valid months required in the ranking window (default: the whole lookback).
+
+    Returns
+    -------
+    pd.DataFrame
+        One row per grid point with the ``calculate_performance_stats`` metrics
+        (Annualized Return/Volatility, Sharpe Ratio, Maximum Drawdown) and the
+        number of days held.
+    """
+    grid = {**GRID, **(grid or {})}
+    with stage('inputs'):
+        arrays, meta = _inputs(fund, index)
+    unknown = set(grid['hedge']) - set(meta['hedge_names'])
+    if unknown:
+        raise ValueError(f'Unknown hedge index {sorted(unknown)}; expected one of {meta["hedge_names"]}')
+    groups = list(itertools.product(grid['lookback'], grid['stat']))
+    rest = (grid['holding'], grid['top_frac'], grid['hedge'], grid['beta'], min_periods)
+
+    tables = []
+    t0 = time.perf_counter()
+
+    def report(done):
+        if progress:
+            print(f'{done}/{len(groups)} ranking groups done ({time.perf_counter() - t0:.1f}s)')
+
+    if workers == 1:
+        _attach({}, {**meta, **arrays})
+        with stage('groups', groups=len(groups)):
+            for n, (lookback, stat) in enumerate(groups, 1):
+                tables.append(run_group(lookback, stat, *rest))
+                report(n)
+        return _collect(tables)
+
+    blocks, specs = [], {}
+    try:
+        with stage('share'):
+            for key, array in arrays.items():
+                shm, specs[key] = _share(array)
+                blocks.append(shm)
+        with stage('groups', groups=len(groups)), \
+                ProcessPoolExecutor(max_workers=workers, initializer=_init_worker, initargs=(specs, meta)) as pool:
+            futures = [pool.submit(run_group, lookback, stat, *rest) for lookback, stat in groups]
+            for n, fut in enumerate(as_completed(futures), 1):
+                tables.append(fut.result())
+                report(n)
+    finally:
+        for shm in blocks:
+            shm.close()
+            shm.unlink()
+    return _collect(tables)
+
+
+def _collect(tables) -> pd.DataFrame:
+    out = pd.concat(tables, ignore_index=True)
+    return out.sort_values(['lookback', 'holding', 'top_frac', 'stat', 'hedge', 'beta'], ignore_index=True)
+
+
+def _ints(text):
+    """'1-36' or '1,3,6' -> list of ints."""
+    out = []
+    for part in text.split(','):
+        lo, _, hi = part.partition('-')
+        out.extend(range(int(lo), int(hi) + 1) if hi else [int(lo)])
+    return out
+
+
+@traced('grid_search')
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Grid-search the momentum market-neutral strategies.')
+    parser.add_argument('--fund', default=FUND_DAILY, help='daily fund return CSV')
+    parser.add_argument('--index', default=INDEX_DAILY, help='daily index return CSV')
+    parser.add_argument('--out', default=str(RESULTS_DIR / 'grid_search_results.csv'), help='results CSV')
+    parser.add_argument('--workers', type=int, default=None, help='process pool size (1 = serial)')
+    parser.add_argument('--lookbacks', type=_ints, default=GRID['lookback'], help="months, e.g. '1-36'")
+    parser.add_argument('--holdings', type=_ints, default=GRID['holding'], help="months, e.g. '1,3,6,12'")
+    parser.add_argument('--top-fracs', type=float, nargs='+', default=GRID['top_frac'])
+    parser.add_argument('--stats', nargs='+', choices=STATS, default=GRID['stat'])
+    parser.add_argument('--hedges', nargs='+', default=GRID['hedge'], help=f"index columns or '{BENCHMARK}'")
+    parser.add_argument('--betas', type=float, nargs='+', default=GRID['beta'])
+    parser.add_argument('--min-periods', type=int, default=None,
+                        help='valid months required in the ranking window (default: all)')
+    args = parser.parse_args(argv)
+    trace_output(Path(args.out).parent)
+
+    with stage('load_cleaned'):
+        fund, index = load_cleaned(args.fund, args.index)
+    grid = {'lookback': args.lookbacks, 'holding': args.holdings, 'top_frac': args.top_fracs,
+            'stat': args.stats, 'hedge': args.hedges, 'beta': args.betas}
+    with stage('run_grid', funds=fund.shape[1]):
+        results = run_grid(fund, index, grid, workers=args.workers, min_periods=args.min_periods)
+
+    with stage('save'):
+        out = Path(args.out)
+        out.parent.mkdir(parents=True, exist_ok=True)
+        results.to_csv(out, index=False)
+        print(f'Saved {len(results)} grid points:', out)
+
+
+if __name__ == '__main__':
+    main()
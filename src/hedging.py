@@ -0,0 +1,38 @@
+import numpy as np
+import pandas as pd
+
+from factor_regression import rolling_ols
+from perf_stats import performance_stats
+
+SWEEP_METRICS = ['Arithmetic Return', 'Annualized Volatility', 'Sharpe Ratio', 'Maximum Drawdown']
+
+
+def hedge_sweep(portfolio: pd.Series, benchmark: pd.Series, betas) -> pd.DataFrame:
+    """
+    Hedged excess returns ``portfolio - beta * benchmark`` for a whole grid of betas.
+
+    One broadcast over the aligned series: dates x betas, columns labelled by beta.
+    """
+    betas = np.asarray(betas, dtype=np.float64)
+    bench = benchmark.reindex(portfolio.index).to_numpy(dtype=np.float64)
+    excess = portfolio.to_numpy(dtype=np.float64)[:, None] - bench[:, None] * betas[None, :]
+    return pd.DataFrame(excess, index=portfolio.index, columns=pd.Index(betas))
+
+
+def sweep_stats(excess: pd.DataFrame, periods_per_year: int = 252) -> pd.DataFrame:
+    """Arithmetic-annualized return/vol, Sharpe and max drawdown of every column at once."""
+    stats = performance_stats(excess, periods_per_year)
+    return stats[SWEEP_METRICS].rename(columns={'Arithmetic Return': 'Annualized Return'})
+
+
+def rolling_hedge(portfolio: pd.Series, benchmark: pd.Series, window: int = None, min_nobs: int = None):
+    """
+    Hedge with a time-varying beta estimated by rolling (or expanding) OLS.
+
+    The beta applied on each date is the estimate as of the previous row, so
+    the hedge never uses the return it is hedging. Returns ``(excess, beta)``.
+    """
+    bench = benchmark.reindex(portfolio.index)
+    coef = rolling_ols(portfolio, bench.to_frame('benchmark'), window=window, min_nobs=min_nobs)
+    beta = coef['benchmark'].shift(1)
+    return portfolio - beta * bench, beta
@@ -0,0 +1,160 @@
+"""
+Streaming ingestion of very wide daily return CSVs with bounded memory.
+
+``stream_ingest`` never holds the whole file: a first pass reads only the date
+column (parsed once, with one detected format), a second pass reads the
+values in row chunks with explicit float64 dtypes and writes each chunk
+straight into the column-major ``.npy`` of the loader cache (``load_daily``
+then sees a fresh cache). While the chunks go by it also
+
+- keeps a uniform random sample of ``|r|`` (random-key reservoir) for the
+  percent/decimal check, which is exact whenever the file has fewer
+  non-NaN cells than the sample size;
+- finds every fund's first trading row;
+- compounds calendar-month returns of the cleaned data (pre-listing days
+  skipped), for both candidate scales, so no second pass is needed once the
+  scale is known.
+
+Peak memory is about ``chunk_rows`` x columns x 8 bytes plus the month x fund
+result, independent of the number of rows.
+"""
+import csv
+import json
+from collections import namedtuple
+
+import numpy as np
+import pandas as pd
+
+from data_loader import CACHE_DIR, PERCENT_SAMPLE, cache_path_for, file_fingerprint, write_manifest
+from month_index import month_row_bounds
+
+CHUNK_ROWS = 500
+DATE_FORMATS = ('%Y%m%d', '%Y-%m-%d', '%Y/%m/%d')
+
+Ingested = namedtuple('Ingested', ['target', 'divisor', 'start_dates', 'monthly', 'open_month', 'last_date'])
+
+
+def _date_format(sample: pd.Series):
+    for fmt in DATE_FORMATS:
+        try:
+            pd.to_datetime(sample, format=fmt)
+            return fmt
+        except (ValueError, TypeError):
+            continue
+    return None  # let pandas infer
+
+
+def read_dates(path) -> pd.DatetimeIndex:
+    """Date column of a daily CSV (first column), parsed in one go with a detected format."""
+    raw = pd.read_csv(path, usecols=[0], dtype=str).iloc[:, 0]
+    fmt = _date_format(raw.iloc[:20])
+    return pd.DatetimeIndex(pd.to_datetime(raw, format=fmt), name='date')
+
+
+class _Reservoir:
+    """Uniform sample without replacement of a value stream: keep the ``size`` smallest random keys."""
+
+    def __init__(self, size: int, seed: int = 0):
+        self.size = size
+        self.rng = np.random.default_rng(seed)
+        self.values = np.empty(0)
+        self.keys = np.empty(0)
+
+    def add(self, values: np.ndarray) -> None:
+        keys = np.concatenate([self.keys, self.rng.random(len(values))])
+        values = np.concatenate([self.values, values])
+        if len(keys) > self.size:
+            keep = np.argpartition(keys, self.size)[:self.size]
+            keys, values = keys[keep], values[keep]
+        self.keys, self.values = keys, values
+
+    def quantile(self, q: float) -> float:
+        return float(np.quantile(self.values, q)) if len(self.values) else np.nan
+
+
+def stream_ingest(path, cache_dir=CACHE_DIR, chunk_rows: int = CHUNK_ROWS,
+                  sample: int = PERCENT_SAMPLE) -> Ingested:
+    """
+    Parse a daily CSV chunk by chunk into the loader cache, with cleaning stats on the fly.
+
+    Returns
+    -------
+    Ingested
+        ``target`` cache directory (``load_daily(path, cache_dir)`` now reads it),
+        percent ``divisor`` (100.0 or 1.0), ``datetime64[ns]`` ``start_dates``
+        (NaT if never traded), ``monthly`` compounded returns of the cleaned
+        data (equal to ``monthly_compound`` after ``percent_to_decimal`` and
+        ``mask_prelisting``) and ``open_month``, the running ``1 + r`` product
+        of the last month with its ``last_date`` (for ``monthly_append``).
+    """
+    with open(path, newline='', encoding='utf-8-sig') as fh:
+        header = next(csv.reader(fh))
+    columns = [str(c) for c in header[1:]]
+    dates = read_dates(path)
+    n_rows, n_cols = len(dates), len(columns)
+    months, month_starts, _ = month_row_bounds(dates)
+    month_of_row = np.repeat(np.arange(len(months)), np.diff(np.r_[month_starts, n_rows]))
+
+    target = cache_path_for(path, cache_dir)
+    target.mkdir(parents=True, exist_ok=True)
+    # an interrupted ingest must never look like a fresh cache
+    (target / 'manifest.json').unlink(missing_ok=True)
+    values = np.lib.format.open_memmap(target / 'values.npy', mode='w+', dtype=np.float64,
+                                       shape=(n_rows, n_cols), fortran_order=True)
+
+    reservoir = _Reservoir(sample)
+    first = np.full(n_cols, n_rows, dtype=np.int64)
+    listed = np.zeros(n_cols, dtype=bool)
+    scales = np.array([1.0, 100.0])
+    prod = np.ones((2, n_cols))
+    monthly = np.ones((2, len(months), n_cols))
+
+    row = 0
+    reader = pd.read_csv(path, usecols=range(1, n_cols + 1), dtype=np.float64, chunksize=chunk_rows)
+    for chunk in reader:
+        block = chunk.to_numpy(dtype=np.float64)
+        values[row:row + len(block)] = block
+        finite = np.isfinite(block)
+        reservoir.add(np.abs(block[~np.isnan(block)]))
+
+        started = finite & (block != 0)
+        ever = np.logical_or.accumulate(started, axis=0) | listed
+        newly = ever[-1] & ~listed
+        first[newly] = row + started[:, newly].argmax(axis=0)
+        listed = ever[-1].copy()
+        live = ever & ~np.isnan(block)
+
+        # month segments of this chunk; same order as resample().prod():
+        # (1 + r / scale) multiplied day by day onto the running product, NaN skipped
+        seg_months = month_of_row[row:row + len(block)]
+        cuts = np.flatnonzero(np.diff(seg_months)) + 1
+        for lo, hi in zip(np.r_[0, cuts], np.r_[cuts, len(block)]):
+            m = seg_months[lo]
+            if row + lo == month_starts[m]:
+                prod[:] = 1.0
+            for s, scale in enumerate(scales):
+                scaled = block[lo:hi] / scale if scale != 1.0 else block[lo:hi]
+                growth = np.where(live[lo:hi], 1.0 + scaled, 1.0)
+                prod[s] = np.multiply.reduce(np.vstack([prod[s], growth]), axis=0)
+                monthly[s, m] = prod[s]
+        row += len(block)
+    values.flush()
+    del values
+
+    divisor = 100.0 if reservoir.quantile(0.999) > 1 else 1.0
+    s = int(divisor == 100.0)
+
+    np.save(target / 'dates.npy', dates.values.astype('datetime64[ns]'))
+    with open(target / 'columns.json', 'w', encoding='utf-8') as fh:
+        json.dump(columns, fh)
+    write_manifest(target, path, file_fingerprint(path))
+
+    monthly_frame = pd.DataFrame(monthly[s] - 1, index=months, columns=columns)
+    # calendar months without any trading day compound to 0, as with resample
+    full = pd.period_range(months[0], months[-1], freq='M') if len(months) else months
+    monthly_frame = monthly_frame.reindex(full, fill_value=0.0)
+    monthly_frame.index = monthly_frame.index.to_timestamp(how='end').normalize()
+    monthly_frame.index.name = dates.name
+
+    stamps = np.append(dates.values.astype('datetime64[ns]'), np.datetime64('NaT', 'ns'))
+    return Ingested(target, divisor, stamps[first], monthly_frame, prod[s], dates[-1] if n_rows else None)
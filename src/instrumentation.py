@@ -0,0 +1,286 @@
+"""
+Stage timers, memory high-water marks and opt-in profiling for the scripts.
+
+Wrap a script's ``main`` in ``traced`` and its logical steps in ``stage``::
+
+    @traced('quintile_analysis')
+    def main():
+        with stage('load'):
+            ...
+
+Every stage records wall and CPU seconds, the resident set size after it and
+the process RSS high-water mark; stages nest (``load/parse_csv``). Library
+code can open stages too (``load_daily``, ``load_cleaned`` do): outside a
+traced run ``stage`` does nothing. At the end of the run a summary table is
+printed and a JSON trace ``trace_<name>.json`` is written next to the run's
+outputs: the ``out_dir`` (or the folder of ``out_csv``) the traced ``main`` was
+called with, a folder set through ``trace_output``, else ``results/``.
+
+Heavier hooks are switched on without code changes through the
+``FUND_PROFILE`` environment variable (comma-separated):
+
+- ``tracemalloc``: Python-heap peak per stage (numpy buffers included) and the
+  top allocation sites of the run, in the trace;
+- ``cprofile``: a cProfile of the whole run, dumped to
+  ``profile_<name>.prof`` beside the trace, with the top functions in it.
+
+    FUND_PROFILE=cprofile,tracemalloc python src/quintile_analysis.py
+"""
+import cProfile
+import functools
+import inspect
+import json
+import os
+import pstats
+import sys
+import time
+import tracemalloc
+from contextlib import contextmanager
+from datetime import datetime, timezone
+from pathlib import Path
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+RESULTS_DIR = Path(__file__).resolve().parents[1] / 'results'
+ENV_VAR = 'FUND_PROFILE'
+PROFILERS = ('cprofile', 'tracemalloc')
+TOP_N = 25
+
+_ACTIVE = None
+
+
+def _rss_bytes():
+    """Current resident set size (Linux ``/proc``; None elsewhere)."""
+    try:
+        with open('/proc/self/statm') as fh:
+            return int(fh.read().split()[1]) * os.sysconf('SC_PAGE_SIZE')
+    except (OSError, ValueError, AttributeError):
+        return None
+
+
+def _peak_rss_bytes():
+    """Process RSS high-water mark so far (None where ``resource`` is unavailable)."""
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak if sys.platform == 'darwin' else peak * 1024
+
+
+def _mb(n):
+    return None if n is None else round(n / 2 ** 20, 1)
+
+
+def profilers_from_env() -> set:
+    """Profilers requested through ``FUND_PROFILE`` (unknown names raise)."""
+    names = {p.strip().lower() for p in os.environ.get(ENV_VAR, '').split(',') if p.strip()}
+    unknown = names - set(PROFILERS)
+    if unknown:
+        raise ValueError(f'{ENV_VAR}: unknown profiler(s) {sorted(unknown)}; expected {list(PROFILERS)}')
+    return names
+
+
+class Trace:
+    """Stage records of one run; see the module docstring."""
+
+    def __init__(self, name: str, profile=()):
+        self.name = name
+        self.profile = set(profile)
+        self.records = []
+        self.allocations = []
+        self.functions = []
+        self.out_dir = None  # set by trace_output; overrides run_trace's out_dir
+        self._stack = []  # open stages: [path, tracemalloc peak seen so far]
+        self._t0 = time.perf_counter()
+        self.started = datetime.now(timezone.utc).isoformat(timespec='seconds')
+
+    @contextmanager
+    def stage(self, name: str, **info):
+        path = '/'.join([frame[0] for frame in self._stack] + [name])
+        tracing = tracemalloc.is_tracing()
+        if tracing:
+            # the parent's peak so far survives the reset for this stage
+            if self._stack:
+                self._stack[-1][1] = max(self._stack[-1][1], tracemalloc.get_traced_memory()[1])
+            tracemalloc.reset_peak()
+        frame = [name, 0]
+        self._stack.append(frame)
+        t0, c0 = time.perf_counter(), time.process_time()
+        try:
+            yield
+        finally:
+            seconds, cpu = time.perf_counter() - t0, time.process_time() - c0
+            self._stack.pop()
+            heap_peak = None
+            if tracing:
+                heap_peak = max(frame[1], tracemalloc.get_traced_memory()[1])
+                if self._stack:
+                    self._stack[-1][1] = max(self._stack[-1][1], heap_peak)
+            self.record(path, seconds, cpu_seconds=cpu, started=t0, heap_peak=heap_peak, **info)
+
+    def record(self, path: str, seconds: float, cpu_seconds=None, started=None, heap_peak=None, **info):
+        """
+        Add a stage measured elsewhere (e.g. in a worker process) or by ``stage``.
+
+        ``started`` is its ``time.perf_counter()`` start, if known.
+        """
+        self.records.append(dict({
+            'stage': path,
+            'depth': path.count('/'),
+            'start': None if started is None else round(started - self._t0, 4),
+            'seconds': round(seconds, 4),
+            'cpu_seconds': None if cpu_seconds is None else round(cpu_seconds, 4),
+            'rss_mb': _mb(_rss_bytes()),
+            'rss_peak_mb': _mb(_peak_rss_bytes()),
+            'heap_peak_mb': _mb(heap_peak),
+        }, **info))
+
+    def summary(self):
+        """One row per stage in start order, with its share of the run's wall time (a DataFrame)."""
+        import pandas as pd  # not at module level: the CLI times its own imports through this module
+
+        if not self.records:
+            return pd.DataFrame(columns=['stage', 'seconds'])
+        table = pd.DataFrame(self.records)
+        table = table.sort_values('start', kind='stable', na_position='last').reset_index(drop=True)
+        total = time.perf_counter() - self._t0
+        table['share'] = (table['seconds'] / total).round(3) if total > 0 else None
+        return table.dropna(axis=1, how='all')
+
+    def to_dict(self) -> dict:
+        return {'name': self.name, 'started': self.started, 'argv': sys.argv,
+                'seconds': round(time.perf_counter() - self._t0, 4), 'profile': sorted(self.profile),
+                'rss_peak_mb': _mb(_peak_rss_bytes()), 'stages': self.records,
+                'allocations': self.allocations, 'functions': self.functions}
+
+    def write(self, out_dir=RESULTS_DIR) -> Path:
+        out = Path(out_dir) / f'trace_{self.name}.json'
+        out.parent.mkdir(parents=True, exist_ok=True)
+        with open(out, 'w', encoding='utf-8') as fh:
+            json.dump(self.to_dict(), fh, indent=2, default=str)
+        return out
+
+
+@contextmanager
+def stage(name: str, **info):
+    """Time a step of the active run (no-op when no run is being traced)."""
+    if _ACTIVE is None:
+        yield
+    else:
+        with _ACTIVE.stage(name, **info):
+            yield
+
+
+def record(name: str, seconds: float, **info) -> None:
+    """Add an externally timed stage to the active run, if any."""
+    if _ACTIVE is not None:
+        _ACTIVE.record(name, seconds, **info)
+
+
+def active():
+    """The ``Trace`` of the run in progress, or None."""
+    return _ACTIVE
+
+
+def trace_output(out_dir) -> None:
+    """Write the active run's trace (and profile) to ``out_dir``; no-op outside a traced run."""
+    if _ACTIVE is not None and out_dir is not None:
+        _ACTIVE.out_dir = Path(out_dir)
+
+
+def detach() -> None:
+    """Stop tracing in a forked worker process (use as a pool ``initializer``)."""
+    global _ACTIVE
+    _ACTIVE = None
+    sys.setprofile(None)
+    if tracemalloc.is_tracing():
+        tracemalloc.stop()
+
+
+def _profile_functions(profiler, top: int = TOP_N) -> list:
+    stats = pstats.Stats(profiler).stats
+    rows = []
+    for (filename, line, func), (_, ncalls, tottime, cumtime, _) in stats.items():
+        rows.append({'function': f'{Path(filename).name}:{line}({func})', 'ncalls': ncalls,
+                     'tottime': round(tottime, 4), 'cumtime': round(cumtime, 4)})
+    return sorted(rows, key=lambda r: r['cumtime'], reverse=True)[:top]
+
+
+def _allocation_sites(snapshot, top: int = TOP_N) -> list:
+    return [{'site': str(stat.traceback[0]), 'size_mb': _mb(stat.size), 'count': stat.count}
+            for stat in snapshot.statistics('lineno')[:top]]
+
+
+@contextmanager
+def run_trace(name: str, out_dir=RESULTS_DIR, profile=None, quiet: bool = False):
+    """
+    Trace a whole run: activate stage timing, start the requested profilers
+    (default: from ``FUND_PROFILE``) and write the trace when the run ends.
+
+    Inside an already traced run this just opens a stage called ``name``.
+    """
+    global _ACTIVE
+    if _ACTIVE is not None:
+        with stage(name):
+            yield _ACTIVE
+        return
+
+    trace = Trace(name, profilers_from_env() if profile is None else profile)
+    started_tracemalloc = 'tracemalloc' in trace.profile and not tracemalloc.is_tracing()
+    if started_tracemalloc:
+        tracemalloc.start()
+    profiler = cProfile.Profile() if 'cprofile' in trace.profile else None
+    _ACTIVE = trace
+    if profiler is not None:
+        profiler.enable()
+    try:
+        yield trace
+    finally:
+        if profiler is not None:
+            profiler.disable()
+        _ACTIVE = None
+        if tracemalloc.is_tracing() and 'tracemalloc' in trace.profile:
+            trace.allocations = _allocation_sites(tracemalloc.take_snapshot())
+        if started_tracemalloc:
+            tracemalloc.stop()
+        out_dir = Path(trace.out_dir or out_dir)
+        if profiler is not None:
+            out_dir.mkdir(parents=True, exist_ok=True)
+            profiler.dump_stats(out_dir / f'profile_{name}.prof')
+            trace.functions = _profile_functions(profiler)
+        out = trace.write(out_dir)
+        if not quiet:
+            print(trace.summary().to_string(index=False))
+            print('Saved trace:', out)
+
+
+def _call_output_dir(signature, args, kwargs):
+    """The ``out_dir`` (or folder of ``out_csv``) a ``main`` is called with, None if it takes neither."""
+    bound = signature.bind(*args, **kwargs)
+    bound.apply_defaults()
+    if bound.arguments.get('out_dir') is not None:
+        return bound.arguments['out_dir']
+    if bound.arguments.get('out_csv') is not None:
+        return Path(bound.arguments['out_csv']).parent
+    return None
+
+
+def traced(name: str = None, out_dir=RESULTS_DIR):
+    """
+    Decorator form of ``run_trace`` for a script's ``main``; the trace goes to
+    the ``out_dir`` / ``out_csv`` folder the call asks for, else ``out_dir``.
+    Mains that parse their own ``argv`` call ``trace_output`` instead.
+    """
+    def wrap(func):
+        signature = inspect.signature(func)
+
+        @functools.wraps(func)
+        def inner(*args, **kwargs):
+            run_name = name or Path(sys.modules[func.__module__].__file__).stem
+            with run_trace(run_name, out_dir):
+                trace_output(_call_output_dir(signature, args, kwargs))
+                return func(*args, **kwargs)
+        return inner
+    return wrap
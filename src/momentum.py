@@ -0,0 +1,88 @@
+import numpy as np
+import pandas as pd
+
+STATS = ('compound', 'mean')
+
+
+def _window_sums(x: np.ndarray, lookback: int) -> np.ndarray:
+    """Row i holds the sum of rows [i-lookback, i); rows before ``lookback`` are NaN."""
+    csum = np.zeros((x.shape[0] + 1,) + x.shape[1:])
+    np.cumsum(x, axis=0, out=csum[1:])
+    out = np.full(x.shape, np.nan)
+    out[lookback:] = csum[lookback:-1] - csum[:-lookback - 1]
+    return out
+
+
+def lookback_stats(monthly: pd.DataFrame, lookback: int = 12, stat: str = 'compound',
+                   min_periods: int = None) -> pd.DataFrame:
+    """
+    Trailing statistic of every fund at every month, excluding the month itself.
+
+    Row i is computed from months ``i-lookback .. i-1`` (no look-ahead) with
+    prefix-sum differences, so all months come out of one cumulative sum:
+
+    - ``'compound'``: compounded return, from the rolling sum of ``log1p(r)``
+      (months with ``r <= -1`` are counted separately and force -100%);
+    - ``'mean'``: arithmetic mean of the valid months.
+
+    Funds with fewer than ``min_periods`` valid months in the window
+    (default: the full ``lookback``) get NaN.
+    """
+    if stat not in STATS:
+        raise ValueError(f'Unknown ranking statistic {stat!r}; expected one of {STATS}')
+    min_periods = lookback if min_periods is None else min_periods
+
+    r = monthly.to_numpy(dtype=np.float64)
+    valid = np.isfinite(r)
+    counts = _window_sums(valid.astype(np.float64), lookback)
+
+    if stat == 'compound':
+        wiped = valid & (r <= -1)
+        ok = valid & ~wiped
+        logs = np.log1p(np.where(ok, r, 0.0))
+        values = np.expm1(_window_sums(logs, lookback))
+        values[_window_sums(wiped.astype(np.float64), lookback) > 0] = -1.0
+    else:
+        with np.errstate(invalid='ignore', divide='ignore'):
+            values = _window_sums(np.where(valid, r, 0.0), lookback) / counts
+
+    values[~(counts >= min_periods)] = np.nan
+    return pd.DataFrame(values, index=monthly.index, columns=monthly.columns)
+
+
+def top_fraction_mask(scores: pd.DataFrame, top_frac: float = 0.2) -> pd.DataFrame:
+    """
+    Select the best ``max(int(n * top_frac), 1)`` funds of each row, n = non-NaN scores.
+
+    Ties keep column order, like ``Series.nlargest(keep='first')``; rows with
+    no score select nothing.
+    """
+    s = scores.to_numpy(dtype=np.float64)
+    n = np.isfinite(s).sum(axis=1)
+    k = np.where(n > 0, np.maximum((n * top_frac).astype(int), 1), 0)
+
+    # stable argsort of -score: descending, NaN last, ties in column order
+    order = np.argsort(-s, axis=1, kind='stable')
+    rank = np.empty_like(order)
+    np.put_along_axis(rank, order, np.arange(s.shape[1])[None, :], axis=1)
+    return pd.DataFrame(rank < k[:, None], index=scores.index, columns=scores.columns)
+
+
+def momentum_selection(monthly: pd.DataFrame, lookback: int = 12, stat: str = 'compound',
+                       top_frac: float = 0.2, min_periods: int = None) -> pd.DataFrame:
+    """
+    Month x fund selection mask of the trailing-momentum winners.
+
+    Row i selects on months ``i-lookback .. i-1`` and can be held in month i.
+    """
+    return top_fraction_mask(lookback_stats(monthly, lookback, stat, min_periods), top_frac)
+
+
+def basket_mean(returns: pd.DataFrame, selection: pd.DataFrame) -> pd.Series:
+    """Equal-weight mean of the selected funds' valid returns per row (NaN if none)."""
+    r = returns.to_numpy(dtype=np.float64)
+    picked = selection.to_numpy(dtype=bool) & np.isfinite(r)
+    counts = picked.sum(axis=1)
+    sums = np.where(picked, r, 0.0).sum(axis=1)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        return pd.Series(np.where(counts > 0, sums / counts, np.nan), index=returns.index)
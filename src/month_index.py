@@ -0,0 +1,37 @@
+import numpy as np
+import pandas as pd
+
+
+def month_row_bounds(dates: pd.DatetimeIndex):
+    """
+    Contiguous row range of every calendar month in a sorted daily index.
+
+    Returns
+    -------
+    months : pd.PeriodIndex
+        Months present in ``dates``, ascending.
+    starts, stops : np.ndarray
+        Row offsets such that ``dates[starts[i]:stops[i]]`` is month ``months[i]``.
+    """
+    dates = pd.DatetimeIndex(dates)
+    codes = np.asarray(dates.year) * 12 + np.asarray(dates.month) - 1
+    if len(codes) and np.any(np.diff(codes) < 0):
+        raise ValueError('month_row_bounds needs dates sorted ascending')
+    if len(codes) == 0:
+        return pd.PeriodIndex([], freq='M'), np.array([], dtype=int), np.array([], dtype=int)
+    starts = np.flatnonzero(np.r_[True, np.diff(codes) != 0])
+    stops = np.r_[starts[1:], len(codes)]
+    months = pd.PeriodIndex(dates[starts], freq='M')
+    return months, starts, stops
+
+
+def month_positions(months: pd.PeriodIndex, wanted) -> np.ndarray:
+    """Position of each wanted month (Period or month-end Timestamp) in ``months``, -1 if absent."""
+    if not isinstance(wanted, pd.PeriodIndex):
+        wanted = pd.DatetimeIndex(wanted).to_period('M')
+    return months.get_indexer(wanted)
+
+
+def monthly_compound(daily: pd.DataFrame) -> pd.DataFrame:
+    """Calendar-month compounded returns, product(1+r) - 1 over each month's valid days."""
+    return (1 + daily).resample('M').prod() - 1
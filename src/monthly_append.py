@@ -0,0 +1,163 @@
+"""
+Incremental daily-append update of a monthly returns CSV.
+
+A full build (``compute_*_monthly_returns.py``) saves, next to the monthly CSV,
+the little state needed to continue it: the percent divisor, which columns have
+started trading, the running product of ``1 + r`` for the open month and the
+byte offset of that month's line. ``append_daily`` then consumes only the new
+daily rows and rewrites the open month's line in place (appending lines when a
+month rolls over), so the cost is independent of the history length. The file
+is identical to what a full ``monthly_compound`` recompute would write, given
+that the percent/decimal decision taken at the full build stays valid. The
+state also records the CSV's size and modification time when it was saved, so
+a monthly file rewritten by anything else is refused instead of patched at a
+stale offset.
+"""
+import os
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+
+def state_path_for(out_csv) -> Path:
+    out_csv = Path(out_csv)
+    return out_csv.with_name(out_csv.name + '.state.npz')
+
+
+def _month_code(date) -> int:
+    return date.year * 12 + date.month - 1
+
+
+def _month_end(code: int) -> pd.Timestamp:
+    return pd.Period(year=code // 12, month=code % 12 + 1, freq='M').end_time.normalize()
+
+
+def _last_line_offset(path) -> int:
+    """Byte offset where the file's last line starts."""
+    with open(path, 'rb') as fh:
+        fh.seek(0, os.SEEK_END)
+        pos = fh.tell()
+        tail = b''
+        while pos > 0:
+            step = min(4096, pos)
+            pos -= step
+            fh.seek(pos)
+            tail = fh.read(step) + tail
+            cut = tail.rstrip(b'\r\n').rfind(b'\n')
+            if cut >= 0:
+                return pos + cut + 1
+        return 0
+
+
+def build_state(cleaned: pd.DataFrame, divisor: float, out_csv) -> dict:
+    """
+    State after a full build from the cleaned daily frame (decimals, pre-listing masked).
+
+    ``out_csv`` must already hold the monthly returns written from ``cleaned``.
+    """
+    values = cleaned.to_numpy(dtype=np.float64)
+    month = _month_code(cleaned.index[-1])
+    codes = np.asarray(cleaned.index.year) * 12 + np.asarray(cleaned.index.month) - 1
+    prod = np.ones(values.shape[1])
+    for row in values[codes == month]:
+        prod *= np.where(np.isnan(row), 1.0, 1.0 + row)
+    return make_state(cleaned.columns, ~np.isnan(values).all(axis=0), prod, cleaned.index[-1],
+                      divisor, out_csv)
+
+
+def make_state(columns, listed, prod, last_date, divisor: float, out_csv) -> dict:
+    """State from its parts: listed flags and open-month ``1 + r`` product per column."""
+    last_date = pd.Timestamp(last_date)
+    return {'columns': np.asarray([str(c) for c in columns]),
+            'listed': np.asarray(listed, dtype=bool),
+            'prod': np.asarray(prod, dtype=np.float64),
+            'month': np.int64(_month_code(last_date)),
+            'last_date': np.datetime64(last_date, 'ns'),
+            'divisor': np.float64(divisor),
+            'offset': np.int64(_last_line_offset(out_csv))}
+
+
+def _csv_stamp(out_csv) -> dict:
+    st = os.stat(out_csv)
+    return {'csv_size': np.int64(st.st_size), 'csv_mtime_ns': np.int64(st.st_mtime_ns)}
+
+
+def save_state(state: dict, out_csv) -> None:
+    """Write ``state`` with the size and mtime of ``out_csv`` as it is now."""
+    path = state_path_for(out_csv)
+    tmp = path.with_name(path.name + '.tmp.npz')
+    np.savez(tmp, **{**state, **_csv_stamp(out_csv)})
+    os.replace(tmp, path)
+
+
+def discard_state(out_csv) -> None:
+    """Drop the append state of a monthly CSV that is being rewritten by other means."""
+    state_path_for(out_csv).unlink(missing_ok=True)
+
+
+def load_state(out_csv) -> dict:
+    """State saved with ``out_csv``; raises ValueError if the CSV changed since."""
+    path = state_path_for(out_csv)
+    if not path.exists():
+        raise FileNotFoundError(f'{path} not found; rebuild {Path(out_csv).name} with a full run before appending')
+    with np.load(path) as data:
+        state = {k: data[k][()] for k in data.files}
+    stamp = _csv_stamp(out_csv)
+    if any(state.get(k) != v for k, v in stamp.items()):
+        raise ValueError(f'{out_csv} changed since its append state was saved; '
+                         'rebuild it with a full run before appending')
+    return state
+
+
+def append_daily(new_rows: pd.DataFrame, out_csv) -> pd.DataFrame:
+    """
+    Fold new daily rows (source units, as loaded) into the monthly CSV and its state.
+
+    Rows must be dated after the last processed day and carry the same columns.
+    Returns the monthly rows that were (re)written.
+    """
+    state = load_state(out_csv)
+    columns = list(state['columns'])
+    if sorted(map(str, new_rows.columns)) != sorted(columns):
+        raise ValueError('new rows must have the same columns as the monthly file')
+    new_rows = new_rows.sort_index()
+    if len(new_rows) and new_rows.index[0] <= pd.Timestamp(state['last_date']):
+        raise ValueError(f'new rows must be dated after {pd.Timestamp(state["last_date"]).date()}')
+    new_rows.columns = new_rows.columns.map(str)
+    values = new_rows[columns].to_numpy(dtype=np.float64)
+    if state['divisor'] != 1.0:
+        values = values / state['divisor']
+
+    listed, prod, month = state['listed'].copy(), state['prod'].copy(), int(state['month'])
+    # the open month's line is always rewritten; later months are appended after it
+    labels, rows = [], []
+    for date, row in zip(new_rows.index, values):
+        code = _month_code(date)
+        if code != month:
+            labels.append(_month_end(month))
+            rows.append(prod - 1)
+            # months with no trading days compound to 0 for every column
+            for gap in range(month + 1, code):
+                labels.append(_month_end(gap))
+                rows.append(np.zeros_like(prod))
+            prod, month = np.ones_like(prod), code
+        listed |= np.isfinite(row) & (row != 0)
+        row = np.where(listed, row, np.nan)
+        prod *= np.where(np.isnan(row), 1.0, 1.0 + row)
+    labels.append(_month_end(month))
+    rows.append(prod - 1)
+
+    written = pd.DataFrame(np.vstack(rows), index=pd.DatetimeIndex(labels), columns=columns)
+    lines = written.to_csv(header=False).encode('utf-8')
+    with open(out_csv, 'r+b') as fh:
+        fh.seek(int(state['offset']))
+        fh.truncate()
+        fh.write(lines)
+    last_line = lines.rstrip(b'\r\n').rfind(b'\n') + 1
+
+    state.update(listed=listed, prod=prod, month=np.int64(month),
+                 last_date=np.datetime64(new_rows.index[-1], 'ns') if len(new_rows) else state['last_date'],
+                 offset=np.int64(int(state['offset']) + last_line))
+    save_state(state, out_csv)
+    return written
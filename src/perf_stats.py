@@ -0,0 +1,92 @@
+import numpy as np
+import pandas as pd
+
+METRICS = ('Arithmetic Return', 'Geometric Return', 'Annualized Volatility', 'Sharpe Ratio',
+           'Sortino Ratio', 'Maximum Drawdown', 'Max Drawdown Duration', 'Calmar Ratio',
+           'Hit Rate', 'Turnover', 'Observations')
+
+
+def turnover_from_weights(weights) -> np.ndarray:
+    """One-way turnover per period, ``0.5 * sum |w_t - w_{t-1}|`` over assets (first period: entry)."""
+    w = np.nan_to_num(np.asarray(weights, dtype=np.float64))
+    prev = np.vstack([np.zeros((1,) + w.shape[1:]), w[:-1]])
+    return 0.5 * np.abs(w - prev).sum(axis=-1)
+
+
+def performance_stats(returns, periods_per_year: int = 252, turnover=None) -> pd.DataFrame:
+    """
+    Performance metrics of every column of a dates x series return matrix in one pass.
+
+    NaNs are skipped per column, as if each series were ``dropna()``-ed first
+    (the drawdown path simply carries over missing periods).
+
+    Parameters
+    ----------
+    returns : pd.DataFrame, pd.Series or np.ndarray
+        Periodic simple returns, dates x series.
+    periods_per_year : int
+        252 for daily returns, 12 for monthly.
+    turnover : array-like, optional
+        Dates x series one-way turnover per period (e.g. from
+        ``turnover_from_weights``); its annualized mean is reported.
+
+    Returns
+    -------
+    pd.DataFrame
+        One row per series, columns ``METRICS``:
+
+        - ``Arithmetic Return``: mean * periods_per_year;
+        - ``Geometric Return``: prod(1 + r) ** (periods_per_year / n) - 1;
+        - ``Annualized Volatility``: sample std * sqrt(periods_per_year);
+        - ``Sharpe Ratio`` / ``Sortino Ratio``: arithmetic return over the
+          volatility / downside deviation (rf = 0, target 0);
+        - ``Maximum Drawdown`` of the compounded path and the longest spell
+          below a previous peak (``Max Drawdown Duration``, in periods);
+        - ``Calmar Ratio``: geometric return over |max drawdown|;
+        - ``Hit Rate``: share of periods with a positive return.
+    """
+    if isinstance(returns, pd.Series):
+        returns = returns.to_frame()
+    labels = returns.columns if isinstance(returns, pd.DataFrame) else None
+    r = np.asarray(returns, dtype=np.float64)
+    if r.ndim == 1:
+        r = r[:, None]
+    valid = np.isfinite(r)
+    r0 = np.where(valid, r, 0.0)
+    n = valid.sum(axis=0)
+
+    with np.errstate(invalid='ignore', divide='ignore'):
+        mean = r0.sum(axis=0) / n
+        var = np.where(n > 1, (np.where(valid, r - mean, 0.0) ** 2).sum(axis=0) / (n - 1), np.nan)
+        vol = np.sqrt(var) * np.sqrt(periods_per_year)
+        arith = mean * periods_per_year
+        downside = np.sqrt((np.minimum(r0, 0.0) ** 2).sum(axis=0) / n) * np.sqrt(periods_per_year)
+
+        # compounded path; missing periods multiply by 1 and are NaN-ed so they never set a peak
+        cum = np.cumprod(1.0 + r0, axis=0)
+        growth = cum[-1] if len(cum) else np.ones(r.shape[1])
+        geo = np.where(n > 0, growth ** (periods_per_year / n) - 1.0, np.nan)
+        cum[~valid] = np.nan
+        peak = np.fmax.accumulate(cum, axis=0)
+        dd = np.where(valid, cum / peak - 1.0, np.inf)
+        mdd = np.where(n > 0, dd.min(axis=0, initial=np.inf), np.nan)
+
+        # periods since the last peak, counted in valid observations only
+        count = np.cumsum(valid, axis=0)
+        last_peak = np.maximum.accumulate(np.where(valid & (dd >= 0), count, 0), axis=0)
+        duration = np.where(valid, count - last_peak, 0).max(axis=0, initial=0)
+
+        hit = (r0 > 0).sum(axis=0) / n
+        sharpe = arith / np.where(vol != 0, vol, np.nan)
+        sortino = arith / np.where(downside != 0, downside, np.nan)
+        calmar = geo / np.where(mdd != 0, np.abs(mdd), np.nan)
+        if turnover is None:
+            turn = np.full(r.shape[1], np.nan)
+        else:
+            turn = np.nanmean(np.asarray(turnover, dtype=np.float64).reshape(r.shape), axis=0) * periods_per_year
+
+    return pd.DataFrame({'Arithmetic Return': arith, 'Geometric Return': geo,
+                         'Annualized Volatility': vol, 'Sharpe Ratio': sharpe,
+                         'Sortino Ratio': sortino, 'Maximum Drawdown': mdd,
+                         'Max Drawdown Duration': duration, 'Calmar Ratio': calmar,
+                         'Hit Rate': hit, 'Turnover': turn, 'Observations': n}, index=labels)
@@ -0,0 +1,363 @@
+"""
+Single-pass report runner.
+
+Loads and cleans the fund/index data once and runs every analysis as a stage
+of a dependency graph, passing intermediates in memory. Stages whose inputs are
+ready run concurrently in a process pool; ``load`` and ``clean`` always run in
+the parent so the parse/clean work happens exactly once, and ``plots`` runs
+there too, fanning its figures out over its own pool (``plot_render``).
+
+Stage outputs are memoized in a content-addressed artifact cache (see
+``artifact_cache``): a re-run with the same data and parameters loads them back
+memory-mapped, and a changed parameter recomputes only the stages downstream
+of it. Results files are rewritten from the computed or cached outputs.
+
+    python src/pipeline.py --fund path/to/fund.csv --index path/to/index.csv
+"""
+import argparse
+import random
+import time
+from collections import namedtuple
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+from pathlib import Path
+
+import matplotlib
+matplotlib.use('Agg')
+import numpy as np
+import pandas as pd
+
+import aggregate_regression_single
+import aggregate_regression_twofactor
+import compute_fund_monthly_returns
+import compute_index_monthly_returns
+import plot_fund_vs_index_monthly_windows
+import plot_random_fund_vs_index
+import quintile_analysis
+import short_sell_strategy
+import top20_market_neutral
+from artifact_cache import DEFAULT_MAX_BYTES, ArtifactCache, artifact_key, code_fingerprint
+from data_loader import FUND_DAILY, INDEX_DAILY, load_aligned, percent_to_decimal, source_digest
+from instrumentation import detach, record, run_trace, stage as trace_stage
+from momentum import momentum_selection
+from month_index import monthly_compound
+from monthly_append import discard_state
+from plot_render import render_all
+from prelisting import first_trading_rows, mask_prelisting
+from window_analysis import WindowAnalysis
+
+RESULTS_DIR = Path(__file__).resolve().parents[1] / 'results'
+
+# local=True stages run in the parent process (no pickling of their inputs);
+# params are the cfg keys the stage output depends on (part of its cache key);
+# emit(output, cfg) writes the stage's results files, whether computed or cached
+Stage = namedtuple('Stage', ['name', 'deps', 'func', 'local', 'params', 'emit', 'cached'])
+
+
+def stage_load(inputs, cfg):
+    return load_aligned(cfg['fund_path'], cfg['index_path'])
+
+
+def stage_clean(inputs, cfg):
+    fund, index = inputs['load']
+    fund = percent_to_decimal(fund)
+    index = percent_to_decimal(index)
+    mask_prelisting(fund)
+    return fund, index
+
+
+def stage_start_dates(inputs, cfg):
+    fund = inputs['clean'][0]
+    rows = first_trading_rows(fund.to_numpy())
+    listed = rows < len(fund)
+    dates = np.full(len(rows), np.datetime64('NaT'), dtype='datetime64[ns]')
+    dates[listed] = fund.index.to_numpy()[rows[listed]]
+    return pd.Series(dates, index=fund.columns, name='start_date')
+
+
+def emit_start_dates(start_dates, cfg):
+    start_dates.to_csv(cfg['out_dir'] / 'fund_start_dates.csv')
+
+
+def stage_monthly(inputs, cfg):
+    fund, index = inputs['clean']
+    index = index.copy()
+    mask_prelisting(index)
+    return monthly_compound(fund), monthly_compound(index)
+
+
+def emit_monthly(monthly, cfg):
+    monthly_fund, monthly_index = monthly
+    for module, monthly_returns, name in [(compute_fund_monthly_returns, monthly_fund, 'monthly_fund_returns.csv'),
+                                          (compute_index_monthly_returns, monthly_index, 'monthly_index_returns.csv')]:
+        out_csv = cfg['out_dir'] / name
+        module.save_monthly(monthly_returns, out_csv)
+        # built from date-aligned data without an append state: a stale one would patch the wrong bytes
+        discard_state(out_csv)
+
+
+def stage_rankings(inputs, cfg):
+    return momentum_selection(inputs['monthly'][0], lookback=cfg['lookback'], stat='compound',
+                              top_frac=cfg['top_frac'])
+
+
+def stage_regress_single(inputs, cfg):
+    return aggregate_regression_single.run_regression(*inputs['clean'], hac_lags=cfg['hac_lags'])
+
+
+def emit_regress_single(result, cfg):
+    aggregate_regression_single.report(*result, cfg['out_dir'])
+
+
+def stage_regress_twofactor(inputs, cfg):
+    return aggregate_regression_twofactor.run_regression(*inputs['clean'], hac_lags=cfg['hac_lags'])
+
+
+def emit_regress_twofactor(result, cfg):
+    aggregate_regression_twofactor.report(*result, cfg['out_dir'])
+
+
+def stage_quintiles(inputs, cfg):
+    return quintile_analysis.run_quintiles(*inputs['clean'], cfg['n_tranches'])
+
+
+def emit_quintiles(result, cfg):
+    quintile_analysis.save_stats(result[2], cfg['out_dir'] / 'quintile_stats.csv')
+
+
+def stage_momentum(inputs, cfg):
+    fund, index = inputs['clean']
+    return short_sell_strategy.run_short_strategy(fund, index, selection=inputs['rankings'])
+
+
+def emit_momentum(result, cfg):
+    short_sell_strategy.save_stats(result[1], cfg['out_dir'] / 'short_strategy_stats.csv')
+
+
+def stage_neutral(inputs, cfg):
+    fund, index = inputs['clean']
+    return top20_market_neutral.run_market_neutral(fund, index, m_fund=inputs['monthly'][0])
+
+
+def emit_neutral(result, cfg):
+    top20_market_neutral.save_results(result[0], cfg['out_dir'] / 'market_neutral_results.csv')
+
+
+def stage_plots(inputs, cfg):
+    """Every report figure, rendered together in a process pool (see plot_render)."""
+    out_dir = cfg['out_dir']
+    specs = [
+        quintile_analysis.quintile_figure(inputs['quintiles'][1], out_dir / 'cumulative_returns_quintiles.png'),
+        short_sell_strategy.excess_figure(inputs['momentum'][0], out_dir / 'cumulative_returns_all.png'),
+        top20_market_neutral.hedge_ratio_figure(inputs['neutral'][1], out_dir / 'hedge_ratio_comparison.png'),
+    ]
+
+    windows = WindowAnalysis(*inputs['monthly'])
+    for start, end in plot_fund_vs_index_monthly_windows.WINDOWS:
+        specs.append(plot_fund_vs_index_monthly_windows.window_figure(
+            *windows.cumulative(start, end), start, end, out_dir / f'fund_vs_index_{start[:4]}_{end[:4]}.png'))
+
+    fund, index = inputs['clean']
+    pick = random.Random(cfg['seed']).choice(list(fund.columns))
+    reference = index.columns[0]
+    specs.append(plot_random_fund_vs_index.pair_figure(
+        *plot_random_fund_vs_index.fund_vs_index(fund, index, pick, reference),
+        pick, reference, out_dir / 'fund_vs_index.png'))
+
+    for out in render_all(specs, cfg['workers']):
+        print('Saved plot:', out)
+
+
+STAGES = [
+    Stage('load', (), stage_load, True, (), None, False),
+    Stage('clean', ('load',), stage_clean, True, (), None, True),
+    Stage('start_dates', ('clean',), stage_start_dates, True, (), emit_start_dates, True),
+    Stage('monthly', ('clean',), stage_monthly, False, (), emit_monthly, True),
+    Stage('rankings', ('monthly',), stage_rankings, True, ('lookback', 'top_frac'), None, True),
+    Stage('regress_single', ('clean',), stage_regress_single, False, ('hac_lags',),
+          emit_regress_single, True),
+    Stage('regress_twofactor', ('clean',), stage_regress_twofactor, False, ('hac_lags',),
+          emit_regress_twofactor, True),
+    Stage('quintiles', ('clean',), stage_quintiles, False, ('n_tranches',), emit_quintiles, True),
+    Stage('momentum', ('clean', 'rankings'), stage_momentum, False, (), emit_momentum, True),
+    Stage('neutral', ('clean', 'monthly'), stage_neutral, False, (), emit_neutral, True),
+    Stage('plots', ('clean', 'monthly', 'quintiles', 'momentum', 'neutral'), stage_plots, True,
+          ('seed',), None, False),
+]
+
+
+def _run_stage(stage, inputs, cfg):
+    output = stage.func(inputs, cfg)
+    if stage.emit is not None:
+        stage.emit(output, cfg)
+    return output
+
+
+def _with_dependencies(names, stages):
+    by_name = {s.name: s for s in stages}
+    needed, todo = set(), list(names)
+    while todo:
+        name = todo.pop()
+        if name not in by_name:
+            raise ValueError(f'Unknown stage {name!r}; expected one of {list(by_name)}')
+        if name not in needed:
+            needed.add(name)
+            todo.extend(by_name[name].deps)
+    return [s for s in stages if s.name in needed]
+
+
+def stage_keys(stages, cfg):
+    """
+    Cache key of every stage: its parameters and code fingerprint chained with
+    the keys of its inputs.
+
+    ``load`` is keyed on the content digests of the two source files, so an edited
+    CSV (or a changed parameter, or edited stage code) changes the key of exactly
+    the downstream stages.
+    """
+    keys = {}
+    for stage in stages:
+        if stage.name == 'load':
+            upstream = [source_digest(cfg['fund_path']), source_digest(cfg['index_path'])]
+        else:
+            upstream = [keys[d] for d in stage.deps]
+        keys[stage.name] = artifact_key(stage.name, {p: cfg[p] for p in stage.params}, upstream,
+                                        code_fingerprint(stage.func))
+    return keys
+
+
+def _report_stages(stages):
+    """Stages that write results or feed no other stage (pure intermediates are pulled in on demand)."""
+    consumed = {d for s in stages for d in s.deps}
+    return [s.name for s in stages if s.emit is not None or s.name not in consumed]
+
+
+def _plan_runs(plan, targets, keys, cache):
+    """Split the plan into stages served from the cache and stages that must run."""
+    by_name = {s.name: s for s in plan}
+    hits, runs, todo = set(), set(), list(targets)
+    while todo:
+        name = todo.pop()
+        if name in hits or name in runs:
+            continue
+        stage = by_name[name]
+        if cache is not None and stage.cached and keys[name] in cache:
+            hits.add(name)
+        else:
+            runs.add(name)
+            todo.extend(stage.deps)
+    return hits, [s for s in plan if s.name in runs]
+
+
+def run_pipeline(fund_path=FUND_DAILY, index_path=INDEX_DAILY, out_dir=RESULTS_DIR, workers=None,
+                 stages=None, n_tranches=5, hac_lags=None, seed=None, lookback=12, top_frac=0.20,
+                 cache=True):
+    """
+    Run the selected stages (default: all) and their dependencies.
+
+    Parameters
+    ----------
+    workers : int, optional
+        Process-pool size for independent stages; 1 runs everything in-process.
+    stages : list of str, optional
+        Stage names to run; their upstream stages are added automatically.
+    cache : bool or ArtifactCache
+        Memoize stage outputs on disk (``True`` uses the default cache directory).
+        Stages whose key is already cached are loaded memory-mapped instead of
+        recomputed, and stages that only feed cached stages are skipped entirely.
+
+    Returns
+    -------
+    (dict, dict)
+        In-memory outputs and wall-clock seconds per stage.
+    """
+    out_dir = Path(out_dir)
+    out_dir.mkdir(parents=True, exist_ok=True)
+    cfg = {'fund_path': fund_path, 'index_path': index_path, 'out_dir': out_dir,
+           'n_tranches': n_tranches, 'hac_lags': hac_lags, 'seed': seed,
+           'lookback': lookback, 'top_frac': top_frac, 'workers': workers}
+    if cache is True:
+        cache = ArtifactCache()
+    targets = stages or _report_stages(STAGES)
+    plan = _with_dependencies(targets, STAGES)
+    keys = stage_keys(plan, cfg) if cache else {}
+    hits, plan = _plan_runs(plan, targets, keys, cache or None)
+
+    outputs, timings, started = {}, {}, {}
+    for stage in STAGES:
+        if stage.name in hits:
+            started[stage.name] = time.perf_counter()
+            with trace_stage(stage.name, cached=True):
+                outputs[stage.name] = cache.get(keys[stage.name])
+                if stage.emit is not None:
+                    stage.emit(outputs[stage.name], cfg)
+            timings[stage.name] = time.perf_counter() - started[stage.name]
+
+    def finish(stage, output, remote=False):
+        outputs[stage.name] = output
+        timings[stage.name] = time.perf_counter() - started[stage.name]
+        if remote:
+            record(stage.name, timings[stage.name], started=started[stage.name], worker=True)
+        if cache and stage.cached:
+            with trace_stage(f'{stage.name}_cache_put'):
+                cache.put(keys[stage.name], output, info={'stage': stage.name})
+
+    by_name = {s.name: s for s in plan}
+    pending = list(plan)
+    running = {}
+    pool = ProcessPoolExecutor(max_workers=workers, initializer=detach) if workers != 1 else None
+    try:
+        while pending or running:
+            ready = [s for s in pending if all(d in outputs for d in s.deps)]
+            for stage in ready:
+                pending.remove(stage)
+                inputs = {d: outputs[d] for d in stage.deps}
+                started[stage.name] = time.perf_counter()
+                if pool is None or stage.local:
+                    with trace_stage(stage.name):
+                        output = _run_stage(stage, inputs, cfg)
+                    finish(stage, output)
+                else:
+                    running[pool.submit(_run_stage, stage, inputs, cfg)] = stage.name
+            if ready and any(s.local or pool is None for s in ready):
+                continue  # local results may unblock more stages right away
+            if not running:
+                if pending:
+                    raise RuntimeError(f'Unsatisfiable stages: {[s.name for s in pending]}')
+                break
+            done, _ = wait(running, return_when=FIRST_COMPLETED)
+            for fut in done:
+                finish(by_name[running.pop(fut)], fut.result(), remote=True)
+    finally:
+        if pool is not None:
+            pool.shutdown(cancel_futures=True)
+    return outputs, timings
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Run the full fund analysis report in one pass.')
+    parser.add_argument('--fund', default=FUND_DAILY, help='daily fund return CSV')
+    parser.add_argument('--index', default=INDEX_DAILY, help='daily index return CSV')
+    parser.add_argument('--out', default=str(RESULTS_DIR), help='output directory')
+    parser.add_argument('--workers', type=int, default=None, help='process pool size (1 = serial)')
+    parser.add_argument('--stages', nargs='+', default=None,
+                        help=f'subset of stages: {" ".join(s.name for s in STAGES)}')
+    parser.add_argument('--seed', type=int, default=None, help='seed for the sample fund plot')
+    parser.add_argument('--tranches', type=int, default=5, help='number of score tranches')
+    parser.add_argument('--hac-lags', type=int, default=None, help='Newey-West lags for regressions')
+    parser.add_argument('--lookback', type=int, default=12, help='momentum lookback in months')
+    parser.add_argument('--top-frac', type=float, default=0.20, help='momentum basket fraction')
+    parser.add_argument('--no-cache', action='store_true', help='recompute every stage')
+    parser.add_argument('--cache-mb', type=int, default=DEFAULT_MAX_BYTES >> 20,
+                        help='size bound of the artifact cache (least recently used evicted)')
+    args = parser.parse_args(argv)
+
+    cache = False if args.no_cache else ArtifactCache(max_bytes=args.cache_mb << 20)
+    # stage timings (and FUND_PROFILE profiles) go next to the outputs
+    with run_trace('pipeline', args.out):
+        run_pipeline(args.fund, args.index, args.out, workers=args.workers,
+                     stages=args.stages, n_tranches=args.tranches, hac_lags=args.hac_lags,
+                     seed=args.seed, lookback=args.lookback, top_frac=args.top_frac, cache=cache)
+
+
+if __name__ == '__main__':
+    main()
@@ -1,31 +1,24 @@
 import pandas as pd
-import matplotlib.pyplot as plt
 from pathlib import Path
 
+from instrumentation import stage, traced
+from plot_render import FigureSpec, render, render_all, series_line
+from window_analysis import FUND_MONTHLY, INDEX_MONTHLY, WindowAnalysis
 
-def run_window(start_date: str, end_date: str,
-               fund_monthly_csv: str, index_monthly_csv: str, out_png: Path):
-    """
-    Compare fund vs. index cumulative performance within a specific time window.
+WINDOWS = [('2006-01-01', '2009-12-31'), ('2014-01-01', '2016-12-31')]
+RESULTS_DIR = Path(__file__).resolve().parents[1] / 'results'
 
-    Parameters
-    ----------
-    start_date : str
-        Start date of the window (inclusive, e.g. '2006-01-01').
-    end_date : str
-        End date of the window (inclusive, e.g. '2009-12-31').
-    fund_monthly_csv : str
-        Path to the monthly fund returns CSV file.
-    index_monthly_csv : str
-        Path to the monthly index returns CSV file.
-    out_png : Path
-        Output path for the PNG plot.
-    """
 
-    # --- 1. Load monthly returns ---
-    fund_monthly = pd.read_csv(fund_monthly_csv, index_col=0, parse_dates=True)
-    index_monthly = pd.read_csv(index_monthly_csv, index_col=0, parse_dates=True)
+def window_cumulative(fund_monthly: pd.DataFrame, index_monthly: pd.DataFrame,
+                      start_date: str, end_date: str):
+    """
+    Cumulative growth of the equal-weighted fund average and of each index within a window.
 
+    Returns
+    -------
+    (pd.Series, pd.DataFrame)
+        Fund-average and index growth multiples over the window's months.
+    """
     # --- 2. Subset the desired window ---
     fund_sub = fund_monthly.loc[start_date:end_date].copy()
     index_sub = index_monthly.loc[start_date:end_date].copy()
@@ -47,37 +40,87 @@ def run_window(start_date: str, end_date: str,
     # --- 6. Safety checks ---
     assert fund_cumulative.notna().any(), "No valid fund data in the given window."
     assert index_cumulative.notna().any().any(), "No valid index data in the given window."
+    return fund_cumulative, index_cumulative
 
+
+def window_figure(fund_cumulative: pd.Series, index_cumulative: pd.DataFrame,
+                  start_date: str, end_date: str, out_png: Path) -> FigureSpec:
     # --- 7. Plot cumulative performance ---
-    plt.figure(figsize=(12, 6))
-    ax = plt.gca()
-    ax.plot(fund_cumulative, label='Fund Average')
-    for col in index_cumulative.columns:
-        ax.plot(index_cumulative[col], label=col)
-
-    ax.axhline(1.0, linewidth=1, linestyle='--', alpha=0.6)
-    ax.set_title(f'Fund Average vs Index Cumulative ({start_date}–{end_date})')
-    ax.set_ylabel('Cumulative Growth (×)')
-    ax.grid(True, alpha=0.3)
-    ax.legend()
-    plt.tight_layout()
+    lines = [series_line(fund_cumulative, 'Fund Average')]
+    lines += [series_line(index_cumulative[col], col) for col in index_cumulative.columns]
+    return FigureSpec(out_png, lines, f'Fund Average vs Index Cumulative ({start_date}–{end_date})',
+                      xlabel=None, ylabel='Cumulative Growth (×)', grid={'alpha': 0.3},
+                      hline=(1.0, {'linewidth': 1, 'linestyle': '--', 'alpha': 0.6}))
+
 
+def plot_window(fund_cumulative: pd.Series, index_cumulative: pd.DataFrame,
+                start_date: str, end_date: str, out_png: Path):
     # --- 8. Save figure ---
-    out_png.parent.mkdir(parents=True, exist_ok=True)
-    plt.savefig(out_png, dpi=150)
-    plt.close()
+    render(window_figure(fund_cumulative, index_cumulative, start_date, end_date, out_png))
     print('Saved:', out_png)
 
 
-if __name__ == '__main__':
-    # Define project root and file paths
-    root = Path(__file__).resolve().parents[1]
-    fm = root / 'results' / 'monthly_fund_returns.csv'
-    im = root / 'results' / 'monthly_index_returns.csv'
+def read_monthly(fund_monthly_csv: str, index_monthly_csv: str):
+    """Monthly fund and index returns as written by the compute_*_monthly_returns scripts."""
+    fund_monthly = pd.read_csv(fund_monthly_csv, index_col=0, parse_dates=True)
+    index_monthly = pd.read_csv(index_monthly_csv, index_col=0, parse_dates=True)
+    return fund_monthly, index_monthly
+
+
+def run_window(start_date: str, end_date: str,
+               fund_monthly_csv: str, index_monthly_csv: str, out_png: Path):
+    """
+    Compare fund vs. index cumulative performance within a specific time window.
 
+    Parameters
+    ----------
+    start_date : str
+        Start date of the window (inclusive, e.g. '2006-01-01').
+    end_date : str
+        End date of the window (inclusive, e.g. '2009-12-31').
+    fund_monthly_csv : str
+        Path to the monthly fund returns CSV file.
+    index_monthly_csv : str
+        Path to the monthly index returns CSV file.
+    out_png : Path
+        Output path for the PNG plot.
+    """
+
+    # --- 1. Load monthly returns ---
+    with stage('read_monthly'):
+        fund_monthly, index_monthly = read_monthly(fund_monthly_csv, index_monthly_csv)
+
+    with stage('window_cumulative'):
+        fund_cumulative, index_cumulative = window_cumulative(fund_monthly, index_monthly,
+                                                              start_date, end_date)
+    with stage('plot'):
+        plot_window(fund_cumulative, index_cumulative, start_date, end_date, out_png)
+
+
+def run_windows(windows, fund_monthly_csv: str, index_monthly_csv: str, out_dir: Path, workers=None):
+    """
+    ``run_window`` for many windows: the monthly files are read once, every
+    window is answered from ``WindowAnalysis`` prefix arrays and the figures are
+    rendered in a process pool (``workers``, see ``render_all``).
+    """
+    with stage('read_monthly'):
+        analysis = WindowAnalysis(*read_monthly(fund_monthly_csv, index_monthly_csv))
+
+    with stage('window_cumulative'):
+        specs = [window_figure(*analysis.cumulative(start, end), start, end,
+                               Path(out_dir) / f'fund_vs_index_{start[:4]}_{end[:4]}.png')
+                 for start, end in windows]
+    with stage('plot', figures=len(specs)):
+        for out in render_all(specs, workers):
+            print('Saved:', out)
+
+
+@traced('plot_fund_vs_index_monthly_windows')
+def main(fund_monthly_csv=FUND_MONTHLY, index_monthly_csv=INDEX_MONTHLY, out_dir=RESULTS_DIR,
+         windows=WINDOWS, workers=None):
     # Run selected analysis windows
-    run_window('2006-01-01', '2009-12-31', str(fm), str(im),
-               root / 'results' / 'fund_vs_index_2006_2009.png')
+    run_windows(windows, str(fund_monthly_csv), str(index_monthly_csv), out_dir, workers)
+
 
-    run_window('2014-01-01', '2016-12-31', str(fm), str(im),
-               root / 'results' / 'fund_vs_index_2014_2016.png')
+if __name__ == '__main__':
+    main()
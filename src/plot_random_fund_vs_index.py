@@ -1,63 +1,181 @@
+import argparse
+import numpy as np
 import pandas as pd
-import matplotlib.pyplot as plt
 import random
 from pathlib import Path
 
-FUND_PATH = r'D:\A_share_market\20240910_fund_dayReturn.csv'
-INDEX_PATH = r'D:\A_share_market\20240910_index_return.csv'
+from data_loader import FUND_DAILY, INDEX_DAILY, load_daily, percent_to_decimal
+from instrumentation import stage, traced
+from plot_render import FigureSpec, render, render_all, series_line
+from prelisting import mask_prelisting
 
-def replace_leading_zeros_with_nan(series: pd.Series) -> pd.Series:
-    # Determine the first non-zero return index
-    non_zero_mask = series.ne(0)
-    first_valid_idx = non_zero_mask.idxmax()
-    if series.loc[first_valid_idx] == 0:
-        return series.mask(series == 0)
-    # Set zeros before the first non-zero as missing (pre-listing period)
-    series.loc[:first_valid_idx] = series.loc[:first_valid_idx].replace(0.0, pd.NA)
-    return series
+RESULTS_DIR = Path(__file__).resolve().parents[1] / 'results'
+COMPARE_INDICES = ['000300.SH', '000905.SH', '000906.SH']
+BLOCK = 512  # funds per matrix product in batch mode
 
-def main():
+def fund_vs_index(fund_df: pd.DataFrame, index_df: pd.DataFrame, fund: str, reference_index: str):
+    """Cumulative returns of one fund and one index over their common valid dates."""
+    fund_series = fund_df[fund].dropna()
+    index_series = index_df[reference_index].dropna()
+    common_dates = fund_series.index.intersection(index_series.index)
+
+    cumulative_fund = (1 + fund_series.loc[common_dates]).cumprod() - 1
+    cumulative_index = (1 + index_series.loc[common_dates]).cumprod() - 1
+    return cumulative_fund, cumulative_index
+
+def pairwise_stats(fund_df, index_df: pd.DataFrame, periods_per_year: int = 252,
+                   block: int = BLOCK) -> pd.DataFrame:
+    """
+    ``fund_vs_index`` metrics for every fund against every index column at once.
+
+    Each (fund, index) pair is measured on the dates where both have a valid
+    return, as in ``fund_vs_index``. All pair sums (counts, sums, squares,
+    cross products, log growth) come from matrix products of the
+    validity-masked fund block with the masked index matrix, ``block`` funds at
+    a time. ``fund_df`` may also be a ``compact.CompactReturns``.
+
+    Returns
+    -------
+    pd.DataFrame
+        One row per (fund, index): observations, cumulative fund and index
+        return, excess cumulative return, annualized tracking error and
+        information ratio of the daily active return, and correlation.
+    """
+    index = index_df.reindex(fund_df.index).to_numpy(dtype=np.float64)
+    index_valid = np.isfinite(index)
+    index0 = np.where(index_valid, index, 0.0)
+    index_log = np.where(index_valid, np.log1p(index0), 0.0)
+    valid_i = index_valid.astype(np.float64)
+
+    if isinstance(fund_df, pd.DataFrame):
+        values = fund_df.to_numpy(dtype=np.float64, copy=False)
+        blocks = ((c0, values[:, c0:c0 + block]) for c0 in range(0, values.shape[1], block))
+    else:
+        blocks = fund_df.iter_blocks(block)
+
+    shape = (len(fund_df.columns), index.shape[1])
+    n, s_f, s_i, s_ff, s_ii, s_fi, log_f, log_i = (np.zeros(shape) for _ in range(8))
+    for c0, part in blocks:
+        rows = slice(c0, c0 + part.shape[1])
+        valid = np.isfinite(part)
+        fund0 = np.where(valid, part, 0.0)
+        valid_f = valid.astype(np.float64)
+        n[rows] = valid_f.T @ valid_i
+        s_f[rows] = fund0.T @ valid_i
+        s_i[rows] = valid_f.T @ index0
+        s_ff[rows] = (fund0 * fund0).T @ valid_i
+        s_ii[rows] = valid_f.T @ (index0 * index0)
+        s_fi[rows] = fund0.T @ index0
+        log_f[rows] = np.where(valid, np.log1p(fund0), 0.0).T @ valid_i
+        log_i[rows] = valid_f.T @ index_log
+
+    with np.errstate(invalid='ignore', divide='ignore'):
+        dof = np.where(n > 1, n - 1, np.nan)
+        var_f = (s_ff - s_f * s_f / n) / dof
+        var_i = (s_ii - s_i * s_i / n) / dof
+        cov = (s_fi - s_f * s_i / n) / dof
+        active_mean = (s_f - s_i) / n
+        active_var = np.maximum(var_f + var_i - 2 * cov, 0.0)
+        tracking_error = np.sqrt(active_var * periods_per_year)
+        info_ratio = np.where(tracking_error > 0, active_mean * periods_per_year / tracking_error, np.nan)
+        corr = cov / np.sqrt(var_f * var_i)
+    fund_cum = np.where(n > 0, np.expm1(log_f), np.nan)
+    index_cum = np.where(n > 0, np.expm1(log_i), np.nan)
+
+    table = pd.DataFrame({
+        'fund': np.repeat(np.asarray(fund_df.columns), shape[1]),
+        'index': np.tile(np.asarray(index_df.columns), shape[0]),
+        'observations': n.ravel().astype(np.int64),
+        'fund_cumulative': fund_cum.ravel(),
+        'index_cumulative': index_cum.ravel(),
+        'excess_cumulative': (fund_cum - index_cum).ravel(),
+        'tracking_error': tracking_error.ravel(),
+        'information_ratio': info_ratio.ravel(),
+        'correlation': corr.ravel(),
+    })
+    return table
+
+def pair_figure(cumulative_fund, cumulative_index, fund: str, reference_index: str, out: Path) -> FigureSpec:
+    return FigureSpec(out, [series_line(cumulative_fund, f'Fund: {fund}', linewidth=2),
+                            series_line(cumulative_index, f'Index: {reference_index}', linewidth=2)],
+                      'Cumulative Return: Fund vs Index', ylabel='Cumulative Return')
+
+def plot_pair(cumulative_fund, cumulative_index, fund: str, reference_index: str, out: Path):
+    render(pair_figure(cumulative_fund, cumulative_index, fund, reference_index, out))
+    print('Saved plot:', out)
+
+def load_returns(fund_path=FUND_DAILY, index_path=INDEX_DAILY):
+    """Fund returns in decimals with pre-listing days masked, and index returns in decimals."""
     # Load fund daily returns
-    fund_df = pd.read_csv(FUND_PATH)
-    fund_df.rename(columns={fund_df.columns[0]: 'date'}, inplace=True)
-    fund_df['date'] = pd.to_datetime(fund_df['date'], format='%Y-%m-%d')
-    fund_df.set_index('date', inplace=True)
-    if fund_df.abs().stack().quantile(0.999) > 1:
-        fund_df = fund_df / 100.0
-    fund_df = fund_df.apply(replace_leading_zeros_with_nan)
+    fund_df = load_daily(fund_path)
+    with stage('percent_check'):
+        fund_df = percent_to_decimal(fund_df)
+    with stage('mask_prelisting'):
+        mask_prelisting(fund_df)
 
     # Load index returns
-    index_df = pd.read_csv(INDEX_PATH, encoding='gbk')
-    index_df.rename(columns={index_df.columns[0]: 'date'}, inplace=True)
-    index_df['date'] = pd.to_datetime(index_df['date'].astype(str), format='%Y%m%d')
-    index_df.set_index('date', inplace=True)
-    if index_df.abs().stack().quantile(0.999) > 1:
-        index_df = index_df / 100.0
+    index_df = percent_to_decimal(load_daily(index_path))
+    return fund_df, index_df
+
+@traced('plot_random_fund_vs_index')
+def main(seed=None, fund_path=FUND_DAILY, index_path=INDEX_DAILY, out_dir=RESULTS_DIR):
+    fund_df, index_df = load_returns(fund_path, index_path)
 
     # Randomly pick a fund & a reference index
-    random_fund = random.choice(fund_df.columns)
+    random_fund = random.Random(seed).choice(fund_df.columns)
     reference_index = index_df.columns[0]
 
     # Align dates and compute cumulative returns
-    fund_series = fund_df[random_fund].dropna()
-    index_series = index_df[reference_index].dropna()
-    common_dates = fund_series.index.intersection(index_series.index)
-
-    cumulative_fund = (1 + fund_series.loc[common_dates]).cumprod() - 1
-    cumulative_index = (1 + index_series.loc[common_dates]).cumprod() - 1
+    with stage('cumulative'):
+        cumulative_fund, cumulative_index = fund_vs_index(fund_df, index_df, random_fund, reference_index)
+    with stage('plot'):
+        plot_pair(cumulative_fund, cumulative_index, random_fund, reference_index,
+                  Path(out_dir) / 'fund_vs_index.png')
 
-    # Plot
-    plt.figure(figsize=(12, 6))
-    plt.plot(cumulative_fund.index, cumulative_fund, label=f'Fund: {random_fund}', linewidth=2)
-    plt.plot(cumulative_index.index, cumulative_index, label=f'Index: {reference_index}', linewidth=2)
-    plt.title('Cumulative Return: Fund vs Index')
-    plt.xlabel('Date'); plt.ylabel('Cumulative Return')
-    plt.legend(); plt.grid(True); plt.tight_layout()
+@traced('fund_vs_index_batch')
+def batch_main(sample: int = 10, seed=None, funds=None, reference_index: str = None, workers=None,
+               fund_path=FUND_DAILY, index_path=INDEX_DAILY, out_dir=RESULTS_DIR):
+    """
+    Every fund against every index in one pass (``results/fund_vs_index_summary.csv``),
+    plus charts for ``funds`` or a seeded sample of ``sample`` funds.
+    """
+    fund_df, index_df = load_returns(fund_path, index_path)
+    out_dir = Path(out_dir)
+    indices = [c for c in COMPARE_INDICES if c in index_df.columns] or list(index_df.columns)
 
-    out = Path(__file__).resolve().parents[1] / 'results' / 'fund_vs_index.png'
+    with stage('pairwise_stats', funds=len(fund_df.columns)):
+        table = pairwise_stats(fund_df, index_df[indices])
+    out = out_dir / 'fund_vs_index_summary.csv'
     out.parent.mkdir(parents=True, exist_ok=True)
-    plt.savefig(out, dpi=150)
-    print('Saved plot:', out)
+    table.to_csv(out, index=False)
+    print(f'Saved {len(table)} fund/index pairs:', out)
+
+    reference_index = reference_index or indices[0]
+    if funds is None:
+        rng = random.Random(seed)
+        funds = rng.sample(list(fund_df.columns), min(sample, len(fund_df.columns)))
+    with stage('plot', figures=len(funds)):
+        specs = [pair_figure(*fund_vs_index(fund_df, index_df, fund, reference_index), fund, reference_index,
+                             out_dir / 'fund_vs_index' / f'{fund}_{reference_index}.png')
+                 for fund in funds]
+        for path in render_all(specs, workers):
+            print('Saved plot:', path)
 
 if __name__ == '__main__':
-    main()
\ No newline at end of file
+    parser = argparse.ArgumentParser(description='Cumulative return of funds against the reference indices.')
+    parser.add_argument('--fund', default=FUND_DAILY, help='daily fund return CSV')
+    parser.add_argument('--index', default=INDEX_DAILY, help='daily index return CSV')
+    parser.add_argument('--out', default=str(RESULTS_DIR), help='output directory')
+    parser.add_argument('--batch', action='store_true',
+                        help='metrics for every fund vs every index, charts for a sample only')
+    parser.add_argument('--seed', type=int, default=None, help='seed for the fund pick / sample')
+    parser.add_argument('--sample', type=int, default=10, help='charts drawn in batch mode')
+    parser.add_argument('--funds', nargs='+', default=None, help='chart these funds instead of a sample')
+    parser.add_argument('--reference-index', default=None, help='reference index column of the batch charts')
+    parser.add_argument('--workers', type=int, default=None, help='processes rendering the charts')
+    args = parser.parse_args()
+    if args.batch:
+        batch_main(args.sample, args.seed, args.funds, args.reference_index, args.workers, args.fund, args.index,
+                   args.out)
+    else:
+        main(args.seed, args.fund, args.index, args.out)
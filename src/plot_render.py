@@ -0,0 +1,109 @@
+"""
+Headless figure rendering, decoupled from the analyses.
+
+Scripts describe each chart as a ``FigureSpec`` (precomputed x/y arrays plus
+titles and styling) instead of drawing it inline; ``render`` draws one spec
+with the Agg backend through the object-oriented ``Figure`` API (no pyplot
+state), and ``render_all`` spreads many specs over a process pool, so report
+generation scales with cores rather than with the number of charts.
+
+Curves longer than the figure is wide are downsampled to pixel resolution
+first: per pixel column the first, last, minimum and maximum points are kept,
+so the drawn line (including every spike) is unchanged while matplotlib only
+strokes a few thousand vertices.
+"""
+import os
+from collections import namedtuple
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+
+import numpy as np
+
+# one curve: x (dates or numbers), y, legend label and Axes.plot keyword arguments
+Line = namedtuple('Line', ['label', 'x', 'y', 'style'], defaults=[None])
+
+# grid: True or Axes.grid keyword arguments; hline: (y, Axes.axhline keyword arguments) or None
+FigureSpec = namedtuple('FigureSpec', ['out', 'lines', 'title', 'xlabel', 'ylabel', 'figsize', 'dpi',
+                                       'legend_loc', 'grid', 'hline'],
+                        defaults=['Date', None, (12, 6), 150, 'best', True, None])
+
+
+def series_line(series, label: str, **style) -> Line:
+    """``Line`` from a date-indexed Series."""
+    return Line(label, series.index.to_numpy(), series.to_numpy(dtype=np.float64), style)
+
+
+def downsample(x: np.ndarray, y: np.ndarray, width: int):
+    """
+    Reduce a curve to at most 4 points per pixel column (first, min, max, last).
+
+    Pixel columns are cut within each run of finite points, and every NaN gap
+    is kept as a single NaN point, so separate segments are never joined;
+    curves already shorter than ``4 * width`` are returned unchanged.
+    """
+    x, y = np.asarray(x), np.asarray(y, dtype=np.float64)
+    if len(y) <= 4 * width:
+        return x, y
+    valid = np.flatnonzero(np.isfinite(y))
+    # segment number of every finite point: a new segment starts after each gap
+    segment = np.cumsum(np.r_[False, np.diff(valid) > 1])
+    if len(valid) <= 4 * width:
+        keep = np.arange(len(valid))
+    else:
+        bucket = (valid * width) // len(y)
+        group = np.cumsum(np.r_[False, (np.diff(bucket) > 0) | (np.diff(segment) > 0)])
+        starts = np.flatnonzero(np.r_[True, np.diff(group) > 0])
+        stops = np.r_[starts[1:], len(valid)] - 1
+        # sort by (group, y): each group's first entry is its minimum, last its maximum
+        order = np.lexsort((y[valid], group))
+        keep = np.unique(np.concatenate([starts, stops, order[starts], order[stops]]))
+    rows = valid[keep]
+    # one NaN point (the one just before the segment) ahead of every segment but the first
+    breaks = np.flatnonzero(np.diff(segment[keep]) > 0) + 1
+    return np.insert(x[rows], breaks, x[rows[breaks] - 1]), np.insert(y[rows], breaks, np.nan)
+
+
+def render(spec: FigureSpec) -> Path:
+    """Draw one figure to ``spec.out`` (PNG or any format Agg writes) and return the path."""
+    # matplotlib loads on the first draw only, so building specs stays cheap
+    import matplotlib
+    matplotlib.use('Agg')
+    from matplotlib.figure import Figure
+
+    fig = Figure(figsize=spec.figsize)
+    ax = fig.add_subplot()
+    width = int(spec.figsize[0] * spec.dpi)
+    for line in spec.lines:
+        x, y = downsample(line.x, line.y, width)
+        ax.plot(x, y, label=line.label, **(line.style or {}))
+    if spec.hline is not None:
+        ax.axhline(spec.hline[0], **spec.hline[1])
+    ax.set_title(spec.title)
+    if spec.xlabel:
+        ax.set_xlabel(spec.xlabel)
+    if spec.ylabel:
+        ax.set_ylabel(spec.ylabel)
+    if spec.grid:
+        ax.grid(True, **(spec.grid if isinstance(spec.grid, dict) else {}))
+    ax.legend(loc=spec.legend_loc)
+    fig.tight_layout()
+
+    out = Path(spec.out)
+    out.parent.mkdir(parents=True, exist_ok=True)
+    fig.savefig(out, dpi=spec.dpi)
+    return out
+
+
+def render_all(specs, workers: int = None) -> list:
+    """
+    Render every spec, in a process pool when there is more than one.
+
+    ``workers`` defaults to the CPU count (capped at the number of figures);
+    1 renders serially in-process. Returns the output paths in spec order.
+    """
+    specs = list(specs)
+    workers = min(workers or os.cpu_count() or 1, len(specs))
+    if workers <= 1:
+        return [render(spec) for spec in specs]
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        return list(pool.map(render, specs))
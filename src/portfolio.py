@@ -0,0 +1,209 @@
+"""
+Buy-and-hold portfolio accounting for monthly rebalanced fund baskets.
+
+The strategy scripts average the selected funds' returns every day, which
+silently rebalances the basket back to equal weights daily. ``drift_portfolio``
+instead buys the target weights on the first trading day of a month and lets
+them drift with each fund's returns until the next rebalance:
+
+- within a month, every held fund's growth is a cumulative product over the
+  month's row block, and the portfolio value is that growth matrix times the
+  starting weights, so a month costs one ``cumprod`` and one matrix product;
+- a fund without a return on some day (stopped reporting, suspended) is held
+  flat at its last value and sold at the next rebalance;
+- each rebalance is charged ``cost`` per unit of value traded plus
+  ``subscription_fee`` on purchases and ``redemption_fee`` on sales, deducted
+  from the NAV before the day's return.
+
+    python src/portfolio.py --strategy short_sell --cost 0.001 --subscription-fee 0.015 --redemption-fee 0.005
+"""
+import argparse
+from collections import namedtuple
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+from data_loader import FUND_DAILY, INDEX_DAILY, load_cleaned
+from hedging import hedge_sweep, sweep_stats
+from instrumentation import stage, trace_output, traced
+from momentum import momentum_selection
+from month_index import month_positions, month_row_bounds, monthly_compound
+from perf_stats import performance_stats
+from short_sell_strategy import BETAS, momentum_portfolio_returns
+
+RESULTS_DIR = Path(__file__).resolve().parents[1] / 'results'
+TRADE_COLUMNS = ['Turnover', 'Bought', 'Sold', 'Cost', 'Holdings']
+
+# nav/returns: daily Series; weights: dates x funds end-of-day weights (None unless tracked);
+# trades: rebalance date x TRADE_COLUMNS
+Portfolio = namedtuple('Portfolio', ['nav', 'returns', 'weights', 'trades'])
+
+# basket settings of the two strategy scripts; lag: extra months between selection and holding
+STRATEGIES = {
+    'short_sell': dict(lookback=12, stat='compound', top_frac=0.2, min_periods=None, lag=0),
+    'top20': dict(lookback=6, stat='mean', top_frac=0.2, min_periods=1, lag=1),
+}
+
+
+def drift_portfolio(returns: pd.DataFrame, targets: pd.DataFrame, cost: float = 0.0,
+                    subscription_fee: float = 0.0, redemption_fee: float = 0.0,
+                    track_weights: bool = True) -> Portfolio:
+    """
+    Daily NAV of a long-only basket rebalanced to ``targets`` at month starts.
+
+    Parameters
+    ----------
+    returns : pd.DataFrame
+        Cleaned daily fund returns (decimals, NaN where a fund has no return).
+    targets : pd.DataFrame
+        Month x fund target weights, months as month-end dates or Periods
+        (e.g. a ``momentum_selection`` mask: True = equal weight). Rows are
+        normalized to sum to one and applied on the month's first trading
+        day; an all-zero row moves to cash, an all-NaN row or a month
+        without a row keeps the drifted holdings.
+    cost : float
+        Transaction cost per unit of value bought or sold.
+    subscription_fee, redemption_fee : float
+        Fund purchase / sale fees per unit of value.
+    track_weights : bool
+        Also return the dates x funds end-of-day weights (dense; disable for
+        whole-universe runs if memory is tight).
+
+    Returns
+    -------
+    Portfolio
+        ``nav`` (1 before the first purchase), net daily ``returns`` (NaN
+        before the first purchase, 0 in cash), ``weights`` and ``trades``:
+        per rebalance the one-way turnover ``0.5 * sum |w_new - w_old|`` (the
+        first purchase counts as entry, as in
+        ``perf_stats.turnover_from_weights``), value bought and sold, cost
+        charged and number of funds held.
+    """
+    values = returns.to_numpy(dtype=np.float64)
+    n_days, n_funds = values.shape
+    months, starts, stops = month_row_bounds(returns.index)
+
+    target = targets.reindex(columns=returns.columns).to_numpy(dtype=np.float64)
+    keep = np.isnan(target).all(axis=1)
+    target = np.nan_to_num(target)
+    if (target < 0).any():
+        raise ValueError('drift_portfolio is long-only; target weights must be non-negative')
+    row_of_month = np.full(len(months), -1)
+    pos = month_positions(months, targets.index)
+    row_of_month[pos[pos >= 0]] = np.flatnonzero(pos >= 0)
+
+    nav = np.ones(n_days)
+    weights = np.zeros((n_days, n_funds)) if track_weights else None
+    w = np.zeros(n_funds)  # current weights as fractions of the NAV
+    level = 1.0
+    first = None
+    trades, trade_dates = [], []
+
+    for m, (start, stop) in enumerate(zip(starts, stops)):
+        row = row_of_month[m]
+        charge = 0.0
+        if row >= 0 and not keep[row]:
+            total = target[row].sum()
+            new = target[row] / total if total > 0 else np.zeros(n_funds)
+            delta = new - w
+            bought, sold = delta.clip(min=0).sum(), (-delta).clip(min=0).sum()
+            charge = cost * (bought + sold) + subscription_fee * bought + redemption_fee * sold
+            trades.append((0.5 * (bought + sold), bought, sold, charge, np.count_nonzero(new)))
+            trade_dates.append(returns.index[start])
+            w = new
+
+        held = np.flatnonzero(w)
+        level *= 1.0 - charge
+        if not len(held):
+            nav[start:stop] = level
+            continue
+        if first is None:
+            first = start
+
+        # growth of each held fund since the month start; missing days held flat
+        block = values[start:stop, held]
+        growth = np.cumprod(1.0 + np.where(np.isfinite(block), block, 0.0), axis=0)
+        value = growth @ w[held]
+        nav[start:stop] = level * value
+        if track_weights:
+            weights[start:stop, held] = growth * (w[held] / value[:, None])
+        w[held] = w[held] * growth[-1] / value[-1]
+        level = nav[stop - 1]
+
+    daily = nav / np.r_[1.0, nav[:-1]] - 1.0
+    daily[:first if first is not None else n_days] = np.nan
+    dates = pd.DatetimeIndex(trade_dates, name='rebalance')
+    return Portfolio(
+        pd.Series(nav, index=returns.index, name='NAV'),
+        pd.Series(daily, index=returns.index, name='Return'),
+        pd.DataFrame(weights, index=returns.index, columns=returns.columns) if track_weights else None,
+        pd.DataFrame(trades, index=dates, columns=TRADE_COLUMNS).astype({'Holdings': int}),
+    )
+
+
+def strategy_targets(monthly_fund: pd.DataFrame, strategy: str = 'short_sell') -> pd.DataFrame:
+    """Month x fund equal-weight targets of the momentum basket of ``strategy`` (``STRATEGIES``)."""
+    settings = dict(STRATEGIES[strategy])
+    lag = settings.pop('lag')
+    selection = momentum_selection(monthly_fund, **settings)
+    return selection.shift(lag, fill_value=False) if lag else selection
+
+
+def compare_weighting(fund: pd.DataFrame, index: pd.DataFrame, portfolio: Portfolio, selection: pd.DataFrame,
+                      betas=BETAS, index_col: str = '000300.SH') -> pd.DataFrame:
+    """
+    ``sweep_stats`` of the hedged basket for every beta, daily-rebalanced
+    (as in ``short_sell_strategy``) vs buy-and-hold drift net of costs, with
+    the drift portfolio's annualized turnover.
+    """
+    rebalanced, _ = momentum_portfolio_returns(fund, index, index_col, selection=selection)
+    drift = portfolio.returns.dropna()
+    tables = {}
+    for label, port in [('Daily rebalanced', rebalanced), ('Buy-and-hold drift', drift)]:
+        tables[label] = sweep_stats(hedge_sweep(port, index[index_col], betas))
+    stats = pd.concat(tables, names=['Weighting', 'Beta'])
+    turnover = portfolio.trades['Turnover'].reindex(drift.index, fill_value=0.0)
+    stats['Turnover'] = np.nan
+    stats.loc['Buy-and-hold drift', 'Turnover'] = performance_stats(drift, turnover=turnover)['Turnover'].iloc[0]
+    return stats
+
+
+@traced('portfolio')
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Buy-and-hold drift backtest of the momentum baskets with costs.')
+    parser.add_argument('--fund', default=FUND_DAILY, help='daily fund return CSV')
+    parser.add_argument('--index', default=INDEX_DAILY, help='daily index return CSV')
+    parser.add_argument('--strategy', choices=sorted(STRATEGIES), default='short_sell')
+    parser.add_argument('--cost', type=float, default=0.0, help='transaction cost per unit traded')
+    parser.add_argument('--subscription-fee', type=float, default=0.0, help='fee per unit bought')
+    parser.add_argument('--redemption-fee', type=float, default=0.0, help='fee per unit sold')
+    parser.add_argument('--betas', type=float, nargs='+', default=BETAS)
+    parser.add_argument('--out', default=str(RESULTS_DIR), help='output directory')
+    args = parser.parse_args(argv)
+    trace_output(args.out)
+
+    with stage('load_cleaned'):
+        fund, index = load_cleaned(args.fund, args.index)
+    with stage('monthly_compound'):
+        targets = strategy_targets(monthly_compound(fund), args.strategy)
+    with stage('drift_portfolio', funds=fund.shape[1]):
+        portfolio = drift_portfolio(fund, targets, args.cost, args.subscription_fee, args.redemption_fee)
+    with stage('compare'):
+        stats = compare_weighting(fund, index, portfolio, targets, args.betas)
+
+    with stage('save'):
+        out = Path(args.out)
+        out.mkdir(parents=True, exist_ok=True)
+        prefix = out / f'portfolio_{args.strategy}'
+        pd.concat([portfolio.nav, portfolio.returns], axis=1).to_csv(f'{prefix}_nav.csv')
+        held = portfolio.weights.loc[:, (portfolio.weights != 0).any()]
+        held.to_csv(f'{prefix}_weights.csv')
+        portfolio.trades.to_csv(f'{prefix}_trades.csv')
+        stats.to_csv(f'{prefix}_stats.csv')
+        print('Saved NAV, weights, trades and stats:', f'{prefix}_*.csv')
+        print(stats.to_string())
+
+
+if __name__ == '__main__':
+    main()
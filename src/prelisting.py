@@ -0,0 +1,49 @@
+import numpy as np
+import pandas as pd
+
+
+def first_trading_rows(values: np.ndarray) -> np.ndarray:
+    """
+    Row position of each column's first trading day.
+
+    A fund starts trading on its first finite, non-zero return; leading zeros
+    and NaNs are pre-listing. Columns that never trade get ``len(values)``.
+    """
+    started = np.isfinite(values) & (values != 0)
+    first = started.argmax(axis=0)
+    never = ~started[first, np.arange(values.shape[1])]
+    first[never] = values.shape[0]
+    return first
+
+
+def mask_prelisting_array(values: np.ndarray) -> np.ndarray:
+    """Set every cell before a column's first trading row to NaN, in place.
+
+    Returns the first trading row per column (``len(values)`` if never traded).
+    """
+    first = first_trading_rows(values)
+    values[np.arange(values.shape[0])[:, None] < first[None, :]] = np.nan
+    return first
+
+
+def mask_prelisting(df: pd.DataFrame) -> np.ndarray:
+    """
+    Mask pre-listing returns of a date-indexed fund frame in place.
+
+    Returns
+    -------
+    np.ndarray
+        ``datetime64[ns]`` start date per column (NaT for funds that never traded).
+    """
+    values = df.to_numpy(dtype=np.float64, copy=False)
+    # Write straight into the frame's block when to_numpy handed out a view
+    in_place = values.flags.writeable and np.may_share_memory(values, df.to_numpy(copy=False))
+    if not in_place:
+        values = np.array(values, dtype=np.float64)
+
+    first = mask_prelisting_array(values)
+    if not in_place:
+        df.iloc[:, :] = values
+
+    dates = np.append(df.index.values.astype('datetime64[ns]'), np.datetime64('NaT', 'ns'))
+    return dates[first]
@@ -1,122 +1,124 @@
+import argparse
 import pandas as pd
-import numpy as np
-import matplotlib.pyplot as plt
 from pathlib import Path
 
-FUND_DAILY = r"D:\A_share_market\20240910_fund_dayReturn.csv"
-INDEX_DAILY = r"D:\A_share_market\20240910_index_return.csv"
+from compact import load_cleaned_compact
+from data_loader import FUND_DAILY, INDEX_DAILY, load_cleaned
+from instrumentation import stage, traced
+from perf_stats import performance_stats
+from plot_render import FigureSpec, render, series_line
+from tranches import assign_tranches, tranche_daily_returns, walk_forward_tranches
 
-def main():
-    # Load daily returns
-    fund_returns = pd.read_csv(FUND_DAILY)
-    index_returns = pd.read_csv(INDEX_DAILY)
+BENCHMARK_INDICES = ['000300.SH', '000905.SH', '000906.SH']
+RESULTS_DIR = Path(__file__).resolve().parents[1] / 'results'
 
-    # Parse dates
-    fund_returns = fund_returns.rename(columns={'Unnamed: 0': 'date'})
-    fund_returns['date'] = pd.to_datetime(fund_returns['date'], format='%Y-%m-%d')
-    index_returns['date'] = pd.to_datetime(index_returns['date'], format='%Y%m%d')
+def run_quintiles(fund: pd.DataFrame, index: pd.DataFrame, n_tranches: int = 5):
+    """
+    Tranche backtest on cleaned returns (decimals, pre-listing days already NaN).
+    ``fund`` may be a dense frame or a ``compact.CompactReturns``.
 
-    # Align dates
-    common_dates = pd.merge(fund_returns['date'], index_returns['date'], on='date')['date']
-    fund = fund_returns[fund_returns['date'].isin(common_dates)].set_index('date')
-    index = index_returns[index_returns['date'].isin(common_dates)].set_index('date')
+    Returns the daily tranche returns, the cumulative curves (with the benchmark)
+    and the top-tranche vs benchmark statistics table.
+    """
+    # Average performance per fund only after start date
+    perf = fund.mean()
 
-    # Convert % to decimals if needed
-    if fund.abs().stack().quantile(0.999) > 1:
-        fund = fund / 100.0
-    if index.abs().stack().quantile(0.999) > 1:
-        index = index / 100.0
-
-    # Benchmark as the average of three indices
-    index['Benchmark_Index'] = index[['000300.SH', '000905.SH', '000906.SH']].mean(axis=1)
-
-    # -------- Key fix: precise start date per fund --------
-    # 1) Find the first non-zero return date for each fund (trading start)
-    fund_start_dates = {}
-    for col in fund.columns:
-        non_zero_idx = fund[col].ne(0).idxmax()
-        if pd.notna(non_zero_idx) and fund.loc[non_zero_idx, col] != 0:
-            fund_start_dates[col] = non_zero_idx
-        else:
-            # If no valid start date, push to max date (ignore this fund)
-            fund_start_dates[col] = fund.index.max()
-
-    # 2) Mask pre-start data as NaN
-    for col, start_date in fund_start_dates.items():
-        mask = fund.index < start_date
-        fund.loc[mask, col] = np.nan
-
-    # 3) Compute average performance per fund only after start date
-    perf = {}
-    for col in fund.columns:
-        sdt = fund_start_dates[col]
-        perf[col] = fund.loc[sdt:, col].mean()
-
-    perf = pd.Series(perf).sort_values(ascending=False).dropna()
-
-    # Split into 5 equal groups by average return
-    names_sorted = perf.index.tolist()
-    splits = np.array_split(names_sorted, 5)
-    quintiles = {f'Quintile_{i+1}': list(g) for i, g in enumerate(splits)}
+    # Split into equal groups by average return
+    labels = assign_tranches(perf, n_tranches)
 
     # Daily equal-weight average per quintile (only valid trading funds each day)
-    quintile_daily = pd.DataFrame(index=fund.index)
-    for qname, flist in quintiles.items():
-        daily_means = pd.Series(index=fund.index, dtype=float)
-        for dt in fund.index:
-            valid = []
-            for c in flist:
-                if dt >= fund_start_dates[c] and not pd.isna(fund.loc[dt, c]):
-                    valid.append(c)
-            daily_means.loc[dt] = fund.loc[dt, valid].mean() if len(valid) else np.nan
-        quintile_daily[qname] = daily_means
+    quintile_daily = tranche_daily_returns(fund, labels, n_tranches, prefix='Quintile')
+    return summarize_quintiles(quintile_daily, index)
+
+def run_walk_forward(fund: pd.DataFrame, index: pd.DataFrame, n_tranches: int = 5, lookback: int = None):
+    """
+    ``run_quintiles`` without look-ahead: funds are re-ranked at every month start
+    on their trailing mean only (see ``tranches.walk_forward_tranches``).
+
+    Returns the ``run_quintiles`` outputs plus the monthly membership and turnover.
+    """
+    wf = walk_forward_tranches(fund, n_tranches, lookback=lookback, prefix='Quintile')
+    return summarize_quintiles(wf.daily, index) + (wf.membership, wf.turnover)
+
+def summarize_quintiles(quintile_daily: pd.DataFrame, index: pd.DataFrame):
+    """Cumulative curves and top-tranche vs benchmark statistics of daily tranche returns."""
+    # Benchmark as the average of three indices
+    benchmark = index[BENCHMARK_INDICES].mean(axis=1)
 
     # Forward fill gaps, then set initial NAs to zero
-    quintile_daily.fillna(method='ffill', inplace=True)
-    quintile_daily.fillna(0, inplace=True)
+    quintile_daily = quintile_daily.ffill().fillna(0)
 
     # Cumulative curves
     cumulative = (1 + quintile_daily).cumprod()
-    cumulative['Benchmark_Index'] = (1 + index['Benchmark_Index']).cumprod()
+    cumulative['Benchmark_Index'] = (1 + benchmark).cumprod()
     cumulative = cumulative / cumulative.iloc[0]
 
-    plt.figure(figsize=(14, 8))
-    for col in cumulative.columns:
-        plt.plot(cumulative.index, cumulative[col], label=col)
-    plt.title('Cumulative Returns of Fund Quintiles and Benchmark Index')
-    plt.xlabel('Date'); plt.ylabel('Cumulative Return')
-    plt.grid(True); plt.legend(); plt.tight_layout()
-
-    out_png = Path(__file__).resolve().parents[1] / 'results' / 'cumulative_returns_quintiles.png'
-    plt.savefig(out_png, dpi=150)
+    # Performance table for the top tranche vs benchmark (geometric annualization), one kernel call
+    perf = performance_stats(pd.DataFrame({'Top Tranche': quintile_daily['Quintile_1'], 'Benchmark': benchmark}))
+    vol = perf['Annualized Volatility']
+    perf['Sharpe (rf=0)'] = perf['Geometric Return'] / vol.where(vol != 0)
+    stats = perf[['Geometric Return', 'Annualized Volatility', 'Sharpe (rf=0)', 'Maximum Drawdown']].T
+    stats.index = pd.Index(['Annualized Return', 'Annualized Volatility', 'Sharpe (rf=0)', 'Max Drawdown'], name='Metric')
+    stats = stats.reset_index()
+    stats.columns.name = None
+    return quintile_daily, cumulative, stats
+
+def quintile_figure(cumulative: pd.DataFrame, out_png: Path) -> FigureSpec:
+    return FigureSpec(out_png, [series_line(cumulative[col], col) for col in cumulative.columns],
+                      'Cumulative Returns of Fund Quintiles and Benchmark Index',
+                      ylabel='Cumulative Return', figsize=(14, 8))
+
+def plot_quintiles(cumulative: pd.DataFrame, out_png: Path):
+    render(quintile_figure(cumulative, out_png))
     print('Saved plot:', out_png)
 
-    # Performance table for the top tranche vs benchmark
-    top = quintile_daily['Quintile_1']
-    bm = index['Benchmark_Index']
-
-    def ann_ret(r):
-        r = r.dropna()
-        return (1 + r).prod()**(252/len(r)) - 1 if len(r) else np.nan
-    def ann_vol(r):
-        r = r.dropna()
-        return r.std() * np.sqrt(252) if len(r) else np.nan
-    def mdd(r):
-        r = r.dropna()
-        if len(r) == 0: return np.nan
-        cum = (1 + r).cumprod()
-        peak = cum.cummax()
-        dd = (cum - peak) / peak
-        return dd.min()
-
-    stats = pd.DataFrame({
-        'Metric': ['Annualized Return', 'Annualized Volatility', 'Sharpe (rf=0)', 'Max Drawdown'],
-        'Top Tranche': [ann_ret(top), ann_vol(top), (ann_ret(top)/(ann_vol(top) or np.nan)), mdd(top)],
-        'Benchmark'  : [ann_ret(bm),  ann_vol(bm),  (ann_ret(bm)/(ann_vol(bm) or np.nan)),  mdd(bm)]
-    })
-    out_csv = Path(__file__).resolve().parents[1] / 'results' / 'quintile_stats.csv'
+def save_stats(stats: pd.DataFrame, out_csv: Path):
     stats.to_csv(out_csv, index=False)
     print('Saved stats:', out_csv)
 
+@traced('quintile_analysis')
+def main(n_tranches: int = 5, compact: bool = False, walk_forward: bool = False, lookback: int = None,
+         fund_path=FUND_DAILY, index_path=INDEX_DAILY, out_dir=RESULTS_DIR):
+    if compact and walk_forward:
+        raise ValueError('walk-forward mode needs the dense fund matrix (compact=False)')
+    # Load daily returns on common dates, in decimals, pre-listing days masked as NaN
+    # (compact: float32 listed histories only, for whole-universe runs; see compact.py)
+    with stage('load_cleaned', compact=compact):
+        fund, index = load_cleaned_compact(fund_path, index_path) if compact else load_cleaned(fund_path, index_path)
+
+    out_dir = Path(out_dir)
+    out_dir.mkdir(parents=True, exist_ok=True)
+    if not walk_forward:
+        with stage('quintiles'):
+            quintile_daily, cumulative, stats = run_quintiles(fund, index, n_tranches)
+        with stage('plot'):
+            plot_quintiles(cumulative, out_dir / 'cumulative_returns_quintiles.png')
+        with stage('save'):
+            save_stats(stats, out_dir / 'quintile_stats.csv')
+        return
+
+    # Monthly re-ranking on trailing data only
+    with stage('walk_forward'):
+        quintile_daily, cumulative, stats, membership, turnover = run_walk_forward(fund, index, n_tranches, lookback)
+    with stage('plot'):
+        plot_quintiles(cumulative, out_dir / 'cumulative_returns_quintiles_walkforward.png')
+    with stage('save'):
+        save_stats(stats, out_dir / 'quintile_stats_walkforward.csv')
+        membership.to_csv(out_dir / 'quintile_membership.csv')
+        turnover.to_csv(out_dir / 'quintile_turnover.csv')
+        print('Saved membership and turnover:', out_dir / 'quintile_membership.csv',
+              out_dir / 'quintile_turnover.csv')
+
 if __name__ == '__main__':
-    main()
\ No newline at end of file
+    parser = argparse.ArgumentParser(description='Fund tranches by average return vs the benchmark index.')
+    parser.add_argument('--fund', default=FUND_DAILY, help='daily fund return CSV')
+    parser.add_argument('--index', default=INDEX_DAILY, help='daily index return CSV')
+    parser.add_argument('--out', default=str(RESULTS_DIR), help='output directory')
+    parser.add_argument('--tranches', type=int, default=5, help='number of tranches')
+    parser.add_argument('--compact', action='store_true', help='float32 listed-history storage (compact.py)')
+    parser.add_argument('--walk-forward', action='store_true',
+                        help='re-rank every month on trailing data instead of the full-sample mean')
+    parser.add_argument('--lookback', type=int, default=None,
+                        help='trailing months scored in walk-forward mode (default: whole history)')
+    args = parser.parse_args()
+    main(args.tranches, args.compact, args.walk_forward, args.lookback, args.fund, args.index, args.out)
@@ -0,0 +1,333 @@
+"""
+Resident analytics service: load and clean the data once, answer queries from memory.
+
+``AnalyticsService`` holds the cleaned daily fund/index matrices, their monthly
+compounding and a ``WindowAnalysis`` in memory and answers
+
+- ``info``: data range, fund count, indices;
+- ``window``: fund average vs each index over ``start``..``end`` (growth,
+  excess, drawdown), from prefix arrays;
+- ``cumulative``: one fund vs one index over their common valid dates;
+- ``regression``: per-fund OLS on ``factors`` (``batch_ols``);
+- ``quintiles``: tranche statistics, fixed or walk-forward;
+- ``momentum``: trailing-momentum basket hedged with ``beta`` (one or more).
+
+Results (except ``info``, which reports live counters) are kept in an
+in-memory LRU cache keyed by endpoint, parameters and data version. Before answering, the service checks (at most every
+``check_every`` seconds) whether either source file's size or mtime changed
+and, if so, reloads before answering and drops the cache; queries already
+running finish on the old data.
+
+It is usable in-process (``service.query('window', start=..., end=...)``) or
+over HTTP on localhost, one JSON object per GET::
+
+    python src/server.py --fund path/to/fund.csv --index path/to/index.csv --port 8765
+    curl 'http://127.0.0.1:8765/momentum?lookback=6&top_frac=0.1&beta=0.8,1.0'
+"""
+import argparse
+import inspect
+import json
+import math
+import threading
+import time
+from collections import OrderedDict, namedtuple
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+import numpy as np
+import pandas as pd
+
+import quintile_analysis
+from data_loader import CACHE_DIR, FUND_DAILY, INDEX_DAILY, file_fingerprint, load_cleaned
+from factor_regression import batch_ols
+from hedging import hedge_sweep, sweep_stats
+from momentum import momentum_selection
+from month_index import monthly_compound
+from plot_random_fund_vs_index import fund_vs_index
+from short_sell_strategy import momentum_portfolio_returns
+from window_analysis import WindowAnalysis
+
+HOST = '127.0.0.1'
+PORT = 8765
+CACHE_SIZE = 256
+CHECK_EVERY = 5.0  # seconds between source file checks
+
+Snapshot = namedtuple('Snapshot', ['fund', 'index', 'monthly_fund', 'windows', 'version', 'sources', 'loaded_at'])
+
+
+class QueryError(ValueError):
+    """Bad endpoint or parameters (HTTP 400/404)."""
+
+
+def _jsonable(obj):
+    """Plain JSON types from pandas/numpy results; NaN becomes null."""
+    if isinstance(obj, pd.DataFrame):
+        return {str(k): _jsonable(v) for k, v in obj.to_dict(orient='index').items()}
+    if isinstance(obj, pd.Series):
+        return {str(k.date() if isinstance(k, pd.Timestamp) else k): _jsonable(v) for k, v in obj.items()}
+    if isinstance(obj, dict):
+        return {str(k): _jsonable(v) for k, v in obj.items()}
+    if isinstance(obj, (list, tuple, np.ndarray)):
+        return [_jsonable(v) for v in obj]
+    if isinstance(obj, (pd.Timestamp, np.datetime64)):
+        return None if pd.isna(obj) else str(pd.Timestamp(obj).date())
+    if isinstance(obj, (np.integer, np.bool_)):
+        return obj.item()
+    if isinstance(obj, (float, np.floating)):
+        return None if math.isnan(obj) else float(obj)
+    return obj
+
+
+def _floats(name: str, value) -> list:
+    try:
+        return [float(v) for v in str(value).split(',') if v != '']
+    except ValueError:
+        raise QueryError(f'{name} must be comma-separated numbers, got {value!r}') from None
+
+
+def _date(name: str, value):
+    """``value`` as a Timestamp (None stays None); QueryError otherwise."""
+    if value is None:
+        return None
+    try:
+        return pd.Timestamp(value)
+    except (TypeError, ValueError):
+        raise QueryError(f'{name} must be a date, got {value!r}') from None
+
+
+def _int(name: str, value, minimum: int) -> int:
+    """``value`` as an integer of at least ``minimum``; QueryError otherwise."""
+    try:
+        number = int(value)
+    except (TypeError, ValueError):
+        raise QueryError(f'{name} must be an integer, got {value!r}') from None
+    if number < minimum:
+        raise QueryError(f'{name} must be >= {minimum}, got {number}')
+    return number
+
+
+def _fraction(name: str, value) -> float:
+    """``value`` as a float in (0, 1]; QueryError otherwise."""
+    try:
+        number = float(value)
+    except (TypeError, ValueError):
+        raise QueryError(f'{name} must be a number, got {value!r}') from None
+    if not 0 < number <= 1:
+        raise QueryError(f'{name} must be in (0, 1], got {number}')
+    return number
+
+
+class AnalyticsService:
+    """In-memory query service over one fund/index file pair; thread-safe."""
+
+    UNCACHED = ('info',)  # endpoints answered fresh on every call
+
+    def __init__(self, fund_path=FUND_DAILY, index_path=INDEX_DAILY, cache_dir=CACHE_DIR,
+                 cache_size: int = CACHE_SIZE, check_every: float = CHECK_EVERY):
+        self.fund_path, self.index_path, self.cache_dir = fund_path, index_path, cache_dir
+        self.cache_size = cache_size
+        self.check_every = check_every
+        self._cache = OrderedDict()
+        self._lock = threading.Lock()
+        self._reload_lock = threading.Lock()
+        self._checked = time.monotonic()
+        self.hits = self.misses = 0
+        self.snapshot = self._load(version=1)
+
+    # -- data ------------------------------------------------------------
+    def _sources(self) -> tuple:
+        return tuple((fp['size'], fp['mtime_ns'])
+                     for fp in (file_fingerprint(p, with_hash=False) for p in (self.fund_path, self.index_path)))
+
+    def _load(self, version: int) -> Snapshot:
+        sources = self._sources()
+        fund, index = load_cleaned(self.fund_path, self.index_path, self.cache_dir)
+        # fund matrix in RAM (not the copy-on-write map) so queries never touch the disk
+        fund = pd.DataFrame(np.array(fund.to_numpy(), dtype=np.float64), index=fund.index, columns=fund.columns)
+        monthly_fund = monthly_compound(fund)
+        windows = WindowAnalysis(monthly_fund, monthly_compound(index))
+        return Snapshot(fund, index, monthly_fund, windows, version, sources, time.time())
+
+    def reload(self, force: bool = False) -> bool:
+        """Reload if a source file changed (or ``force``); returns whether it did."""
+        with self._reload_lock:
+            self._checked = time.monotonic()
+            if not force and self._sources() == self.snapshot.sources:
+                return False
+            self.snapshot = self._load(self.snapshot.version + 1)
+            with self._lock:
+                self._cache.clear()
+            return True
+
+    def _maybe_reload(self) -> None:
+        if self.check_every is not None and time.monotonic() - self._checked >= self.check_every:
+            self.reload()
+
+    # -- queries ---------------------------------------------------------
+    def query(self, endpoint: str, **params):
+        """Answer one endpoint (see module docstring) as a JSON-ready dict, through the LRU cache."""
+        handler = getattr(self, f'q_{endpoint}', None)
+        if handler is None:
+            raise QueryError(f'Unknown endpoint {endpoint!r}; expected one of {self.endpoints()}')
+        self._maybe_reload()
+        snap = self.snapshot
+        try:
+            inspect.signature(handler).bind(snap, **params)
+        except TypeError as exc:
+            raise QueryError(f'{endpoint}: {exc}') from None
+        if endpoint in self.UNCACHED:
+            return _jsonable(handler(snap, **params))
+        key = (endpoint, tuple(sorted((k, str(v)) for k, v in params.items())), snap.version)
+        with self._lock:
+            if key in self._cache:
+                self._cache.move_to_end(key)
+                self.hits += 1
+                return self._cache[key]
+        result = _jsonable(handler(snap, **params))
+        with self._lock:
+            self.misses += 1
+            self._cache[key] = result
+            while len(self._cache) > self.cache_size:
+                self._cache.popitem(last=False)
+        return result
+
+    @classmethod
+    def endpoints(cls) -> list:
+        return [name[2:] for name in dir(cls) if name.startswith('q_')]
+
+    def _fund(self, snap, fund):
+        if fund not in snap.fund.columns:
+            raise QueryError(f'Unknown fund {fund!r}')
+        return fund
+
+    def _index(self, snap, index):
+        if index not in snap.index.columns:
+            raise QueryError(f'Unknown index {index!r}; expected one of {list(snap.index.columns)}')
+        return index
+
+    def q_info(self, snap):
+        return {'version': snap.version, 'loaded_at': snap.loaded_at,
+                'start': snap.fund.index[0], 'end': snap.fund.index[-1], 'days': len(snap.fund),
+                'funds': snap.fund.shape[1], 'indices': list(snap.index.columns),
+                'cache': {'entries': len(self._cache), 'hits': self.hits, 'misses': self.misses}}
+
+    def q_window(self, snap, start, end):
+        try:
+            return snap.windows.window_stats(start, end)
+        except (ValueError, IndexError) as exc:
+            raise QueryError(str(exc)) from None
+
+    def _rows(self, snap, start, end) -> slice:
+        """Date slice ``start``..``end``; QueryError if it holds no trading day."""
+        rows = slice(_date('start', start), _date('end', end))
+        if snap.fund.index[snap.fund.index.slice_indexer(rows.start, rows.stop)].empty:
+            raise QueryError(f'no trading days between {start} and {end}')
+        return rows
+
+    def q_cumulative(self, snap, fund, index=None, start=None, end=None):
+        index = self._index(snap, index or snap.index.columns[0])
+        rows = self._rows(snap, start, end)
+        sub_fund = snap.fund.loc[rows, [self._fund(snap, fund)]]
+        cum_fund, cum_index = fund_vs_index(sub_fund, snap.index.loc[rows], fund, index)
+        return {'fund': fund, 'index': index, 'observations': len(cum_fund),
+                'fund_cumulative': cum_fund.iloc[-1] if len(cum_fund) else None,
+                'index_cumulative': cum_index.iloc[-1] if len(cum_index) else None,
+                'path': {'fund': cum_fund, 'index': cum_index}}
+
+    def q_regression(self, snap, fund, factors='000905.SH', start=None, end=None, hac_lags=None):
+        funds = [self._fund(snap, f) for f in str(fund).split(',')]
+        factors = [self._index(snap, f) for f in str(factors).split(',')]
+        rows = self._rows(snap, start, end)
+        table = batch_ols(snap.fund.loc[rows, funds], snap.index.loc[rows, factors],
+                          hac_lags=None if hac_lags is None else _int('hac_lags', hac_lags, 0))
+        return table
+
+    def q_quintiles(self, snap, tranches=5, walk_forward=False, lookback=None):
+        n_tranches = _int('tranches', tranches, 1)
+        if str(walk_forward).lower() in ('1', 'true', 'yes'):
+            _, _, stats, _, turnover = quintile_analysis.run_walk_forward(
+                snap.fund, snap.index, n_tranches, None if lookback is None else _int('lookback', lookback, 1))
+            return {'stats': stats.set_index('Metric'), 'mean_turnover': turnover.mean()}
+        _, _, stats = quintile_analysis.run_quintiles(snap.fund, snap.index, n_tranches)
+        return {'stats': stats.set_index('Metric')}
+
+    def q_momentum(self, snap, lookback=12, top_frac=0.2, beta='1.0', index='000300.SH', stat='compound'):
+        index = self._index(snap, index)
+        lookback, top_frac = _int('lookback', lookback, 1), _fraction('top_frac', top_frac)
+        betas = _floats('beta', beta)
+        try:
+            selection = momentum_selection(snap.monthly_fund, lookback=lookback, stat=stat, top_frac=top_frac)
+        except ValueError as exc:
+            raise QueryError(str(exc)) from None
+        port, bench = momentum_portfolio_returns(snap.fund, snap.index, index_col=index, selection=selection)
+        excess = hedge_sweep(port, bench, betas)
+        stats = sweep_stats(excess)
+        stats['Cumulative Return'] = (1 + excess.fillna(0)).prod() - 1
+        return {'days': len(port), 'stats': stats}
+
+
+def make_handler(service: AnalyticsService, verbose: bool = False):
+    """``BaseHTTPRequestHandler`` class serving ``GET /<endpoint>?param=value`` from ``service``."""
+
+    class Handler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            url = urlparse(self.path)
+            endpoint = url.path.strip('/') or 'info'
+            params = {k: v[-1] for k, v in parse_qs(url.query).items()}
+            try:
+                if endpoint == 'reload':
+                    body, status = {'reloaded': service.reload(force=True)}, 200
+                else:
+                    body, status = service.query(endpoint, **params), 200
+            except QueryError as exc:
+                unknown = endpoint not in service.endpoints() and endpoint != 'reload'
+                body, status = {'error': str(exc)}, 404 if unknown else 400
+            except Exception as exc:  # keep serving
+                body, status = {'error': f'{type(exc).__name__}: {exc}'}, 500
+            payload = json.dumps(body).encode('utf-8')
+            self.send_response(status)
+            self.send_header('Content-Type', 'application/json')
+            self.send_header('Content-Length', str(len(payload)))
+            self.end_headers()
+            self.wfile.write(payload)
+
+        def log_message(self, format, *args):
+            if verbose:
+                super().log_message(format, *args)
+
+    return Handler
+
+
+def make_server(service: AnalyticsService, host: str = HOST, port: int = PORT, verbose: bool = False):
+    """Threaded HTTP server bound to ``host:port`` (port 0 picks a free one); call ``serve_forever``."""
+    return ThreadingHTTPServer((host, port), make_handler(service, verbose))
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Serve fund analytics queries from memory over HTTP.')
+    parser.add_argument('--fund', default=FUND_DAILY, help='daily fund return CSV')
+    parser.add_argument('--index', default=INDEX_DAILY, help='daily index return CSV')
+    parser.add_argument('--host', default=HOST)
+    parser.add_argument('--port', type=int, default=PORT)
+    parser.add_argument('--cache-size', type=int, default=CACHE_SIZE, help='LRU result cache entries')
+    parser.add_argument('--check-every', type=float, default=CHECK_EVERY,
+                        help='seconds between checks of the source files for hot reload')
+    parser.add_argument('--verbose', action='store_true', help='log every request')
+    args = parser.parse_args(argv)
+
+    t0 = time.perf_counter()
+    service = AnalyticsService(args.fund, args.index, cache_size=args.cache_size, check_every=args.check_every)
+    print(f'Loaded {service.snapshot.fund.shape[1]} funds x {len(service.snapshot.fund)} days '
+          f'in {time.perf_counter() - t0:.1f}s')
+    server = make_server(service, args.host, args.port, args.verbose)
+    print(f'Serving on http://{args.host}:{server.server_port}/ ({", ".join(service.endpoints())})')
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,152 @@
+"""
+Synthetic A-share fund/index daily return files in the on-disk format the scripts read.
+
+- Index file: ``date,000300.SH,000905.SH,000906.SH`` with ``yyyymmdd`` dates,
+  UTF-8 with BOM, like ``data/20240910_index_return.csv``.
+- Fund file: unnamed first column of ``YYYY-MM-DD`` dates, one ``NNNNNN.OF``
+  column per fund, like ``20240910_fund_dayReturn.csv``.
+
+Returns are in percent (or decimals with ``percent=False``). Funds load on the
+indices with random betas plus noise and list on staggered dates, with more
+funds launched late in the history as in the real universe; pre-listing days
+are 0 (or empty for some funds), and a few post-listing days are missing. The
+fund file is written in row chunks, so even 50k funds x 20 years never needs
+the full matrix in memory.
+
+    python src/synthetic_data.py --funds 10000 --days 4785 --out data/synthetic
+"""
+import argparse
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+INDEX_COLUMNS = ['000300.SH', '000905.SH', '000906.SH']
+END_DATE = '2024-09-10'
+WRITE_CHUNK = 250  # rows per write; fixed so a seed always gives the same file
+
+
+def trading_calendar(n_days: int, end: str = END_DATE, seed: int = 0) -> pd.DatetimeIndex:
+    """``n_days`` weekdays ending at ``end`` with ~4% random market holidays removed."""
+    rng = np.random.default_rng(seed)
+    days = pd.bdate_range(end=end, periods=int(n_days * 1.05) + 10)
+    keep = rng.random(len(days)) > 0.04
+    keep[-1] = True
+    return days[keep][-n_days:]
+
+
+def index_returns(dates: pd.DatetimeIndex, seed: int = 0) -> pd.DataFrame:
+    """Daily percent returns of HS300, ZZ500 and ZZ800 from a market + size factor model."""
+    rng = np.random.default_rng([seed, 1])
+    n = len(dates)
+    market = 1.4 * rng.standard_t(4, n) / np.sqrt(2) + 0.03
+    size = 0.6 * rng.standard_normal(n) + 0.01
+    hs300 = market + 0.15 * rng.standard_normal(n)
+    zz500 = 1.1 * market + size + 0.2 * rng.standard_normal(n)
+    zz800 = 0.7 * hs300 + 0.3 * zz500 + 0.05 * rng.standard_normal(n)
+    values = np.column_stack([hs300, zz500, zz800]).clip(-10, 10).round(4)
+    return pd.DataFrame(values, index=dates, columns=INDEX_COLUMNS)
+
+
+def fund_parameters(n_funds: int, n_days: int, seed: int = 0) -> dict:
+    """Per-fund listing/delisting rows, factor loadings and noise levels."""
+    rng = np.random.default_rng([seed, 2])
+    # most funds launch late in the sample; ~10% trade from the first day
+    start = (n_days * rng.random(n_funds) ** 0.5).astype(int)
+    start[rng.random(n_funds) < 0.1] = 0
+    start = np.minimum(start, n_days - 20)
+    stop = np.full(n_funds, n_days)
+    delisted = rng.random(n_funds) < 0.05
+    stop[delisted] = start[delisted] + ((n_days - start[delisted]) * rng.random(delisted.sum())).astype(int) + 1
+    bond_like = rng.random(n_funds) < 0.25
+    return {
+        'start': start,
+        'stop': stop,
+        'nan_prelisting': rng.random(n_funds) < 0.3,
+        'beta': np.where(bond_like, rng.uniform(0.0, 0.15, n_funds), rng.uniform(0.4, 1.1, n_funds)),
+        'tilt': rng.uniform(-0.3, 0.5, n_funds),
+        'alpha': rng.normal(0.01, 0.02, n_funds),
+        'noise': np.where(bond_like, rng.uniform(0.02, 0.2, n_funds), rng.uniform(0.3, 1.2, n_funds)),
+    }
+
+
+def fund_returns_block(rows: np.ndarray, index_pct: np.ndarray, params: dict, rng) -> np.ndarray:
+    """Percent returns of every fund on the given row positions of the calendar."""
+    hs300, zz500 = index_pct[rows, 0:1], index_pct[rows, 1:2]
+    r = (params['alpha'] + params['beta'] * ((1 - params['tilt']) * hs300 + params['tilt'] * zz500)
+         + params['noise'] * rng.standard_normal((len(rows), len(params['beta']))))
+    r = r.round(4)
+    before = rows[:, None] < params['start'][None, :]
+    r[before] = 0.0
+    r[before & params['nan_prelisting'][None, :]] = np.nan
+    r[rows[:, None] >= params['stop'][None, :]] = np.nan
+    r[(rng.random(r.shape) < 0.001) & ~before] = np.nan  # suspensions
+    return r
+
+
+def write_index_csv(index_pct: pd.DataFrame, path) -> Path:
+    path = Path(path)
+    out = index_pct.copy()
+    out.index = out.index.strftime('%Y%m%d').astype(int)
+    out.index.name = 'date'
+    out.to_csv(path, encoding='utf-8-sig')
+    return path
+
+
+def write_fund_csv(path, dates: pd.DatetimeIndex, index_pct: pd.DataFrame, n_funds: int,
+                   seed: int = 0, percent: bool = True) -> Path:
+    """Write the wide fund file chunk by chunk (never the whole matrix in memory)."""
+    path = Path(path)
+    params = fund_parameters(n_funds, len(dates), seed)
+    columns = [f'{i + 1:06d}.OF' for i in range(n_funds)]
+    labels = dates.strftime('%Y-%m-%d')
+    values = index_pct.to_numpy(dtype=np.float64)
+    with open(path, 'w', encoding='utf-8', newline='') as fh:
+        fh.write(',' + ','.join(columns) + '\n')
+        for chunk, c0 in enumerate(range(0, len(dates), WRITE_CHUNK)):
+            rows = np.arange(c0, min(c0 + WRITE_CHUNK, len(dates)))
+            block = fund_returns_block(rows, values, params, np.random.default_rng([seed, 3, chunk]))
+            if not percent:
+                block = (block / 100.0).round(6)
+            pd.DataFrame(block, index=labels[rows]).to_csv(fh, header=False, lineterminator='\n')
+    return path
+
+
+def make_dataset(out_dir, n_funds: int = 1000, n_days: int = 4785, seed: int = 0,
+                 percent: bool = True, overwrite: bool = False):
+    """
+    Write ``fund_{n_funds}x{n_days}_s{seed}.csv`` and ``index_{n_days}_s{seed}.csv`` under ``out_dir``.
+
+    Existing files with the same name are reused unless ``overwrite``.
+    Returns ``(fund_path, index_path)``.
+    """
+    out_dir = Path(out_dir)
+    out_dir.mkdir(parents=True, exist_ok=True)
+    unit = '' if percent else '_dec'
+    fund_path = out_dir / f'fund_{n_funds}x{n_days}_s{seed}{unit}.csv'
+    index_path = out_dir / f'index_{n_days}_s{seed}.csv'
+    dates = trading_calendar(n_days, seed=seed)
+    index_pct = index_returns(dates, seed)
+    if overwrite or not index_path.exists():
+        write_index_csv(index_pct, index_path)
+    if overwrite or not fund_path.exists():
+        write_fund_csv(fund_path, dates, index_pct, n_funds, seed, percent)
+    return fund_path, index_path
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Generate synthetic fund/index daily return CSVs.')
+    parser.add_argument('--funds', type=int, default=1000, help='number of funds')
+    parser.add_argument('--days', type=int, default=4785, help='trading days of history')
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--decimal', action='store_true', help='write decimals instead of percent')
+    parser.add_argument('--out', default=str(Path(__file__).resolve().parents[1] / 'data' / 'synthetic'))
+    args = parser.parse_args(argv)
+    fund_path, index_path = make_dataset(args.out, args.funds, args.days, args.seed,
+                                         percent=not args.decimal, overwrite=True)
+    print('Saved:', fund_path)
+    print('Saved:', index_path)
+
+
+if __name__ == '__main__':
+    main()
@@ -1,87 +1,82 @@
 import pandas as pd
 import numpy as np
-import matplotlib.pyplot as plt
 from pathlib import Path
 
-FUND_DAILY = r"D:\A_share_market\20240910_fund_dayReturn.csv"
-INDEX_DAILY = r"D:\A_share_market\20240910_index_return.csv"
+from data_loader import FUND_DAILY, INDEX_DAILY, load_cleaned
+from hedging import hedge_sweep, rolling_hedge
+from instrumentation import stage, traced
+from momentum import basket_mean, momentum_selection
+from month_index import monthly_compound
+from plot_render import FigureSpec, render, series_line
 
-def main():
-    # Load daily returns
-    fund = pd.read_csv(FUND_DAILY)
-    idx = pd.read_csv(INDEX_DAILY)
+ROLLING_BETA_WINDOW = 36  # months
+BETAS = [0.6, 0.8, 1.0, 1.2, 1.4]
+RESULTS_DIR = Path(__file__).resolve().parents[1] / 'results'
 
-    # Parse dates
-    fund = fund.rename(columns={'Unnamed: 0': 'date'})
-    fund['date'] = pd.to_datetime(fund['date'], errors='coerce')
-    idx['date'] = pd.to_datetime(idx['date'], format='%Y%m%d', errors='coerce')
-
-    # Align by common dates
-    common = pd.merge(fund['date'], idx['date'], on='date')['date']
-    fund = fund[fund['date'].isin(common)].set_index('date')
-    idx = idx[idx['date'].isin(common)].set_index('date')
-
-    # Convert % to decimals if needed
-    if fund.abs().stack().quantile(0.999) > 1:
-        fund = fund / 100.0
-    if idx.abs().stack().quantile(0.999) > 1:
-        idx = idx / 100.0
+def run_market_neutral(fund: pd.DataFrame, idx: pd.DataFrame, betas=BETAS, m_fund=None):
+    """
+    Monthly top-20% momentum portfolio hedged against the three-index benchmark.
 
+    Takes cleaned daily returns; ``m_fund`` may pass in monthly fund returns
+    already compounded upstream. Returns the results table and cumulative curves.
+    """
     # Benchmark index = average of HS300, ZZ500, ZZ800
-    idx['Benchmark_Index'] = idx[['000300.SH','000905.SH','000906.SH']].mean(axis=1)
-
-    # Pre-listing masking: set days prior to first non-zero to NaN
-    start_dates = {}
-    for c in fund.columns:
-        nz = fund[c].ne(0).idxmax()
-        if pd.notna(nz) and fund.loc[nz, c] != 0:
-            start_dates[c] = nz
-        else:
-            start_dates[c] = fund.index.max()
-    for c, sdt in start_dates.items():
-        fund.loc[fund.index < sdt, c] = np.nan
+    benchmark = idx[['000300.SH','000905.SH','000906.SH']].mean(axis=1)
 
     # Monthly compounding from daily
-    m_fund = fund.resample('M').apply(lambda x: (1 + x).prod() - 1)
-    m_idx = idx['Benchmark_Index'].resample('M').apply(lambda x: (1 + x).prod() - 1)
+    if m_fund is None:
+        m_fund = monthly_compound(fund)
+    m_idx = monthly_compound(benchmark)
 
     res = pd.DataFrame(index=m_fund.index)
     res['Top_Portfolio_Return'] = np.nan
     res['Index_Return'] = m_idx
 
     # 6-month lookback, rank by mean, next-month hold
-    for i in range(6, len(m_fund)-1):
-        cur = m_fund.index[i]
-        nxt = m_fund.index[i+1]
-        past = m_fund.iloc[i-6:i]
-        perf = past.mean().sort_values(ascending=False).dropna()
-        if len(perf) == 0: 
-            continue
-        k = max(int(len(perf) * 0.2), 1)
-        top = perf.head(k).index
-        res.loc[nxt, 'Top_Portfolio_Return'] = m_fund.loc[nxt, top].mean()
+    selection = momentum_selection(m_fund, lookback=6, stat='mean', top_frac=0.2, min_periods=1)
+    res['Top_Portfolio_Return'] = basket_mean(m_fund, selection.shift(1, fill_value=False))
 
     # Hedge with various betas
-    betas = [0.6, 0.8, 1.0, 1.2, 1.4]
-    cum = {}
+    excess = hedge_sweep(res['Top_Portfolio_Return'], res['Index_Return'], betas)
     for b in betas:
-        res[f'Hedged_Excess_Beta_{b}'] = res['Top_Portfolio_Return'] - b * res['Index_Return']
-        cum[b] = (1 + res[f'Hedged_Excess_Beta_{b}'].fillna(0)).cumprod()
+        res[f'Hedged_Excess_Beta_{b}'] = excess[b]
+    # Time-varying hedge: rolling beta of the top portfolio on the benchmark, as of the previous month
+    label = f'Rolling_{ROLLING_BETA_WINDOW}m'
+    res[f'Hedged_Excess_Beta_{label}'], res[f'Beta_{label}'] = rolling_hedge(
+        res['Top_Portfolio_Return'], res['Index_Return'], window=ROLLING_BETA_WINDOW)
+    excess[label] = res[f'Hedged_Excess_Beta_{label}']
+    cum = (1 + excess.fillna(0)).cumprod()
+    return res, cum
 
-    plt.figure(figsize=(14,8))
-    for b in betas:
-        plt.plot(res.index, cum[b], label=f'Beta={b}', linewidth=2)
-    plt.title('Cumulative Excess Returns with Different Hedge Ratios')
-    plt.xlabel('Date'); plt.ylabel('Cumulative Return')
-    plt.grid(True); plt.legend(); plt.tight_layout()
+def hedge_ratio_figure(cum: pd.DataFrame, out_png: Path) -> FigureSpec:
+    return FigureSpec(out_png, [series_line(cum[b], f'Beta={b}', linewidth=2) for b in cum.columns],
+                      'Cumulative Excess Returns with Different Hedge Ratios',
+                      ylabel='Cumulative Return', figsize=(14, 8))
 
-    out_png = Path(__file__).resolve().parents[1] / 'results' / 'hedge_ratio_comparison.png'
-    plt.savefig(out_png, dpi=150)
+def plot_hedge_ratios(cum: pd.DataFrame, out_png: Path):
+    render(hedge_ratio_figure(cum, out_png))
     print('Saved plot:', out_png)
 
-    out_csv = Path(__file__).resolve().parents[1] / 'results' / 'market_neutral_results.csv'
+def save_results(res: pd.DataFrame, out_csv: Path):
     res.to_csv(out_csv)
     print('Saved results:', out_csv)
 
+@traced('top20_market_neutral')
+def main(fund_path=FUND_DAILY, index_path=INDEX_DAILY, out_dir=RESULTS_DIR):
+    # Load daily returns on common dates, in decimals, pre-listing days masked as NaN
+    with stage('load_cleaned'):
+        fund, idx = load_cleaned(fund_path, index_path)
+
+    with stage('monthly_compound'):
+        m_fund = monthly_compound(fund)
+    with stage('strategy'):
+        res, cum = run_market_neutral(fund, idx, m_fund=m_fund)
+    out_dir = Path(out_dir)
+    out_dir.mkdir(parents=True, exist_ok=True)
+    with stage('plot'):
+        plot_hedge_ratios(cum, out_dir / 'hedge_ratio_comparison.png')
+    with stage('save'):
+        save_results(res, out_dir / 'market_neutral_results.csv')
+
 if __name__ == '__main__':
-    main()
\ No newline at end of file
+    main()
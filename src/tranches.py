@@ -0,0 +1,153 @@
+from collections import deque, namedtuple
+
+import numpy as np
+import pandas as pd
+
+from month_index import month_row_bounds
+
+
+def assign_tranches(score: pd.Series, n_tranches: int = 5) -> pd.Series:
+    """
+    Label funds 0..n_tranches-1 by descending score.
+
+    Group sizes follow ``np.array_split`` (the first groups take the remainder);
+    funds with a NaN score are labelled -1 and belong to no tranche.
+    """
+    ranked = score.dropna().sort_values(ascending=False)
+    sizes = [len(g) for g in np.array_split(np.arange(len(ranked)), n_tranches)]
+    labels = pd.Series(-1, index=score.index, dtype=int)
+    labels[ranked.index] = np.repeat(np.arange(n_tranches), sizes)
+    return labels
+
+
+def membership_matrix(labels: np.ndarray, n_tranches: int) -> np.ndarray:
+    """One-hot funds x tranches matrix; rows of unassigned funds (-1) are all zero."""
+    labels = np.asarray(labels)
+    member = np.zeros((len(labels), n_tranches))
+    assigned = labels >= 0
+    member[np.flatnonzero(assigned), labels[assigned]] = 1.0
+    return member
+
+
+def tranche_daily_returns(returns: pd.DataFrame, labels: pd.Series, n_tranches: int,
+                          prefix: str = 'Tranche') -> pd.DataFrame:
+    """
+    Daily equal-weight return of each tranche over its funds with a valid return that day.
+
+    Computed as one masked matrix product: the zero-filled return matrix times
+    the membership matrix gives per-tranche sums, the validity mask times the
+    same matrix gives the counts. Days with no valid fund in a tranche are NaN.
+    ``returns`` may also be a ``compact.CompactReturns``, accumulated block by block.
+    """
+    member = membership_matrix(labels.reindex(returns.columns).fillna(-1).astype(int), n_tranches)
+    if isinstance(returns, pd.DataFrame):
+        blocks = [(0, returns.to_numpy(dtype=np.float64))]
+    else:
+        blocks = returns.iter_blocks()
+
+    sums = np.zeros((len(returns.index), n_tranches))
+    counts = np.zeros((len(returns.index), n_tranches))
+    for c0, values in blocks:
+        valid = np.isfinite(values)
+        part = member[c0:c0 + values.shape[1]]
+        sums += np.where(valid, values, 0.0) @ part
+        counts += valid.astype(np.float64) @ part
+    with np.errstate(invalid='ignore', divide='ignore'):
+        means = np.where(counts > 0, sums / counts, np.nan)
+    return pd.DataFrame(means, index=returns.index,
+                        columns=[f'{prefix}_{i+1}' for i in range(n_tranches)])
+
+
+WalkForward = namedtuple('WalkForward', ['daily', 'membership', 'turnover'])
+
+
+def tranche_labels(score: np.ndarray, n_tranches: int = 5) -> np.ndarray:
+    """
+    Array version of ``assign_tranches``: labels 0..n_tranches-1 by descending
+    score (ties in column order), -1 for NaN scores.
+    """
+    order = np.argsort(-score, kind='stable')
+    order = order[:np.isfinite(score).sum()]  # NaN sorts last
+    sizes = [len(g) for g in np.array_split(np.arange(len(order)), n_tranches)]
+    labels = np.full(len(score), -1, dtype=np.int64)
+    labels[order] = np.repeat(np.arange(n_tranches), sizes)
+    return labels
+
+
+def walk_forward_tranches(returns: pd.DataFrame, n_tranches: int = 5, lookback: int = None,
+                          min_periods: int = 1, every: int = 1, prefix: str = 'Tranche') -> WalkForward:
+    """
+    Tranche backtest re-ranked at month starts on trailing data only.
+
+    At each rebalance (the first trading day of every ``every``-th month) funds
+    are scored on the mean of their valid daily returns before that day, over
+    their whole listed history or the last ``lookback`` months, and split into
+    tranches like ``assign_tranches``; funds with fewer than ``min_periods``
+    valid days are left out. The split is held until the next rebalance.
+
+    Per-fund running sums and counts are advanced by one month block at a time
+    (and the block leaving a ``lookback`` window subtracted), so a rebalance
+    costs O(funds) plus the sort instead of a rescan of the history.
+
+    Returns
+    -------
+    WalkForward
+        ``daily``: equal-weight daily return of each tranche over its funds
+        with a valid return that day (NaN before the first ranking or when
+        empty); ``membership``: rebalance date x fund tranche label (-1 = not
+        ranked); ``turnover``: rebalance date x tranche one-way turnover,
+        ``0.5 * sum |w_new - w_old|`` of the equal weights (the first build
+        counts as entry, as in ``perf_stats.turnover_from_weights``).
+    """
+    values = returns.to_numpy(dtype=np.float64)
+    months, starts, stops = month_row_bounds(returns.index)
+    n_funds = values.shape[1]
+    columns = [f'{prefix}_{i+1}' for i in range(n_tranches)]
+
+    run_sum = np.zeros(n_funds)
+    run_cnt = np.zeros(n_funds)
+    window = deque()
+    sums = np.zeros((len(values), n_tranches))
+    counts = np.zeros((len(values), n_tranches))
+    member = np.zeros((n_funds, n_tranches))
+    weights = np.zeros((n_funds, n_tranches))
+    rebalances, labels_hist, turnover = [], [], []
+
+    for m, (start, stop) in enumerate(zip(starts, stops)):
+        if m % every == 0:
+            with np.errstate(invalid='ignore', divide='ignore'):
+                score = np.where(run_cnt >= max(min_periods, 1), run_sum / run_cnt, np.nan)
+            labels = tranche_labels(score, n_tranches)
+            member = membership_matrix(labels, n_tranches)
+            size = member.sum(axis=0)
+            new_weights = np.divide(member, size, out=np.zeros_like(member), where=size > 0)
+            turnover.append(0.5 * np.abs(new_weights - weights).sum(axis=0))
+            weights = new_weights
+            rebalances.append(returns.index[start])
+            labels_hist.append(labels)
+
+        block = values[start:stop]
+        valid = np.isfinite(block)
+        block0 = np.where(valid, block, 0.0)
+        sums[start:stop] = block0 @ member
+        counts[start:stop] = valid.astype(np.float64) @ member
+
+        month_sum, month_cnt = block0.sum(axis=0), valid.sum(axis=0)
+        run_sum += month_sum
+        run_cnt += month_cnt
+        if lookback is not None:
+            window.append((month_sum, month_cnt))
+            if len(window) > lookback:
+                old_sum, old_cnt = window.popleft()
+                run_sum -= old_sum
+                run_cnt -= old_cnt
+
+    with np.errstate(invalid='ignore', divide='ignore'):
+        means = np.where(counts > 0, sums / counts, np.nan)
+    dates = pd.DatetimeIndex(rebalances, name='rebalance')
+    return WalkForward(
+        pd.DataFrame(means, index=returns.index, columns=columns),
+        pd.DataFrame(np.array(labels_hist, dtype=np.min_scalar_type(-n_tranches)).reshape(len(dates), n_funds), index=dates,
+                     columns=returns.columns),
+        pd.DataFrame(np.array(turnover).reshape(len(dates), n_tranches), index=dates, columns=columns),
+    )
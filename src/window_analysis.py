@@ -0,0 +1,190 @@
+"""
+Fund-average vs index comparison over many windows from precomputed prefix arrays.
+
+``plot_fund_vs_index_monthly_windows.window_cumulative`` re-slices the monthly
+frames, re-masks and re-averages for every window. ``WindowAnalysis`` does the
+heavy work once:
+
+- each index gets a prefix sum of ``log(1 + r)``, so its growth over any
+  window is one subtraction and its path a slice;
+- the fund average depends on the window start, because a fund only counts
+  from its first non-zero month *inside the window*. Per month, funds are
+  sorted by their last non-zero month so far, with running sums of their
+  returns in that order; the window's average for that month is then one
+  ``searchsorted`` away (``O(log funds)``) instead of a pass over every fund.
+
+A window's growth multiples, excess return and drawdowns cost ``O(window)``,
+with results equal to ``window_cumulative`` up to float rounding.
+
+    python src/window_analysis.py --rolling-years 3
+    python src/window_analysis.py --windows 2006-01-01:2009-12-31 2014-01-01:2016-12-31
+"""
+import argparse
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+from instrumentation import stage, trace_output, traced
+
+ROOT = Path(__file__).resolve().parents[1]
+FUND_MONTHLY = ROOT / 'results' / 'monthly_fund_returns.csv'
+INDEX_MONTHLY = ROOT / 'results' / 'monthly_index_returns.csv'
+OUTPUT_CSV = ROOT / 'results' / 'window_analysis.csv'
+FUND_LABEL = 'Fund Average'
+
+
+def _log_prefix(values: np.ndarray) -> np.ndarray:
+    """Prefix sums of ``log(1 + r)`` with a leading 0 row; NaN months contribute nothing."""
+    with np.errstate(divide='ignore'):
+        logs = np.log1p(np.where(np.isnan(values), 0.0, values))
+    out = np.zeros((len(values) + 1,) + values.shape[1:])
+    np.cumsum(logs, axis=0, out=out[1:])
+    return out
+
+
+def _max_drawdown(log_path: np.ndarray) -> float:
+    """Worst peak-to-trough loss of a growth path given as cumulative logs (start value 1)."""
+    if not len(log_path):
+        return np.nan
+    peak = np.maximum.accumulate(np.r_[0.0, log_path])[1:]
+    return float(np.expm1((log_path - peak).min()))
+
+
+def rolling_windows(dates, years: int = 3, step_months: int = 1) -> list:
+    """Every ``years``-long window starting on a month of ``dates``, as ``(start, end)`` strings."""
+    months = pd.DatetimeIndex(dates).to_period('M').unique().sort_values()
+    out = []
+    for first in months[::step_months]:
+        last = first + 12 * years - 1
+        if last > months[-1]:
+            break
+        out.append((first.start_time.strftime('%Y-%m-%d'), last.end_time.strftime('%Y-%m-%d')))
+    return out
+
+
+class WindowAnalysis:
+    """
+    Window queries on monthly fund and index returns (month-end indexed frames,
+    as written by the ``compute_*_monthly_returns`` scripts).
+    """
+
+    def __init__(self, fund_monthly: pd.DataFrame, index_monthly: pd.DataFrame):
+        self.fund_dates = pd.DatetimeIndex(fund_monthly.index)
+        self.index_dates = pd.DatetimeIndex(index_monthly.index)
+        self.index_columns = list(index_monthly.columns)
+
+        index_values = index_monthly.to_numpy(dtype=np.float64)
+        self.index_nan = np.isnan(index_values)
+        self.index_prefix = _log_prefix(index_values)
+
+        fund = fund_monthly.to_numpy(dtype=np.float64)
+        n_months, n_funds = fund.shape
+        # last month (so far) in which each fund was "started": non-zero, NaN included,
+        # as with (fund != 0).cummax() in window_cumulative; -1 if never
+        marks = np.where(fund != 0, np.arange(n_months)[:, None], -1)
+        last_mark = np.maximum.accumulate(marks, axis=0) if n_months else marks
+        # per month: funds by descending last mark, with running sums/counts of their valid returns
+        order = np.argsort(-last_mark, axis=1, kind='stable')
+        self.neg_mark = -np.take_along_axis(last_mark, order, axis=1)
+        sorted_fund = np.take_along_axis(fund, order, axis=1)
+        valid = ~np.isnan(sorted_fund)
+        self.fund_sums = np.cumsum(np.where(valid, sorted_fund, 0.0), axis=1)
+        self.fund_counts = np.cumsum(valid, axis=1)
+        self.n_funds = n_funds
+
+    @classmethod
+    def from_csv(cls, fund_monthly_csv=FUND_MONTHLY, index_monthly_csv=INDEX_MONTHLY):
+        fund_monthly = pd.read_csv(fund_monthly_csv, index_col=0, parse_dates=True)
+        index_monthly = pd.read_csv(index_monthly_csv, index_col=0, parse_dates=True)
+        return cls(fund_monthly, index_monthly)
+
+    @staticmethod
+    def _rows(dates: pd.DatetimeIndex, start_date, end_date):
+        # same rows as .loc[start_date:end_date] on a sorted index
+        return (dates.searchsorted(pd.Timestamp(start_date), side='left'),
+                dates.searchsorted(pd.Timestamp(end_date), side='right'))
+
+    def fund_average(self, start_date, end_date) -> pd.Series:
+        """Monthly equal-weight fund return in the window (funds count from their first non-zero month in it)."""
+        s, e = self._rows(self.fund_dates, start_date, end_date)
+        means = np.zeros(e - s)
+        for i, t in enumerate(range(s, e)):
+            k = np.searchsorted(self.neg_mark[t], -s, side='right')  # funds started at or after s
+            if k and self.fund_counts[t, k - 1]:
+                means[i] = self.fund_sums[t, k - 1] / self.fund_counts[t, k - 1]
+        return pd.Series(means, index=self.fund_dates[s:e])
+
+    def index_path(self, start_date, end_date) -> pd.DataFrame:
+        """Cumulative log growth of each index through the window (NaN on NaN months)."""
+        s, e = self._rows(self.index_dates, start_date, end_date)
+        path = self.index_prefix[s + 1:e + 1] - self.index_prefix[s]
+        path = np.where(self.index_nan[s:e], np.nan, path)
+        return pd.DataFrame(path, index=self.index_dates[s:e], columns=self.index_columns)
+
+    def cumulative(self, start_date, end_date):
+        """Same ``(fund growth, index growth)`` as ``window_cumulative``."""
+        fund_cumulative = np.exp(np.log1p(self.fund_average(start_date, end_date)).cumsum())
+        index_cumulative = np.exp(self.index_path(start_date, end_date))
+        if not len(fund_cumulative) or not len(index_cumulative):
+            raise ValueError(f'No data in window {start_date}..{end_date}')
+        return fund_cumulative, index_cumulative
+
+    def window_stats(self, start_date, end_date) -> dict:
+        """Growth multiple and max drawdown of the fund average and each index, plus excess returns."""
+        fund_log = np.log1p(self.fund_average(start_date, end_date).to_numpy()).cumsum()
+        s, e = self._rows(self.index_dates, start_date, end_date)
+        index_growth = np.exp(self.index_prefix[e] - self.index_prefix[s])
+        row = {'start': start_date, 'end': end_date, 'months': len(fund_log),
+               f'{FUND_LABEL} Growth': float(np.exp(fund_log[-1])) if len(fund_log) else np.nan,
+               f'{FUND_LABEL} Max Drawdown': _max_drawdown(fund_log)}
+        paths = self.index_path(start_date, end_date).to_numpy()
+        for j, col in enumerate(self.index_columns):
+            growth = float(index_growth[j]) if e > s else np.nan
+            row[f'{col} Growth'] = growth
+            row[f'{col} Max Drawdown'] = _max_drawdown(paths[~np.isnan(paths[:, j]), j])
+            row[f'Excess vs {col}'] = row[f'{FUND_LABEL} Growth'] - growth
+        return row
+
+    def summarize(self, windows) -> pd.DataFrame:
+        """One row of ``window_stats`` per ``(start, end)`` window."""
+        return pd.DataFrame([self.window_stats(start, end) for start, end in windows])
+
+
+def _parse_windows(specs) -> list:
+    windows = []
+    for spec in specs:
+        start, sep, end = spec.partition(':')
+        if not sep:
+            raise argparse.ArgumentTypeError(f'window {spec!r} is not START:END')
+        windows.append((start, end))
+    return windows
+
+
+@traced('window_analysis')
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Fund average vs index growth, excess and drawdown per window.')
+    parser.add_argument('--fund-monthly', default=str(FUND_MONTHLY))
+    parser.add_argument('--index-monthly', default=str(INDEX_MONTHLY))
+    parser.add_argument('--windows', nargs='+', default=None, metavar='START:END',
+                        help='explicit windows (default: rolling windows)')
+    parser.add_argument('--rolling-years', type=int, default=3, help='rolling window length in years')
+    parser.add_argument('--step-months', type=int, default=1, help='months between rolling window starts')
+    parser.add_argument('--out', default=str(OUTPUT_CSV))
+    args = parser.parse_args(argv)
+    trace_output(Path(args.out).parent)
+
+    with stage('precompute'):
+        analysis = WindowAnalysis.from_csv(args.fund_monthly, args.index_monthly)
+    windows = (_parse_windows(args.windows) if args.windows
+               else rolling_windows(analysis.fund_dates, args.rolling_years, args.step_months))
+    with stage('windows', count=len(windows)):
+        table = analysis.summarize(windows)
+    out = Path(args.out)
+    out.parent.mkdir(parents=True, exist_ok=True)
+    table.to_csv(out, index=False)
+    print(f'Saved {len(table)} windows:', out)
+
+
+if __name__ == '__main__':
+    main()